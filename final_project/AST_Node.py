@@ -1,76 +1,169 @@
+from weakref import WeakValueDictionary
+
+
 class ASTNode:
-    # Base class for all AST nodes
-    pass
+    # Base class for all AST nodes. Nodes are slotted and immutable, so identical subtrees can be shared.
+    __slots__ = ('__weakref__',)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} nodes are immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} nodes are immutable")
+
+    def __reduce__(self):
+        # Pickle through the constructor, since __setattr__ is disabled
+        return (type(self), tuple(getattr(self, field) for field in self.__slots__))
 
 class FunctionDef(ASTNode):
-    def __init__(self, name, params, body):
-        self.name = name  # Name of the function
-        self.params = params  # List of parameters
-        self.body = body  # Body of the function
+    __slots__ = ('name', 'params', 'body', 'pragmas')
+
+    def __init__(self, name, params, body, pragmas=()):
+        object.__setattr__(self, 'name', name)  # Name of the function
+        object.__setattr__(self, 'params', tuple(params))  # Parameters
+        object.__setattr__(self, 'body', body)  # Body of the function
+        object.__setattr__(self, 'pragmas', tuple(pragmas))  # Pragma comments written before the definition (e.g. 'no-memo')
+
+    def __repr__(self):
+        return f"FunctionDef(name={self.name}, params={list(self.params)}, body={self.body})"
+
+class Import(ASTNode):
+    __slots__ = ('module', 'names')
+
+    def __init__(self, module, names=None):
+        object.__setattr__(self, 'module', module)  # Name of the module file, without .lambda
+        object.__setattr__(self, 'names', tuple(names) if names is not None else None)  # Names imported, or None for all
 
     def __repr__(self):
-        return f"FunctionDef(name={self.name}, params={self.params}, body={self.body})"
+        names = '' if self.names is None else f", names={list(self.names)}"
+        return f"Import(module={self.module}{names})"
 
 class LambdaExpr(ASTNode):
+    __slots__ = ('params', 'body')
+
     def __init__(self, params, body):
-        self.params = params  # List of parameters
-        self.body = body  # Body of the lambda expression
+        object.__setattr__(self, 'params', tuple(params))  # Parameters
+        object.__setattr__(self, 'body', body)  # Body of the lambda expression
 
     def __repr__(self):
-        return f"LambdaExpr(params={self.params}, body={self.body})"
+        return f"LambdaExpr(params={list(self.params)}, body={self.body})"
 
 class BinOp(ASTNode):
+    __slots__ = ('left', 'op', 'right')
+
     def __init__(self, left, op, right):
-        self.left = left  # Left operand
-        self.op = op  # Operator (e.g., +, -, *, /)
-        self.right = right  # Right operand
+        object.__setattr__(self, 'left', left)  # Left operand
+        object.__setattr__(self, 'op', op)  # Operator (e.g., +, -, *, /)
+        object.__setattr__(self, 'right', right)  # Right operand
 
     def __repr__(self):
         return f"BinOp(left={self.left}, op={self.op}, right={self.right})"
 
 class UnaryOp(ASTNode):
+    __slots__ = ('op', 'expr')
+
     def __init__(self, op, expr):
-        self.op = op  # Operator (e.g., -, !)
-        self.expr = expr  # Expression to which the operator is applied
+        object.__setattr__(self, 'op', op)  # Operator (e.g., -, !)
+        object.__setattr__(self, 'expr', expr)  # Expression to which the operator is applied
 
     def __repr__(self):
         return f"UnaryOp(op={self.op}, expr={self.expr})"
 
 class Variable(ASTNode):
+    __slots__ = ('name',)
+
     def __init__(self, name):
-        self.name = name  # Name of the variable
+        object.__setattr__(self, 'name', name)  # Name of the variable
 
     def __repr__(self):
         return f"Variable(name={self.name})"
 
 class Number(ASTNode):
+    __slots__ = ('value',)
+
     def __init__(self, value):
-        self.value = value  # Numeric value
+        object.__setattr__(self, 'value', value)  # Numeric value
 
     def __repr__(self):
         return f"Number(value={self.value})"
 
 class Boolean(ASTNode):
+    __slots__ = ('value',)
+
     def __init__(self, value):
-        self.value = value  # Boolean value (True or False)
+        object.__setattr__(self, 'value', value)  # Boolean value (True or False)
 
     def __repr__(self):
         return f"Boolean(value={self.value})"
 
 class Call(ASTNode):
+    __slots__ = ('func', 'args')
+
     def __init__(self, func, args):
-        self.func = func  # Function being called
-        self.args = args  # Arguments to the function
+        object.__setattr__(self, 'func', func)  # Function being called (a name or a LambdaExpr)
+        object.__setattr__(self, 'args', tuple(args))  # Arguments to the function
 
     def __repr__(self):
-        return f"Call(func={self.func}, args={self.args})"
+        return f"Call(func={self.func}, args={list(self.args)})"
 
 class Conditional(ASTNode):
+    __slots__ = ('condition', 'true_expr', 'false_expr')
+
     def __init__(self, condition, true_expr, false_expr):
-        self.condition = condition  # Condition expression
-        self.true_expr = true_expr  # Expression if condition is true
-        self.false_expr = false_expr  # Expression if condition is false
+        object.__setattr__(self, 'condition', condition)  # Condition expression
+        object.__setattr__(self, 'true_expr', true_expr)  # Expression if condition is true
+        object.__setattr__(self, 'false_expr', false_expr)  # Expression if condition is false
 
     def __repr__(self):
         return (f"Conditional(condition={self.condition}, "
                 f"true_expr={self.true_expr}, false_expr={self.false_expr})")
+
+class NodeFactory:
+    """
+        Build AST nodes with hash-consing: structurally identical subtrees are created once and shared.
+        Children are interned before their parents, so a node's key can refer to its children by
+        identity. The table holds nodes weakly, so subtrees that are no longer used are still freed.
+        FunctionDefs and Imports are never shared, since each one is a distinct binding.
+    """
+
+    def __init__(self):
+        self.table = WeakValueDictionary()
+
+    def intern(self, key, cls, *fields):
+        node = self.table.get(key)
+        if node is None:
+            node = self.table[key] = cls(*fields)
+        return node
+
+    def function_def(self, name, params, body, pragmas=()):
+        return FunctionDef(name, params, body, pragmas)
+
+    def import_statement(self, module, names=None):
+        return Import(module, names)
+
+    def lambda_expr(self, params, body):
+        params = tuple(params)
+        return self.intern((LambdaExpr, params, body), LambdaExpr, params, body)
+
+    def binop(self, left, op, right):
+        return self.intern((BinOp, left, op, right), BinOp, left, op, right)
+
+    def unary_op(self, op, expr):
+        return self.intern((UnaryOp, op, expr), UnaryOp, op, expr)
+
+    def variable(self, name):
+        return self.intern((Variable, name), Variable, name)
+
+    def number(self, value):
+        return self.intern((Number, value), Number, value)
+
+    def boolean(self, value):
+        return self.intern((Boolean, value), Boolean, value)
+
+    def call(self, func, args):
+        args = tuple(args)
+        return self.intern((Call, func, args), Call, func, args)
+
+    def conditional(self, condition, true_expr, false_expr):
+        return self.intern((Conditional, condition, true_expr, false_expr),
+                           Conditional, condition, true_expr, false_expr)
@@ -0,0 +1,164 @@
+import argparse
+import math
+import random
+import sys
+import time
+
+import part_b
+
+# Largest input the original fibonacci can take: it recurses once per element
+FIBONACCI_LIMIT = 900
+
+
+def materialize(result):
+    # Generator variants are consumed here, so every variant is timed for the complete result
+    if isinstance(result, str) or not hasattr(result, '__iter__'):
+        return result
+    return list(result)
+
+
+def random_words(size, rng):
+    words = ['level', 'hello', 'racecar', 'noon', 'python', 'abcba', 'lambda']
+    return [rng.choice(words) for _ in range(size)]
+
+
+# Each primitive: (function that builds an input of a given size, variant name -> callable taking that
+# input, how to compare results, largest size the original variant is run at)
+PRIMITIVES = {
+    'fibonacci': (
+        lambda size, rng: size,
+        {'original': part_b.fibonacci,
+         'stream': part_b.fibonacci_stream,
+         'fast': part_b.fibonacci_fast},
+        None, FIBONACCI_LIMIT),
+    'concat_strings': (
+        lambda size, rng: random_words(size, rng),
+        {'original': part_b.concat_strings,
+         'stream': part_b.concat_strings_stream,
+         'fast': part_b.concat_strings_fast},
+        ''.join, None),
+    'cumulative_sum_of_squares': (
+        lambda size, rng: [[rng.randrange(100) for _ in range(10)] for _ in range(size // 10 or 1)],
+        {'original': part_b.cumulative_sum_of_squares,
+         'stream': part_b.cumulative_sum_of_squares_stream,
+         'fast': part_b.cumulative_sum_of_squares_fast},
+        None, None),
+    'factorial': (
+        lambda size, rng: size,
+        {'original': part_b.factorial,
+         'stream': part_b.factorial_stream,
+         'fast': part_b.factorial_fast},
+        None, None),
+    'exponentiation': (
+        lambda size, rng: (3, size),
+        {'original': lambda args: part_b.exponentiation(*args),
+         'stream': lambda args: part_b.exponentiation_stream(*args),
+         'fast': lambda args: part_b.exponentiation_fast(*args)},
+        None, None),
+    'sum_even_squares': (
+        lambda size, rng: range(size),
+        {'original': part_b.sum_even_squares,
+         'stream': part_b.sum_even_squares_stream,
+         'fast': part_b.sum_even_squares_fast},
+        None, None),
+    'count_palindromes': (
+        lambda size, rng: [random_words(10, rng) for _ in range(size // 10 or 1)],
+        {'original': part_b.count_palindromes,
+         'stream': part_b.count_palindromes_stream,
+         'fast': part_b.count_palindromes_fast},
+        None, None),
+    'prime_desc': (
+        lambda size, rng: [rng.randrange(2, 20 * size + 3) for _ in range(size)],
+        {'original': part_b.prime_desc,
+         'stream': part_b.prime_desc_stream,
+         'fast': part_b.prime_desc_fast},
+        None, None),
+}
+
+
+def time_call(function, argument, repeat):
+    # Minimum wall time over repeat runs, and the result of the last one
+    best = math.inf
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = materialize(function(argument))
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def scaling_exponent(timings):
+    """
+        Estimate k in time ~ size^k from the smallest and largest sizes measured.
+    """
+    points = [(size, seconds) for size, seconds in timings if seconds > 0]
+    if len(points) < 2 or points[0][0] == points[-1][0]:
+        return None
+    (small, small_time), (large, large_time) = points[0], points[-1]
+    return math.log(large_time / small_time) / math.log(large / small)
+
+
+def run(primitives, sizes, repeat, seed):
+    """
+        Time every variant of every primitive at every size. Returns {primitive: {variant:
+        [(size, seconds)]}} and the list of disagreements found.
+    """
+    report = {}
+    mismatches = []
+    for name in primitives:
+        make_input, variants, normalize, original_limit = PRIMITIVES[name]
+        timings = report[name] = {variant: [] for variant in variants}
+        for size in sizes:
+            argument = make_input(size, random.Random(seed))
+            results = {}
+            for variant, function in variants.items():
+                if variant == 'original' and original_limit is not None and size > original_limit:
+                    continue
+                seconds, result = time_call(function, argument, repeat)
+                timings[variant].append((size, seconds))
+                results[variant] = normalize(result) if normalize is not None else result
+            expected = next(iter(results.values()))
+            for variant, result in results.items():
+                if result != expected:
+                    mismatches.append(f"{name} at size {size}: {variant} disagrees with the other variants")
+    return report, mismatches
+
+
+def print_report(report, sizes):
+    print(f"{'primitive':<27} {'variant':<9} " + " ".join(f"{'size ' + str(size):>12}" for size in sizes)
+          + f" {'scaling':>8}")
+    for name, variants in report.items():
+        for variant, timings in variants.items():
+            by_size = dict(timings)
+            cells = " ".join(f"{by_size[size] * 1000:>10.3f}ms" if size in by_size else f"{'-':>12}"
+                             for size in sizes)
+            exponent = scaling_exponent(timings)
+            print(f"{name:<27} {variant:<9} {cells} {'n^%.2f' % exponent if exponent is not None else '-':>8}")
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Check and time the variants of the Part B primitives")
+    parser.add_argument('--primitive', action='append', choices=list(PRIMITIVES),
+                        help="Primitive to measure (may be repeated; default: all)")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000],
+                        help="Input sizes to measure (default: 100 1000 10000)")
+    parser.add_argument('--repeat', type=int, default=3, help="Timed runs per measurement (the minimum is reported)")
+    parser.add_argument('--seed', type=int, default=0, help="Seed for the random inputs")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    sizes = sorted(set(args.sizes))
+    # The original fibonacci recurses once per element
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), FIBONACCI_LIMIT + 100))
+    report, mismatches = run(args.primitive or list(PRIMITIVES), sizes, args.repeat, args.seed)
+    print_report(report, sizes)
+    for message in mismatches:
+        print(f"Mismatch: {message}")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,57 @@
 from functools import reduce
+from heapq import heapify, heappop
+from itertools import islice, repeat
+from math import factorial as math_factorial, isqrt
+
+# Every task is a functional primitive with up to three variants:
+#   name         the original implementation
+#   name_stream  a generator (or lazily consuming) variant that never builds intermediate lists
+#   name_fast    an algorithmically efficient variant
+# benchmark.py checks that the variants agree and measures how each one scales.
 
 ###Task 1###
-print("Task 1:")
+# Quadratic: every level copies the rest of the list, and n is limited by the recursion limit
 fibonacci = lambda n, a=0, b=1: [a] + fibonacci(n-1, b, a+b) if n > 0 else []
-print(fibonacci(10))
 
-print()
+
+def fibonacci_stream(n=None):
+    # The Fibonacci numbers one at a time; endless when n is None
+    a, b = 0, 1
+    count = 0
+    while n is None or count < n:
+        yield a
+        a, b = b, a + b
+        count += 1
+
+
+def fibonacci_fast(n):
+    # Linear: appends in place, no recursion
+    result = []
+    a, b = 0, 1
+    for _ in range(n):
+        result.append(a)
+        a, b = b, a + b
+    return result
+
+
 ###Task 2###
-print("Task 2:")
+# Quadratic: each + copies everything joined so far
 concat_strings = lambda lst: reduce(lambda x, y: x + ' ' + y, lst)
 
-strings = ["Itay", "Neta", "Best", "Project", "Ever", "Wow"]
-result = concat_strings(strings)
-print(result)
 
-print()
+def concat_strings_stream(lst):
+    # The pieces of the joined string in order, for writing out without building it
+    for i, string in enumerate(lst):
+        if i:
+            yield ' '
+        yield string
+
+
+def concat_strings_fast(lst):
+    return ' '.join(lst)
+
+
 ###Task 3###
-print("Task 3:")
 def cumulative_sum_of_squares(list_of_lists):
     return list(
         map(
@@ -35,68 +70,240 @@ def cumulative_sum_of_squares(list_of_lists):
         )
     )
 
-input_lists = [[1, 2, 3, 4], [5, 6, 7, 8], [9, 10, 11, 12]]
-result = cumulative_sum_of_squares(input_lists)
-print(result)
 
-print()
-###Task 4###
-print("Task 4:")
+def cumulative_sum_of_squares_stream(list_of_lists):
+    # One [sum] per sublist, computed when it is reached
+    for sublist in list_of_lists:
+        yield [sum(x * x for x in sublist if x % 2 == 0)]
+
 
+def cumulative_sum_of_squares_fast(list_of_lists):
+    return [[sum(x * x for x in sublist if x % 2 == 0)] for sublist in list_of_lists]
+
+
+###Task 4###
 def apply_cumulatively(binary_op):
     return lambda sequence: reduce(binary_op, sequence)
 
+
 # Factorial
 def factorial(n):
     if n == 0:
         return 1
     return apply_cumulatively(lambda x, y: x * y)(range(1, n + 1))
 
+
+def factorials():
+    # 0!, 1!, 2!, ... one at a time
+    value = 1
+    n = 0
+    while True:
+        yield value
+        n += 1
+        value *= n
+
+
+def factorial_stream(n):
+    return next(islice(factorials(), n, None))
+
+
+def factorial_fast(n):
+    # Multiplies balanced halves, so the big-number products stay small for most of the work
+    return math_factorial(n)
+
+
 # Exponentiation
 def exponentiation(base, exp):
     return apply_cumulatively(lambda x, y: x * y)([base] * exp)
 
-print(factorial(5))
-print(exponentiation(2, 3))
 
-print()
+def exponentiation_stream(base, exp):
+    # Same products, without the list of exp copies of base
+    return reduce(lambda x, y: x * y, repeat(base, exp), 1)
+
+
+def exponentiation_fast(base, exp):
+    # Exponentiation by squaring: O(log exp) multiplications
+    return pow(base, exp)
+
+
 ###Task 5###
-print("Task 5:")
+def sum_even_squares(nums):
+    return reduce(lambda total, x: total + x, map(lambda x: x**2, filter(lambda x: x % 2 == 0, nums)))
 
-nums = [1, 2, 3, 4, 5, 6]
-sum_squared = reduce(lambda total, x: total + x, map(lambda x: x**2, filter(lambda x: x % 2 == 0, nums)))
-print(sum_squared)
 
-print()
-###Task 6###
-print("Task 6:")
+def sum_even_squares_stream(nums):
+    return sum(x * x for x in nums if x % 2 == 0)
+
+
+def sum_even_squares_fast(nums):
+    # Closed form for ranges of consecutive integers, otherwise one pass
+    if isinstance(nums, range) and nums.step == 1 and nums.start >= 0:
+        def squares_below(stop):
+            # (2k)^2 for 0 <= 2k < stop: 4 * (m - 1) * m * (2m - 1) / 6 with m = ceil(stop / 2)
+            m = (stop + 1) // 2
+            return 2 * (m - 1) * m * (2 * m - 1) // 3
+        return squares_below(max(nums.stop, nums.start)) - squares_below(nums.start)
+    return sum_even_squares_stream(nums)
+
 
+###Task 6###
 count_palindromes = lambda lst: list(map(lambda sublist: reduce(lambda total, x: total + 1, filter(lambda s: s == s[::-1], sublist), 0), lst))
-lst = [['wow', 'hello', 'level'], ['programming languages', 'lol'], ['amazing', 'racecar']]
-result = count_palindromes(lst)
-print(result)  # Output: [2, 1, 1]
-
-print()
-###Task 7###
-print("Task 7:")
-
-print("Lazy evaluation is a technique where values are only computed when they are actually needed, rather than all at once.\n"
-          "This can make programs more efficient by saving time and memory.\n\n"
-          "Eager Evaluation:\n"
-          "In the first part of the program, eager evaluation is used.\n"
-          "Here, the function that generates values is called, and all the values are created and stored in a list immediately.\n"
-          "This means the program runs through the entire sequence, generating all values at once, and then processes each value to compute its square.\n"
-          "This approach can be inefficient if the dataset is large because it requires storing all the values in memory at once.\n\n"
-          "Lazy Evaluation:\n"
-          "In the second part of the program, lazy evaluation is demonstrated.\n"
-          "Instead of generating all values at once, the program creates each value only when it is needed.\n"
-          "The function that generates values is used directly in the list comprehension,\nso it produces one value at a time as the list comprehension processes each value to compute its square.\n"
-          "This means the program doesn’t need to store all the values in memory, making it more efficient.\n")
 
-###Task 8###
-print("Task 8:")
 
+def count_palindromes_stream(lst):
+    for sublist in lst:
+        yield sum(1 for s in sublist if s == s[::-1])
+
+
+def count_palindromes_fast(lst):
+    return [sum(s == s[::-1] for s in sublist) for sublist in lst]
+
+
+###Task 8###
+# Trial division for every element
 prime_desc = lambda lst: sorted([x for x in lst if x > 1 and all(x % i != 0 for i in range(2, int(x**0.5) + 1))], reverse=True)
-sample_list = [10, 3, 5, 7, 11, 4, 6, 13, 17, 19, 23, 29, 31]
-result = prime_desc(sample_list)
-print(result)
+
+
+def is_prime(x):
+    if x < 2:
+        return False
+    if x % 2 == 0:
+        return x == 2
+    for i in range(3, isqrt(x) + 1, 2):
+        if x % i == 0:
+            return False
+    return True
+
+
+def prime_desc_stream(lst):
+    # The primes of lst from largest to smallest, found lazily: each one is tested only when the
+    # next largest is asked for, so taking the top few primes of a long list tests few elements
+    heap = [-x for x in lst]
+    heapify(heap)
+    while heap:
+        x = -heappop(heap)
+        if is_prime(x):
+            yield x
+
+
+def sieve(limit):
+    # is_prime flags for 0..limit, by the sieve of Eratosthenes
+    flags = bytearray([1]) * (limit + 1)
+    flags[:2] = bytes(min(2, limit + 1))
+    for i in range(2, isqrt(limit) + 1):
+        if flags[i]:
+            flags[i * i::i] = bytes(len(range(i * i, limit + 1, i)))
+    return flags
+
+
+# The sieve covers at most SIEVE_PER_ELEMENT values per list element and never more than
+# SIEVE_LIMIT, so its memory follows the length of the list rather than its largest value
+SIEVE_PER_ELEMENT = 64
+SIEVE_LIMIT = 1 << 24
+# Miller-Rabin with these bases decides primality exactly below MILLER_RABIN_LIMIT
+MILLER_RABIN_BASES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41)
+MILLER_RABIN_LIMIT = 3317044064679887385961981
+
+
+def is_prime_large(x):
+    # Primality of an element above the sieve: deterministic Miller-Rabin, or trial division past its range
+    if x >= MILLER_RABIN_LIMIT:
+        return is_prime(x)
+    if x < 2:
+        return False
+    for p in MILLER_RABIN_BASES:
+        if x % p == 0:
+            return x == p
+    d, r = x - 1, 0
+    while d % 2 == 0:
+        d //= 2
+        r += 1
+    for a in MILLER_RABIN_BASES:
+        y = pow(a, d, x)
+        if y == 1 or y == x - 1:
+            continue
+        for _ in range(r - 1):
+            y = y * y % x
+            if y == x - 1:
+                break
+        else:
+            return False
+    return True
+
+
+def prime_desc_fast(lst):
+    # One sieve answers the primality of the small elements in O(1); larger ones are tested one by one
+    largest = max(lst, default=1)
+    if largest < 2:
+        return []
+    limit = min(largest, SIEVE_LIMIT, SIEVE_PER_ELEMENT * len(lst))
+    flags = sieve(limit)
+    return sorted((x for x in lst if x > 1 and (flags[x] if x <= limit else is_prime_large(x))), reverse=True)
+
+
+def main():
+    ###Task 1###
+    print("Task 1:")
+    print(fibonacci(10))
+
+    print()
+    ###Task 2###
+    print("Task 2:")
+    strings = ["Itay", "Neta", "Best", "Project", "Ever", "Wow"]
+    result = concat_strings(strings)
+    print(result)
+
+    print()
+    ###Task 3###
+    print("Task 3:")
+    input_lists = [[1, 2, 3, 4], [5, 6, 7, 8], [9, 10, 11, 12]]
+    result = cumulative_sum_of_squares(input_lists)
+    print(result)
+
+    print()
+    ###Task 4###
+    print("Task 4:")
+    print(factorial(5))
+    print(exponentiation(2, 3))
+
+    print()
+    ###Task 5###
+    print("Task 5:")
+    nums = [1, 2, 3, 4, 5, 6]
+    sum_squared = sum_even_squares(nums)
+    print(sum_squared)
+
+    print()
+    ###Task 6###
+    print("Task 6:")
+    lst = [['wow', 'hello', 'level'], ['programming languages', 'lol'], ['amazing', 'racecar']]
+    result = count_palindromes(lst)
+    print(result)  # Output: [2, 1, 1]
+
+    print()
+    ###Task 7###
+    print("Task 7:")
+
+    print("Lazy evaluation is a technique where values are only computed when they are actually needed, rather than all at once.\n"
+              "This can make programs more efficient by saving time and memory.\n\n"
+              "Eager Evaluation:\n"
+              "In the first part of the program, eager evaluation is used.\n"
+              "Here, the function that generates values is called, and all the values are created and stored in a list immediately.\n"
+              "This means the program runs through the entire sequence, generating all values at once, and then processes each value to compute its square.\n"
+              "This approach can be inefficient if the dataset is large because it requires storing all the values in memory at once.\n\n"
+              "Lazy Evaluation:\n"
+              "In the second part of the program, lazy evaluation is demonstrated.\n"
+              "Instead of generating all values at once, the program creates each value only when it is needed.\n"
+              "The function that generates values is used directly in the list comprehension,\nso it produces one value at a time as the list comprehension processes each value to compute its square.\n"
+              "This means the program doesn’t need to store all the values in memory, making it more efficient.\n")
+
+    ###Task 8###
+    print("Task 8:")
+    sample_list = [10, 3, 5, 7, 11, 4, 6, 13, 17, 19, 23, 29, 31]
+    result = prime_desc(sample_list)
+    print(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+import argparse
+import collections
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import server
+from AST_Node import FunctionDef, Import
+from my_lexer import tokenize
+from my_parser import Parser
+from server import SERVER_ENGINES, CPUTimeLimitExceeded, positive_number, run_statements
+
+PROGRAM_SUFFIX = '.lambda'
+JOBS_SUFFIX = '.jsonl'
+CHUNK_SIZE = 64  # Jobs sent to a worker at once
+RECYCLE = 1000  # Jobs a worker runs before replacing its interpreter
+
+# State of a worker process, set up by init_worker
+_state = {}
+
+
+def init_worker(options, library, max_memory, recycle):
+    """
+        Set up the worker as a server worker does, and remember the library's bindings so every
+        job can start from them.
+    """
+    server.init_worker(options, library, max_memory)
+    _state['recycle'] = recycle
+    reset_interpreter(server.worker_interpreter())
+
+
+def reset_interpreter(interpreter):
+    _state['interpreter'] = interpreter
+    _state['baseline'] = dict(interpreter.global_scope)
+    _state['jobs'] = 0
+
+
+def restore(interpreter, baseline):
+    # Undo the bindings a job made, so the next job sees the library and nothing else
+    global_scope = interpreter.global_scope
+    removed = [value for name, value in global_scope.items() if baseline.get(name) is not value]
+    for func in removed:
+        if func.name not in baseline:
+            interpreter.undefine(func.name)
+    for name, value in baseline.items():
+        if global_scope.get(name) is not value:
+            interpreter.define_function(value)
+    interpreter.modules.pending.clear()
+    if interpreter.memo is not None:
+        # Otherwise every later rebinding would keep clearing the caches of the job's functions
+        interpreter.memo.forget(removed)
+
+
+def run_chunk(jobs, cpu_limit, max_depth, max_steps):
+    return [run_job(job, cpu_limit, max_depth, max_steps) for job in jobs]
+
+
+def run_job(job, cpu_limit, max_depth, max_steps):
+    start = time.perf_counter()
+    response = {'id': job['id']}
+    try:
+        response.update(evaluate_job(job, cpu_limit, max_depth, max_steps))
+    except Exception as e:
+        response.update({'ok': False, 'error': f"Error: job failed: {e}"})
+    response['time'] = time.perf_counter() - start
+    return response
+
+
+def evaluate_job(job, cpu_limit, max_depth, max_steps):
+    """
+        Run one job in the worker's warm interpreter and return its outcome. A job runs a program
+        (read from the file 'program', or given as 'source'), then evaluates 'call', if any. The
+        program's statements are reported in order, without the statements themselves. Functions
+        a job defines or imports are removed afterwards, which restores the library bindings
+        without building a new interpreter; the interpreter is only replaced every few hundred
+        jobs, to release what it kept for the functions of earlier jobs.
+    """
+    if 'error' in job:
+        return {'ok': False, 'error': job['error']}
+    path = job.get('program')
+    source = job.get('source')
+    call = job.get('call')
+    if path is not None:
+        try:
+            with open(path, 'r') as file:
+                source = file.read()
+        except (OSError, UnicodeError) as e:
+            return {'ok': False, 'error': f"An error occurred while reading the file: {e}"}
+    if not isinstance(source, (str, type(None))) or not isinstance(call, (str, type(None))) \
+            or (source is None and call is None):
+        return {'ok': False, 'error': "Job needs a 'program', 'source' or 'call' string"}
+    try:
+        statements = Parser(tokenize(source)).parse() if source is not None else []
+        calls = Parser(tokenize(call)).parse() if call is not None else []
+    except Exception as e:
+        return {'ok': False, 'error': f"An error occurred while parsing the code: {e}"}
+    if call is not None and len(calls) != 1:
+        return {'ok': False, 'error': "A call must be a single expression"}
+
+    interpreter = _state['interpreter']
+    interpreter.modules.directory = os.path.dirname(path) if path is not None else None
+    interpreter.machine.max_depth = interpreter.vm.max_depth = max_depth
+    interpreter.governor.max_steps = max_steps
+    binds = any(isinstance(node, (FunctionDef, Import)) for node in statements)
+
+    start = time.process_time()
+    try:
+        outcomes = run_statements(interpreter, statements + calls, cpu_limit, describe=False)
+    except CPUTimeLimitExceeded as e:
+        return {'ok': False, 'error': str(e), 'cpu_time': time.process_time() - start}
+    finally:
+        if binds:
+            restore(interpreter, _state['baseline'])
+        _state['jobs'] += 1
+        if _state['jobs'] >= _state['recycle']:
+            reset_interpreter(server.new_interpreter())
+    errors = [outcome['error'] for outcome in outcomes if 'error' in outcome]
+    response = {'ok': not errors}
+    if errors:
+        response['error'] = errors[0]
+    if calls:
+        outcome = outcomes.pop()
+        if 'result' in outcome:
+            response['result'] = outcome['result']
+    if statements:
+        response['statements'] = outcomes
+    response['cpu_time'] = time.process_time() - start
+    return response
+
+
+def program_job(path):
+    return {'id': path, 'program': path}
+
+
+def read_jobs(file, name):
+    # Jobs of a JSON-lines stream; a line that is not a job becomes a job that fails with the reason
+    for number, line in enumerate(file, 1):
+        if not line.strip():
+            continue
+        job_id = f"{name}:{number}"
+        try:
+            job = json.loads(line)
+        except ValueError as e:
+            yield {'id': job_id, 'error': f"Invalid JSON: {e}"}
+            continue
+        if not isinstance(job, dict):
+            yield {'id': job_id, 'error': "Job must be a JSON object"}
+            continue
+        job.setdefault('id', job_id)
+        yield job
+
+
+def collect_jobs(inputs):
+    """
+        Yield the jobs of the inputs in order, reading them lazily: a directory runs each of its
+        .lambda files, a glob pattern each file it matches, a .jsonl file (or - for standard
+        input) one job per line, and any other path the program it names.
+    """
+    for name in inputs:
+        if name == '-':
+            yield from read_jobs(sys.stdin, '<stdin>')
+        elif os.path.isdir(name):
+            for entry in sorted(os.listdir(name)):
+                if entry.endswith(PROGRAM_SUFFIX):
+                    yield program_job(os.path.join(name, entry))
+        elif name.endswith(JOBS_SUFFIX) and os.path.isfile(name):
+            with open(name, 'r') as file:
+                yield from read_jobs(file, name)
+        elif glob.has_magic(name):
+            for path in sorted(glob.glob(name, recursive=True)):
+                if os.path.isfile(path):
+                    yield program_job(path)
+        else:
+            yield program_job(name)
+
+
+def chunks(jobs, size):
+    chunk = []
+    for job in jobs:
+        chunk.append(job)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class Summary:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.jobs = 0
+        self.failures = 0
+        self.times = []
+
+    def add(self, response):
+        self.jobs += 1
+        if not response['ok']:
+            self.failures += 1
+        self.times.append(response.get('time', 0.0))
+
+    def report(self, file):
+        wall = time.perf_counter() - self.started
+        times = sorted(self.times)
+
+        def percentile(p):
+            return times[min(len(times) - 1, int(p * len(times)))] * 1000 if times else 0.0
+        print(f"jobs: {self.jobs}, ok: {self.jobs - self.failures}, failed: {self.failures}, "
+              f"wall time: {wall:.3f}s, throughput: {self.jobs / wall if wall > 0 else 0.0:.1f} jobs/s", file=file)
+        print(f"job time: p50 {percentile(0.5):.3f}ms, p95 {percentile(0.95):.3f}ms, "
+              f"p99 {percentile(0.99):.3f}ms, max {times[-1] * 1000 if times else 0.0:.3f}ms", file=file)
+
+
+class BatchRunner:
+    """
+        Runs jobs on a pool of warm worker processes, each with the library defined once. Jobs are
+        sent in chunks, so the cost of passing work between processes is paid per chunk rather
+        than per job, and a bounded number of chunks is in flight, so a long stream of jobs is
+        never read into memory at once. Results are written as JSON lines in the order of the
+        jobs.
+
+        A job that fails only produces a failed result. If a job takes its worker down, the pool
+        is restarted and the jobs that were in flight are run again one at a time, so only the
+        job responsible fails.
+    """
+
+    def __init__(self, workers, options, library, cpu_limit=1.0, max_depth=10000, max_steps=None,
+                 max_memory=None, chunk_size=CHUNK_SIZE, recycle=RECYCLE):
+        self.workers = workers
+        self.initargs = (options, library, max_memory, recycle)
+        self.limits = (cpu_limit, max_depth, max_steps)
+        self.chunk_size = chunk_size
+        self.pool = self.new_pool()
+
+    def new_pool(self):
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker, initargs=self.initargs)
+
+    def restart(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        self.pool = self.new_pool()
+
+    def submit(self, jobs):
+        try:
+            return self.pool.submit(run_chunk, jobs, *self.limits)
+        except BrokenProcessPool:
+            # Another chunk took a worker down since the last restart
+            self.restart()
+            return self.pool.submit(run_chunk, jobs, *self.limits)
+
+    def results(self, jobs, future):
+        try:
+            return future.result()
+        except BrokenProcessPool:
+            pass
+        results = []
+        for job in jobs:
+            # Alone in its call, so if the worker dies again this job is the one that killed it
+            try:
+                results += self.submit([job]).result()
+            except BrokenProcessPool as e:
+                self.restart()
+                results.append({'id': job['id'], 'ok': False, 'error': f"Worker failed: {e}"})
+            except Exception as e:
+                results.append({'id': job['id'], 'ok': False, 'error': f"Worker failed: {e}"})
+        return results
+
+    def run(self, jobs, output, summary):
+        in_flight = collections.deque()
+
+        def write_oldest():
+            chunk, future = in_flight.popleft()
+            for response in self.results(chunk, future):
+                summary.add(response)
+                output.write(json.dumps(response) + "\n")
+
+        for chunk in chunks(jobs, self.chunk_size):
+            in_flight.append((chunk, self.submit(chunk)))
+            if len(in_flight) > 2 * self.workers:
+                write_oldest()
+        while in_flight:
+            write_oldest()
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Run many lambda programs or calls on a pool of warm workers")
+    parser.add_argument('inputs', nargs='+',
+                        help="Directory of .lambda files, glob pattern, program file, or .jsonl file of jobs "
+                             "('-' reads jobs from standard input)")
+    parser.add_argument('--output', '-o', help="Write the results to this file (default: standard output)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Number of worker processes")
+    parser.add_argument('--library', action='append', default=[],
+                        help="Program whose Defuns every job can call (may be repeated)")
+    parser.add_argument('--engine', choices=SERVER_ENGINES, default='vm', help="Evaluation engine of the workers")
+    parser.add_argument('--memo-size', type=int, default=1024, help="Cached results per pure function (0 disables)")
+    parser.add_argument('--max-depth', type=int, default=10000, help="Maximum evaluation depth of a job")
+    parser.add_argument('--max-steps', type=int, default=None, help="Function calls a job may make")
+    parser.add_argument('--max-memory', type=int, default=None, metavar='MB',
+                        help="Megabytes a worker may grow by while it runs a job")
+    parser.add_argument('--cpu-limit', type=positive_number, default=1.0, help="CPU seconds a job may use")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                        help=f"Jobs sent to a worker at once (default: {CHUNK_SIZE})")
+    parser.add_argument('--recycle', type=int, default=RECYCLE,
+                        help=f"Jobs a worker runs before it builds a new interpreter (default: {RECYCLE})")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    library = ""
+    for path in args.library:
+        with open(path) as file:
+            library += file.read() + "\n"
+    Parser(tokenize(library)).parse()  # Report syntax errors in the library before starting
+    options = {'engine': args.engine, 'max_depth': args.max_depth, 'memo_size': args.memo_size}
+    max_memory = args.max_memory * 1024 * 1024 if args.max_memory is not None else None
+    runner = BatchRunner(args.workers, options, library, args.cpu_limit, args.max_depth, args.max_steps,
+                         max_memory, max(1, args.chunk_size), max(1, args.recycle))
+    summary = Summary()
+    output = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        runner.run(collect_jobs(args.inputs), output, summary)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        runner.close()
+        if output is not sys.stdout:
+            output.close()
+        else:
+            output.flush()
+        summary.report(sys.stderr)
+    if summary.failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+import argparse
+import gc
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+from my_interpreter import Interpreter, ENGINES
+from my_lexer import tokenize
+from my_parser import Parser
+from my_cache import INTERPRETER_VERSION
+
+PHASES = ('tokenize', 'parse', 'execute')
+# Relative slowdown (or memory growth) over the baseline that counts as a regression
+DEFAULT_THRESHOLD = 0.10
+# Timings shorter than this are too noisy to flag
+MIN_SECONDS = 0.001
+
+
+# Workload generators. Each takes a size and returns the source of a program.
+
+def deep_recursion(size):
+    # One non-tail recursive call chain of the given depth
+    return ("Defun {name: sum_to_n, arguments: (n)} (n == 0) ? 0 : (n + sum_to_n(n - 1))\n"
+            f"sum_to_n({size})\n")
+
+
+def wide_program(size):
+    # Thousands of small definitions, each called once
+    lines = [f"Defun {{ name: f{i}, arguments: (x, y) }} (x > y) ? x * {i} - y : (y + {i}) % (x + 1)"
+             for i in range(size)]
+    lines += [f"f{i}({i % 7}, {i % 5})" for i in range(size)]
+    return "\n".join(lines) + "\n"
+
+
+def arithmetic_chain(size):
+    # A long left-nested expression over a parameter, so the optimizer cannot fold it away
+    ops = ('+', '*', '-', '%')
+    terms = " ".join(f"{ops[i % 4]} {i % 9 + 1}" for i in range(size))
+    return (f"Defun {{ name: chain, arguments: (x,) }} x {terms}\n"
+            "chain(3)\nchain(17)\nchain(-5)\n")
+
+
+def closure_heavy(size):
+    # Creates closures at every step: the curried lambda returns one, which is then applied to acc
+    return ("Defun { name: closures, arguments: (n, acc) } (n == 0) ? acc : "
+            "closures(n - 1, (Lambd x. Lambd y. (Lambd z. z + x)(y))(n, acc))\n"
+            + f"closures({size}, 0)\n" * 10)
+
+
+def classic(size):
+    # The factorial, fibonacci and gcd cases from test_program.lambda
+    return ("Defun { name: factorial, arguments: (n,) } (n == 0) ? 1 : (n * factorial(n - 1))\n"
+            "Defun { name: fibonacci, arguments: (n,) } (n <= 1) ? n : (fibonacci(n - 1) + fibonacci(n - 2))\n"
+            "Defun { name: gcd, arguments: (a, b) } (b == 0) ? a : gcd(b, a % b)\n"
+            f"factorial({size})\n"
+            f"fibonacci({min(size // 10, 25)})\n"
+            f"gcd({size * 7919}, {size * 104729})\n")
+
+
+# name -> (generator, default size)
+WORKLOADS = {
+    'deep-recursion': (deep_recursion, 800),
+    'wide-program': (wide_program, 2000),
+    'arithmetic-chain': (arithmetic_chain, 1000),
+    'closures': (closure_heavy, 500),
+    'classic': (classic, 200),
+}
+
+
+def run_phase(phase, source, interpreter_options):
+    # Run one phase from scratch and return its output; the earlier phases are run untimed
+    tokens = tokenize(source)
+    if phase == 'tokenize':
+        return lambda: tokenize(source)
+    statements = Parser(tokens).parse()
+    if phase == 'parse':
+        return lambda: Parser(tokens).parse()
+
+    def execute():
+        interpreter = Interpreter(**interpreter_options)
+        results = []
+        for node in statements:
+            try:
+                results.append(interpreter.evaluate(node))
+            except Exception as e:
+                results.append(e)
+        return results
+    return execute
+
+
+def measure(run, repeat):
+    """
+        Time run repeat times, then run it once more under tracemalloc to measure memory.
+    """
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+
+    gc.collect()
+    blocks_before = sys.getallocatedblocks()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    result = run()
+    after, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    blocks_after = sys.getallocatedblocks()
+    del result
+    return {
+        'min_seconds': min(times),
+        'median_seconds': statistics.median(times),
+        'allocated_blocks': blocks_after - blocks_before,  # Blocks still alive after the phase
+        'retained_bytes': after - before,
+        'peak_bytes': peak - before,
+    }
+
+
+def run_benchmarks(workloads, scale, repeat, interpreter_options):
+    results = {}
+    for name in workloads:
+        generate, size = WORKLOADS[name]
+        size = max(1, int(size * scale))
+        source = generate(size)
+        results[name] = {'size': size}
+        for phase in PHASES:
+            results[name][phase] = measure(run_phase(phase, source, interpreter_options), repeat)
+    return results
+
+
+def compare(baseline, current, threshold):
+    """
+        Return (workload, phase, metric, old, new) for every measurement that got worse by more
+        than threshold. Workloads of different sizes are not compared.
+    """
+    regressions = []
+    for name, phases in current['results'].items():
+        old_phases = baseline['results'].get(name)
+        if old_phases is None or old_phases['size'] != phases['size']:
+            continue
+        for phase in PHASES:
+            old, new = old_phases[phase], phases[phase]
+            if new['min_seconds'] > MIN_SECONDS and new['min_seconds'] > old['min_seconds'] * (1 + threshold):
+                regressions.append((name, phase, 'min_seconds', old['min_seconds'], new['min_seconds']))
+            if new['peak_bytes'] > old['peak_bytes'] * (1 + threshold) + 1024:
+                regressions.append((name, phase, 'peak_bytes', old['peak_bytes'], new['peak_bytes']))
+    return regressions
+
+
+def describe_regression(name, phase, metric, old, new):
+    # The relative change, or the absolute one when the baseline was 0
+    change = f"{(new / old - 1) * 100:+.1f}%" if old else f"{new - old:+.6g}"
+    return f"REGRESSION {name}/{phase} {metric}: {old:.6g} -> {new:.6g} ({change})"
+
+
+def print_results(report):
+    print(f"engine: {report['engine']}, memo: {report['memo']}, optimize: {report['optimize']}")
+    print(f"{'workload':<18} {'phase':<9} {'min ms':>10} {'median ms':>10} {'peak KiB':>10} {'blocks':>9}")
+    for name, phases in report['results'].items():
+        for phase in PHASES:
+            m = phases[phase]
+            print(f"{name:<18} {phase:<9} {m['min_seconds'] * 1000:>10.2f} {m['median_seconds'] * 1000:>10.2f} "
+                  f"{m['peak_bytes'] / 1024:>10.1f} {m['allocated_blocks']:>9}")
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark the lexer, parser and evaluation engines")
+    parser.add_argument('--engine', choices=ENGINES, default='compiled', help="Evaluation engine to measure")
+    parser.add_argument('--workload', action='append', choices=list(WORKLOADS),
+                        help="Workload to run (may be repeated; default: all)")
+    parser.add_argument('--scale', type=float, default=1.0, help="Multiply every workload size by this factor")
+    parser.add_argument('--repeat', type=int, default=5, help="Timed runs per phase (the minimum is reported)")
+    parser.add_argument('--no-memo', action='store_true', help="Do not memoize pure functions")
+    parser.add_argument('--no-optimize', action='store_true', help="Skip the AST optimization passes")
+    parser.add_argument('--output', help="Write the results as JSON to this file")
+    parser.add_argument('--compare', metavar='BASELINE',
+                        help="Compare against results stored with --output and exit with status 1 on regressions")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="Relative slowdown or memory growth that counts as a regression (default: 0.10)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    # The tree and compiled engines recurse on the Python stack
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 100000))
+    interpreter_options = {'engine': args.engine, 'memo_size': 0 if args.no_memo else 1024,
+                           'optimize': not args.no_optimize}
+    workloads = args.workload or list(WORKLOADS)
+    report = {
+        'interpreter_version': INTERPRETER_VERSION,
+        'python': platform.python_version(),
+        'engine': args.engine,
+        'memo': not args.no_memo,
+        'optimize': not args.no_optimize,
+        'scale': args.scale,
+        'results': run_benchmarks(workloads, args.scale, args.repeat, interpreter_options),
+    }
+    print_results(report)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        if baseline.get('engine') != report['engine']:
+            print(f"Warning: baseline was measured with the '{baseline.get('engine')}' engine")
+        regressions = compare(baseline, report, args.threshold)
+        for regression in regressions:
+            print(describe_regression(*regression))
+        if regressions:
+            sys.exit(1)
+        print("No regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,193 @@
-from my_interpreter import Interpreter
-import sys
+from my_interpreter import Interpreter, ENGINES
+from my_optimizer import PASSES
+from my_cache import ProgramCache
+from my_profiler import Profiler, PROFILED_ENGINES
+from my_forkjoin import ForkJoin, FORK_JOIN_ENGINES
+from my_resolver import Resolver
+from my_governor import Governor
+from my_jit import DEFAULT_THRESHOLD
+from my_pgo import ProfileRecorder, ProfileGuide, PGO_ENGINES, load_profile, sidecar_path, is_profile_file
+import argparse
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Interpreter for the lambda language")
+    parser.add_argument('file', nargs='?', help="Program file to run (omit for interactive mode)")
+    parser.add_argument('--engine', choices=ENGINES, default='compiled',
+                        help="Evaluation engine: compiled closures (default), the recursive tree walker, "
+                             "the explicit-stack 'cek' machine with proper tail calls, or the bytecode 'vm'")
+    parser.add_argument('--no-compile', action='store_true',
+                        help="Evaluate with the tree-walking interpreter (same as --engine tree)")
+    parser.add_argument('--max-depth', type=int, default=None,
+                        help="Maximum evaluation depth for the 'cek' and 'vm' engines (default: limited only by memory)")
+    parser.add_argument('--memo-size', type=int, default=1024,
+                        help="Maximum number of cached results per pure function (default: 1024)")
+    parser.add_argument('--no-memo', action='store_true',
+                        help="Do not memoize pure functions")
+    parser.add_argument('--memo-stats', action='store_true',
+                        help="Print cache hits and misses of memoized functions after the program ends")
+    parser.add_argument('--no-optimize', action='store_true',
+                        help="Run statements exactly as parsed, without the AST optimization passes")
+    parser.add_argument('--disable-pass', action='append', choices=list(PASSES), default=[],
+                        help="Skip one optimization pass (may be repeated)")
+    parser.add_argument('--dump-optimized', action='store_true',
+                        help="Print each statement after the optimization passes have rewritten it")
+    parser.add_argument('--disassemble', action='store_true',
+                        help="Print the bytecode of each statement and function (implies --engine vm)")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="Parse the program even if an up-to-date parsed copy is cached")
+    parser.add_argument('--cache-dir', default=None,
+                        help="Directory of the parsed-program cache (default: ~/.cache/lambda-interpreter)")
+    parser.add_argument('--module-path', action='append', default=[], metavar='DIR',
+                        help="Directory searched for imported modules after the program's own (may be repeated)")
+    parser.add_argument('--profile', action='store_true',
+                        help="Print per-function call counts and timings after the program ends "
+                             "(runs the compiled engine unless --engine tree is given)")
+    parser.add_argument('--profile-output', metavar='FILE',
+                        help="With --profile, also write collapsed stacks for flame graph tools to FILE")
+    parser.add_argument('--pgo-record', action='store_true',
+                        help="Record how often each branch and call site of the program's functions runs, adding "
+                             "the counts to the profile file (runs the compiled engine)")
+    parser.add_argument('--pgo-use', action='store_true',
+                        help="Tune memo cache sizes and the JIT to the profile file")
+    parser.add_argument('--pgo-file', metavar='FILE',
+                        help="Profile file of --pgo-record and --pgo-use (default: the program path plus .pgo.json)")
+    parser.add_argument('--jobs', type=int, default=1,
+                        help="Run independent top-level expressions in this many worker processes (default: 1). "
+                             "Ignored with --profile, --pgo-record, --disassemble, --dump-optimized, --check and "
+                             "the --max-* limits, which apply per process")
+    parser.add_argument('--fork-join', type=int, metavar='WORKERS', default=0,
+                        help="Evaluate independent pure calls inside an expression in parallel, on this many "
+                             "worker processes (runs the compiled engine unless --engine tree is given)")
+    parser.add_argument('--fork-threshold', type=float, default=0.01, metavar='SECONDS',
+                        help="With --fork-join, run calls measured to take less than this sequentially (default: 0.01)")
+    parser.add_argument('--check', action='store_true',
+                        help="Warn about calls to undefined functions and wrong argument counts before each statement runs")
+    parser.add_argument('--lazy', action='store_true',
+                        help="Pass arguments that a function may not use unevaluated, evaluating them at most once "
+                             "if they are used (runs the tree engine)")
+    parser.add_argument('--jit-threshold', type=int, default=DEFAULT_THRESHOLD, metavar='CALLS',
+                        help=f"Translate a function to Python after this many calls (default: {DEFAULT_THRESHOLD}; "
+                             "compiled and tree engines)")
+    parser.add_argument('--no-jit', action='store_true',
+                        help="Never translate functions to Python (implied by --profile, --pgo-record, --fork-join "
+                             "and the --max-* limits)")
+    parser.add_argument('--dump-jit', action='store_true',
+                        help="Print the Python source of each function as it is translated")
+    parser.add_argument('--max-steps', type=int, default=None,
+                        help="Stop a statement with an error after this many function calls")
+    parser.add_argument('--max-call-depth', type=int, default=None,
+                        help="Stop a statement with an error once its calls nest deeper than this")
+    parser.add_argument('--max-memory', type=int, default=None, metavar='MB',
+                        help="Stop a statement with an error once the process has grown by this many megabytes")
+    return parser.parse_args()
+
+
+def print_memo_stats(interpreter):
+    if interpreter.memo is None:
+        return
+    print("Memoized function        hits    misses   entries")
+    for name, hits, misses, entries in interpreter.memo.stats():
+        print(f"{name:<20} {hits:>9} {misses:>9} {entries:>9}")
+
+
+def profile_path(args):
+    # The file given to --pgo-file, or the program's sidecar profile when none was
+    if args.pgo_file:
+        return args.pgo_file
+    return sidecar_path(args.file) if args.file else None
+
 
 def main():
-    if len(sys.argv) > 1:
+    args = parse_arguments()
+    path = profile_path(args)
+    record_path = path if args.pgo_record else None
+    use_path = path if args.pgo_use else None
+    if (args.pgo_record or args.pgo_use) and path is None:
+        print("Error: --pgo-record and --pgo-use need --pgo-file in interactive mode")
+        return
+    if args.pgo_record and args.lazy:
+        print("Error: --pgo-record cannot be combined with --lazy")
+        return
+    if record_path is not None and not is_profile_file(record_path):
+        # Most likely the program itself, given as the profile file
+        print(f"Error: {record_path} exists and is not a profile, so it will not be overwritten")
+        return
+    engine = 'tree' if args.no_compile else args.engine
+    if args.disassemble:
+        engine = 'vm'
+    if args.profile and engine not in PROFILED_ENGINES:
+        engine = 'compiled'
+    if args.fork_join and engine not in FORK_JOIN_ENGINES:
+        engine = 'compiled'
+    if record_path is not None and engine not in PGO_ENGINES:
+        engine = 'compiled'
+    if args.lazy:
+        engine = 'tree'
+    memo_size = 0 if args.no_memo else args.memo_size
+    governed = args.max_steps is not None or args.max_call_depth is not None or args.max_memory is not None
+    # Translated functions call themselves directly, out of sight of the profiler, the profile recorder,
+    # the fork-join evaluator and the governor
+    recording = record_path is not None
+    jit_threshold = (0 if args.no_jit or args.profile or recording or args.fork_join or governed
+                     else args.jit_threshold)
+    interpreter = Interpreter(engine=engine, max_depth=args.max_depth, memo_size=memo_size,
+                              optimize=not args.no_optimize, disabled_passes=args.disable_pass,
+                              jit_threshold=jit_threshold, lazy=args.lazy)
+    if interpreter.jit is not None:
+        interpreter.jit.dump = args.dump_jit
+    interpreter.modules.search_path = args.module_path
+    interpreter.dump_bytecode = args.disassemble
+    interpreter.dump_optimized = args.dump_optimized
+    if not args.no_cache:
+        interpreter.cache = ProgramCache(args.cache_dir)
+    if args.check:
+        interpreter.resolver = Resolver(interpreter.global_scope)
+    if governed:
+        max_memory = args.max_memory * 1024 * 1024 if args.max_memory is not None else None
+        Governor(args.max_steps, args.max_call_depth, max_memory).install(interpreter)
+    fork_join = None
+    if args.fork_join:
+        fork_join = ForkJoin(interpreter, args.fork_join, args.fork_threshold)
+        fork_join.install()
+    if use_path is not None:
+        profiles = load_profile(use_path)
+        if profiles is None:
+            print(f"Warning: no usable profile in {use_path}")
+        else:
+            ProfileGuide(profiles).install(interpreter)
+    recorder = None
+    if recording:
+        recorder = ProfileRecorder(interpreter)
+        recorder.install()
+    profiler = None
+    if args.profile:
+        profiler = Profiler(interpreter)
+        profiler.install()
+    if args.file:
         # Run the interpreter with a program file
-        file_path = sys.argv[1]
-        interpreter = Interpreter()
-        interpreter.run_program(file_path)
+        jobs = args.jobs
+        if args.profile or recording or args.disassemble or args.dump_optimized or args.check or governed:
+            jobs = 1
+        interpreter.run_program(args.file, jobs)
+        if args.memo_stats:
+            print_memo_stats(interpreter)
+        if profiler is not None:
+            print(profiler.report())
+            if args.profile_output:
+                with open(args.profile_output, 'w') as file:
+                    file.write(profiler.collapsed_stacks() + "\n")
     else:
         print("Welcome to My Interpreter!")
         # Run the interpreter in interactive mode
-        interpreter = Interpreter()
         interpreter.repl()
+    if recorder is not None:
+        try:
+            recorder.save(record_path)
+        except Exception as e:
+            print(f"Error: could not write the profile to {record_path}: {e}")
+    if fork_join is not None:
+        fork_join.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,287 @@
+from array import array
+from weakref import ref
+
+from AST_Node import FunctionDef, LambdaExpr, BinOp, UnaryOp, Variable, Number, Boolean, Call, Conditional
+from my_resolver import resolve
+
+# Opcodes. Every instruction is two array cells wide: the opcode followed by its argument (0 if unused).
+LOAD_CONST = 0              # push consts[arg]
+LOAD_SLOT = 1               # push parameter arg of the current frame
+LOAD_DEREF = 2              # push parameter (arg & 0xFFFF) of the frame (arg >> 16) levels out
+LOAD_GLOBAL = 3             # push the global named names[arg]
+BINARY_ADD = 4
+BINARY_SUB = 5
+BINARY_MUL = 6
+BINARY_DIV = 7
+BINARY_MOD = 8
+COMPARE_EQ = 9
+COMPARE_NE = 10
+COMPARE_GT = 11
+COMPARE_LT = 12
+COMPARE_GE = 13
+COMPARE_LE = 14
+UNARY_NOT = 15
+UNARY_NEG = 16
+JUMP = 17                   # jump to arg
+JUMP_IF_FALSE = 18          # pop; jump to arg if falsy
+JUMP_IF_FALSE_OR_POP = 19   # &&: keep the value and jump if falsy, otherwise pop it
+JUMP_IF_TRUE_OR_POP = 20    # ||: keep the value and jump if truthy, otherwise pop it
+MAKE_CLOSURE = 21           # push a closure over the current frame for children[arg]
+CHECK_CALL = 22             # check the callee on top of the stack against call_sites[arg]
+CALL = 23                   # call the callee below the top arg values
+TAIL_CALL = 24              # CALL that replaces the current frame
+RETURN = 25                 # return the top of the stack to the caller
+DEFINE = 26                 # bind the FunctionDef consts[arg] in the global scope, push None
+
+# Opcode names indexed by opcode, for the disassembler
+OPCODES = [
+    'LOAD_CONST',
+    'LOAD_SLOT',
+    'LOAD_DEREF',
+    'LOAD_GLOBAL',
+    'BINARY_ADD',
+    'BINARY_SUB',
+    'BINARY_MUL',
+    'BINARY_DIV',
+    'BINARY_MOD',
+    'COMPARE_EQ',
+    'COMPARE_NE',
+    'COMPARE_GT',
+    'COMPARE_LT',
+    'COMPARE_GE',
+    'COMPARE_LE',
+    'UNARY_NOT',
+    'UNARY_NEG',
+    'JUMP',
+    'JUMP_IF_FALSE',
+    'JUMP_IF_FALSE_OR_POP',
+    'JUMP_IF_TRUE_OR_POP',
+    'MAKE_CLOSURE',
+    'CHECK_CALL',
+    'CALL',
+    'TAIL_CALL',
+    'RETURN',
+    'DEFINE',
+]
+
+BINARY_OPCODES = {
+    '+': BINARY_ADD,
+    '-': BINARY_SUB,
+    '*': BINARY_MUL,
+    '/': BINARY_DIV,
+    '%': BINARY_MOD,
+    '==': COMPARE_EQ,
+    '!=': COMPARE_NE,
+    '>': COMPARE_GT,
+    '<': COMPARE_LT,
+    '>=': COMPARE_GE,
+    '<=': COMPARE_LE,
+}
+
+UNARY_OPCODES = {
+    '!': UNARY_NOT,
+    '-': UNARY_NEG,
+}
+
+
+class CodeObject:
+    """
+        Compiled form of a function, lambda or top-level statement. The instructions live in a flat
+        integer array; constants, global names, nested lambdas and call sites are kept in side tables
+        that instruction arguments index into.
+    """
+
+    def __init__(self, name, params, node, scopes=()):
+        self.name = name
+        self.params = params
+        self.scopes = scopes  # Parameter lists of this frame and its enclosing lambdas, outermost first
+        self.node = node  # The LambdaExpr or statement this code was compiled from (None for a FunctionDef)
+        self.code = array('l')
+        self.consts = []
+        self.names = []
+        self.children = []  # Code objects of nested lambda expressions
+        self.call_sites = []  # Call nodes, for arity checks and error messages
+
+    def emit(self, opcode, arg=0):
+        # Append an instruction and return its offset
+        self.code.append(opcode)
+        self.code.append(arg)
+        return len(self.code) - 2
+
+    def patch(self, offset, arg):
+        self.code[offset + 1] = arg
+
+    def add_const(self, value):
+        # Literals are deduplicated by type and value so that 1 and TRUE stay distinct
+        for index, const in enumerate(self.consts):
+            if type(const) is type(value) and const == value:
+                return index
+        self.consts.append(value)
+        return len(self.consts) - 1
+
+    def add_name(self, name):
+        if name not in self.names:
+            self.names.append(name)
+        return self.names.index(name)
+
+
+class BytecodeCompiler:
+    """
+        Compile AST nodes into CodeObjects. Parameters are resolved lexically at compile time to a
+        (depth, slot) pair; any other name is looked up as a global when the instruction runs.
+    """
+
+    def __init__(self):
+        # Compiled FunctionDef bodies, keyed by the id of their definition. An entry is dropped when
+        # its definition is collected, so redefined functions in the REPL, the server and batch
+        # workers do not keep their code forever.
+        self.functions = {}
+        self.function_refs = {}  # id of a FunctionDef -> weak reference that drops its entry
+
+    def compile_statement(self, node):
+        """
+            Compile a top-level statement into a code object that leaves its value on the stack and returns.
+        """
+        code = CodeObject('<statement>', [], node)
+        self.compile_node(node, code, [])
+        code.emit(RETURN)
+        return self.optimize(code)
+
+    def compile_function(self, func):
+        """
+            Return the code object for a FunctionDef, compiling it on first use.
+        """
+        code = self.functions.get(id(func))
+        if code is None:
+            code = self.compile_body(func.name, func, [func.params])
+            code.node = None  # The cached code must not keep its definition alive
+            self.store_function(func, code)
+        return code
+
+    def store_function(self, func, code):
+        key = id(func)
+        functions = self.functions
+        function_refs = self.function_refs
+
+        def forget(_):
+            functions.pop(key, None)
+            function_refs.pop(key, None)
+        functions[key] = code
+        function_refs[key] = ref(func, forget)
+
+    def compile_body(self, name, func, scopes):
+        code = CodeObject(name, func.params, func, scopes)
+        self.compile_node(func.body, code, scopes)
+        code.emit(RETURN)
+        return self.optimize(code)
+
+    def compile_node(self, node, code, scopes):
+        node_type = type(node)
+        if node_type is Number or node_type is Boolean:
+            code.emit(LOAD_CONST, code.add_const(node.value))
+        elif node_type is Variable:
+            self.compile_load(node.name, code, scopes)
+        elif node_type is BinOp:
+            self.compile_node(node.left, code, scopes)
+            if node.op in ('&&', '||'):
+                jump = code.emit(JUMP_IF_FALSE_OR_POP if node.op == '&&' else JUMP_IF_TRUE_OR_POP)
+                self.compile_node(node.right, code, scopes)
+                code.patch(jump, len(code.code))
+            elif node.op in BINARY_OPCODES:
+                self.compile_node(node.right, code, scopes)
+                code.emit(BINARY_OPCODES[node.op])
+            else:
+                raise Exception(f"Unknown operator: {node.op}")
+        elif node_type is UnaryOp:
+            if node.op not in UNARY_OPCODES:
+                raise Exception(f"Unknown unary operator: {node.op}")
+            self.compile_node(node.expr, code, scopes)
+            code.emit(UNARY_OPCODES[node.op])
+        elif node_type is Conditional:
+            self.compile_node(node.condition, code, scopes)
+            jump_false = code.emit(JUMP_IF_FALSE)
+            self.compile_node(node.true_expr, code, scopes)
+            jump_end = code.emit(JUMP)
+            code.patch(jump_false, len(code.code))
+            self.compile_node(node.false_expr, code, scopes)
+            code.patch(jump_end, len(code.code))
+        elif node_type is Call:
+            if isinstance(node.func, LambdaExpr):
+                # An immediately applied lambda accepts any number of arguments
+                self.compile_lambda(node.func, code, scopes)
+            else:
+                self.compile_load(node.func, code, scopes)
+                code.call_sites.append(node)
+                code.emit(CHECK_CALL, len(code.call_sites) - 1)
+            for arg in node.args:
+                self.compile_node(arg, code, scopes)
+            code.emit(CALL, len(node.args))
+        elif node_type is LambdaExpr:
+            self.compile_lambda(node, code, scopes)
+        elif node_type is FunctionDef:
+            code.emit(DEFINE, code.add_const(node))
+        else:
+            raise Exception(f"Unknown AST node: {node}")
+
+    def compile_load(self, name, code, scopes):
+        # Innermost scope first: a parameter of this frame, then of enclosing lambdas, then a global
+        address = resolve(name, scopes)
+        if address is None:
+            code.emit(LOAD_GLOBAL, code.add_name(name))
+        elif address[0] == 0:
+            code.emit(LOAD_SLOT, address[1])
+        else:
+            code.emit(LOAD_DEREF, (address[0] << 16) | address[1])
+
+    def compile_lambda(self, node, code, scopes):
+        code.children.append(self.compile_body('<lambda>', node, scopes + [node.params]))
+        code.emit(MAKE_CLOSURE, len(code.children) - 1)
+
+    def optimize(self, code):
+        # Peephole pass: a jump to RETURN becomes RETURN, and a CALL followed by RETURN becomes TAIL_CALL
+        instructions = code.code
+        for offset in range(0, len(instructions), 2):
+            if instructions[offset] == JUMP and instructions[instructions[offset + 1]] == RETURN:
+                instructions[offset] = RETURN
+                instructions[offset + 1] = 0
+        for offset in range(0, len(instructions) - 2, 2):
+            if instructions[offset] == CALL and instructions[offset + 2] == RETURN:
+                instructions[offset] = TAIL_CALL
+        return code
+
+
+def disassemble(code, indent=''):
+    """
+        Return a human-readable listing of a code object and, after it, of its nested lambdas.
+    """
+    params = ', '.join(code.params)
+    lines = [f"{indent}Disassembly of {code.name}({params}):"]
+    instructions = code.code
+    for offset in range(0, len(instructions), 2):
+        opcode = instructions[offset]
+        arg = instructions[offset + 1]
+        name = OPCODES[opcode]
+        if opcode == LOAD_CONST:
+            detail = f"{arg} ({code.consts[arg]!r})"
+        elif opcode == DEFINE:
+            detail = f"{arg} ({code.consts[arg].name})"
+        elif opcode == LOAD_SLOT:
+            detail = f"{arg} ({code.params[arg]})"
+        elif opcode == LOAD_DEREF:
+            detail = f"{arg >> 16}, {arg & 0xFFFF} ({code.scopes[-1 - (arg >> 16)][arg & 0xFFFF]})"
+        elif opcode == LOAD_GLOBAL:
+            detail = f"{arg} ({code.names[arg]})"
+        elif opcode == MAKE_CLOSURE:
+            detail = f"{arg} (<lambda>)"
+        elif opcode == CHECK_CALL:
+            site = code.call_sites[arg]
+            callee = site.func if isinstance(site.func, str) else '<lambda>'
+            detail = f"{arg} ({callee}, {len(site.args)} args)"
+        elif opcode in (JUMP, JUMP_IF_FALSE, JUMP_IF_FALSE_OR_POP, JUMP_IF_TRUE_OR_POP, CALL, TAIL_CALL):
+            detail = str(arg)
+        else:
+            detail = ''
+        lines.append(f"{indent}  {offset:>4} {name:<22}{detail}".rstrip())
+    for child in code.children:
+        lines.append(disassemble(child, indent + '  '))
+    return '\n'.join(lines)
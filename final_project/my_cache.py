@@ -0,0 +1,266 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import time
+
+# Bump whenever the AST classes or the parser change, so entries written by older versions are ignored
+INTERPRETER_VERSION = '1.10'
+CACHE_MAGIC = b'LAMBDA-AST\n'
+CACHE_SUFFIX = '.ast'
+TEMP_SUFFIX = '.tmp'
+# A temporary file this old was left by a process that died while writing, since writes take far less
+TEMP_MAX_AGE = 3600
+# Hashed before the source in the key of a program's statements, which are stored one at a time,
+# so that entry never shares a key with the same text stored whole by store()
+STREAM_TAG = b'statements\0'
+READ_CHUNK = 1 << 16  # Characters of source hashed at a time by file_key
+END_OF_STATEMENTS = None  # Pickled after the last statement of a complete entry
+
+
+class CacheError(Exception):
+    # A cache entry turned out to be unreadable after some of it was used
+    pass
+
+
+def default_cache_dir():
+    # Per-user cache directory, following the XDG convention
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'lambda-interpreter')
+
+
+class ProgramCache:
+    """
+        On-disk cache of parsed programs, like Python's __pycache__. Each entry holds the statements
+        of one source text and is named after the SHA-256 of the interpreter version and the source,
+        so an edited file or a new interpreter simply misses. Entries are checked again when loaded
+        and anything unreadable is discarded. Writes go to a temporary file that is renamed into
+        place, so a concurrent reader never sees a partial entry. After each write, entries older
+        than max_age seconds are removed, then the least recently used ones until the directory
+        fits in max_bytes. Temporary files left behind by a process killed mid-write are removed
+        once they are TEMP_MAX_AGE seconds old.
+
+        Entries are loaded with pickle, which can run arbitrary code, so the cache directory must
+        only be writable by the user running the interpreter and never shared with untrusted users.
+    """
+
+    def __init__(self, directory=None, max_bytes=64 * 1024 * 1024, max_age=30 * 24 * 3600):
+        self.directory = directory if directory is not None else default_cache_dir()
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+
+    def key(self, source):
+        digest = hashlib.sha256(INTERPRETER_VERSION.encode())
+        digest.update(b'\0')
+        digest.update(source.encode('utf-8', 'surrogatepass'))
+        return digest.hexdigest()
+
+    def file_key(self, file):
+        """
+            Return the key of the statements of the program in an open file, hashing its text a
+            chunk at a time, so the source is never held in memory whole.
+        """
+        digest = hashlib.sha256(INTERPRETER_VERSION.encode())
+        digest.update(b'\0' + STREAM_TAG)
+        for chunk in iter(lambda: file.read(READ_CHUNK), ''):
+            digest.update(chunk.encode('utf-8', 'surrogatepass'))
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + CACHE_SUFFIX)
+
+    def load(self, key):
+        """
+            Return the cached statements for key, or None when there is no valid entry.
+        """
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as file:
+                if file.read(len(CACHE_MAGIC)) != CACHE_MAGIC:
+                    raise ValueError("bad header")
+                entry = pickle.load(file)
+            if entry['version'] != INTERPRETER_VERSION or entry['key'] != key:
+                raise ValueError("stale entry")
+            statements = entry['statements']
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # Corrupt, truncated or written by another version: drop it and parse again
+            self.remove(path)
+            return None
+        try:
+            os.utime(path)  # Mark as recently used for eviction
+        except OSError:
+            pass
+        return statements
+
+    def read_statements(self, key):
+        """
+            Return an iterator over the statements stored for key by a StatementWriter, unpickled one
+            at a time, or None when there is no valid entry. The iterator raises CacheError if the
+            entry turns out to be damaged; the entry is removed then.
+        """
+        path = self.path(key)
+        try:
+            file = open(path, 'rb')
+        except OSError:
+            return None
+        try:
+            if file.read(len(CACHE_MAGIC)) != CACHE_MAGIC:
+                raise ValueError("bad header")
+            header = pickle.load(file)
+            if header != {'version': INTERPRETER_VERSION, 'key': key, 'stream': True}:
+                raise ValueError("stale entry")
+        except Exception:
+            file.close()
+            self.remove(path)
+            return None
+        try:
+            os.utime(path)  # Mark as recently used for eviction
+        except OSError:
+            pass
+        return self.iter_entry(file, path)
+
+    def iter_entry(self, file, path):
+        with file:
+            while True:
+                try:
+                    node = pickle.load(file)
+                except Exception as e:
+                    self.remove(path)
+                    raise CacheError(f"damaged cache entry {path}: {e}")
+                if node is END_OF_STATEMENTS:
+                    return
+                yield node
+
+    def writer(self, key):
+        """
+            Return a StatementWriter that stores the statements for key as they are parsed, or None
+            when the cache directory cannot be written.
+        """
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=TEMP_SUFFIX)
+        except OSError:
+            return None
+        return StatementWriter(self, key, os.fdopen(fd, 'wb'), temp_path)
+
+    def store(self, key, statements):
+        """
+            Write the statements for key. Failures (read-only directory, full disk) are ignored,
+            since the cache only saves time.
+        """
+        entry = {'version': INTERPRETER_VERSION, 'key': key, 'statements': statements}
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=TEMP_SUFFIX)
+        except OSError:
+            return
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(CACHE_MAGIC)
+                pickle.dump(entry, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, self.path(key))
+        except Exception:
+            self.remove(temp_path)
+            return
+        self.evict()
+
+    def evict(self):
+        # Remove expired entries and abandoned temporary files, then the least recently used entries
+        # until the size limit is met. Temporary files still being written count against the limit.
+        entries = []
+        writing = 0
+        now = time.time()
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for name in names:
+            if not name.endswith((CACHE_SUFFIX, TEMP_SUFFIX)):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if name.endswith(TEMP_SUFFIX):
+                if now - stat.st_mtime > TEMP_MAX_AGE:
+                    self.remove(path)
+                else:
+                    writing += stat.st_size
+            elif now - stat.st_mtime > self.max_age:
+                self.remove(path)
+            else:
+                entries.append((stat.st_mtime, stat.st_size, path))
+        total = writing + sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self.remove(path)
+            total -= size
+
+    def clear(self):
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for name in names:
+            if name.endswith(CACHE_SUFFIX):
+                self.remove(os.path.join(self.directory, name))
+
+    @staticmethod
+    def remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class StatementWriter:
+    """
+        Writes a program's cache entry one statement at a time, each pickled on its own, so only
+        the current statement is held in memory. The entry appears only on commit(), once the whole
+        program has parsed. Write failures silently drop the entry.
+    """
+
+    def __init__(self, cache, key, file, temp_path):
+        self.cache = cache
+        self.key = key
+        self.file = file
+        self.temp_path = temp_path
+        try:
+            file.write(CACHE_MAGIC)
+            pickle.dump({'version': INTERPRETER_VERSION, 'key': key, 'stream': True}, file)
+        except Exception:
+            self.abort()
+
+    def write(self, node):
+        if self.file is None:
+            return
+        try:
+            pickle.dump(node, self.file, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            self.abort()
+
+    def commit(self):
+        if self.file is None:
+            return
+        try:
+            pickle.dump(END_OF_STATEMENTS, self.file)
+            self.file.close()
+            os.replace(self.temp_path, self.cache.path(self.key))
+        except Exception:
+            self.abort()
+            return
+        self.file = None
+        self.cache.evict()
+
+    def abort(self):
+        if self.file is not None:
+            try:
+                self.file.close()
+            except OSError:
+                pass
+            self.file = None
+        self.cache.remove(self.temp_path)
@@ -0,0 +1,174 @@
+import sys
+
+from AST_Node import FunctionDef, LambdaExpr, BinOp, UnaryOp, Variable, Number, Boolean, Call, Conditional
+from my_runtime import Closure, Builtin, Environment, EvaluationDepthError, BINARY_OPS, UNARY_OPS
+from my_memo import MISSING, TAIL_CALL_KEYS, memo_key
+
+# Continuation frame tags
+BINOP_LEFT = 0   # (tag, node, env): waiting for the left operand
+BINOP_RIGHT = 1  # (tag, op function, left value): waiting for the right operand
+UNARY = 2        # (tag, op function): waiting for the operand
+BRANCH = 3       # (tag, node, env): waiting for the condition of a Conditional
+ARGS = 4         # [tag, node, env, func, func env, values]: collecting call arguments
+CURRY = 5        # (tag, surplus args): feed surplus arguments to a returned closure
+MEMO = 6         # (tag, [(cache, key), ...]): store the result of memoized calls
+
+
+class CEKMachine:
+    """
+        Evaluate AST nodes with an explicit, heap-allocated continuation stack instead of Python
+        recursion. The control (current node), environment and continuation are kept in local
+        variables of a single loop, so evaluation depth is bounded by memory, not by the Python
+        stack. Function bodies and the branches of a Conditional are entered without pushing a
+        frame, which makes calls in tail position run in constant stack space.
+    """
+
+    def __init__(self, interpreter, max_depth=None):
+        self.interpreter = interpreter
+        self.max_depth = sys.maxsize if max_depth is None else max_depth
+
+    def run(self, node, env):
+        """
+            Evaluate node in env and return its value.
+        """
+        interpreter = self.interpreter
+        global_env = interpreter.global_env
+        check_call = interpreter.check_call
+        max_depth = self.max_depth
+        stack = []
+        push = stack.append
+        pop = stack.pop
+
+        while True:
+            # Eval: reduce the control node until it yields a value or needs a sub-result
+            if len(stack) > max_depth:
+                raise EvaluationDepthError(f"Error: maximum evaluation depth of {max_depth} exceeded")
+            node_type = type(node)
+            if node_type is Number or node_type is Boolean:
+                value = node.value
+            elif node_type is Variable:
+                value = env.lookup(node.name)
+            elif node_type is BinOp:
+                push((BINOP_LEFT, node, env))
+                node = node.left
+                continue
+            elif node_type is Call:
+                if isinstance(node.func, LambdaExpr):
+                    func = node.func
+                    func_env = env
+                else:
+                    func = env.lookup(node.func)
+                    func_env = global_env
+                check_call(func, node)
+                if node.args:
+                    push([ARGS, node, env, func, func_env, []])
+                    node = node.args[0]
+                    continue
+                # No arguments: enter the body directly
+                body, bound = self.enter(func, func_env, [], stack)
+                if body is not None:
+                    node, env = body, bound
+                    continue
+                value = bound
+            elif node_type is Conditional:
+                push((BRANCH, node, env))
+                node = node.condition
+                continue
+            elif node_type is UnaryOp:
+                if node.op not in UNARY_OPS:
+                    raise Exception(f"Unknown unary operator: {node.op}")
+                push((UNARY, UNARY_OPS[node.op]))
+                node = node.expr
+                continue
+            elif node_type is LambdaExpr:
+                value = Closure(node, env)
+            elif node_type is FunctionDef:
+                interpreter.define_function(node)
+                value = None
+            else:
+                raise Exception(f"Unknown AST node: {node}")
+
+            # Apply: hand the value to the innermost continuation frames
+            while True:
+                if not stack:
+                    return value
+                frame = pop()
+                tag = frame[0]
+                if tag == BINOP_RIGHT:
+                    value = frame[1](frame[2], value)
+                elif tag == BINOP_LEFT:
+                    op = frame[1].op
+                    if op == '&&':
+                        if not value:
+                            continue
+                    elif op == '||':
+                        if value:
+                            continue
+                    elif op in BINARY_OPS:
+                        push((BINOP_RIGHT, BINARY_OPS[op], value))
+                    else:
+                        raise Exception(f"Unknown operator: {op}")
+                    # The right operand of && and || is in tail position
+                    node = frame[1].right
+                    env = frame[2]
+                    break
+                elif tag == BRANCH:
+                    node = frame[1].true_expr if value else frame[1].false_expr
+                    env = frame[2]
+                    break
+                elif tag == UNARY:
+                    value = frame[1](value)
+                elif tag == ARGS:
+                    values = frame[5]
+                    values.append(value)
+                    args = frame[1].args
+                    if len(values) < len(args):
+                        push(frame)
+                        node = args[len(values)]
+                        env = frame[2]
+                        break
+                    body, bound = self.enter(frame[3], frame[4], values, stack)
+                    if body is None:
+                        value = bound  # Answered from the memo cache
+                        continue
+                    node, env = body, bound
+                    break
+                elif tag == CURRY:
+                    if not isinstance(value, Closure):
+                        continue
+                    # Keep applying the surplus arguments while closures come back
+                    push(frame)
+                    node, env = self.enter(value.func, value.env, frame[1], stack)
+                    break
+                elif tag == MEMO:
+                    for cache, key in frame[1]:
+                        cache.put(key, value)
+
+    def enter(self, func, func_env, args, stack):
+        # Bind the parameters and return the (body, frame) pair to continue with,
+        # or (None, value) when a memoized function has already been called with these arguments
+        # or func is a builtin
+        governor = self.interpreter.governor
+        if governor is not None:
+            governor.call(len(stack))
+        if type(func) is Builtin:
+            return None, func.function(self.interpreter, args)
+        memo = self.interpreter.memo
+        if memo is not None:
+            cache = memo.cache_for(func)
+            if cache is not None:
+                key = memo_key(args)
+                value = cache.get(key)
+                if value is not MISSING:
+                    return None, value
+                if stack and stack[-1][0] == MEMO:
+                    # A tail call: its result is also the result of the pending memoized call
+                    keys = stack[-1][1]
+                    if len(keys) < TAIL_CALL_KEYS:
+                        keys.append((cache, key))
+                else:
+                    stack.append((MEMO, [(cache, key)]))
+        params = func.params
+        if len(args) > len(params):
+            stack.append((CURRY, args[len(params):]))
+        return func.body, Environment(dict(zip(params, args)), func_env)
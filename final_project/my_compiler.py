@@ -0,0 +1,334 @@
+from weakref import ref
+
+from AST_Node import FunctionDef, LambdaExpr, BinOp, UnaryOp, Variable, Number, Boolean, Call, Conditional
+from my_runtime import Closure, UNBOUND, BINARY_OPS, divide
+from my_resolver import resolve
+
+
+def _add(left, right):
+    def add(env):
+        return left(env) + right(env)
+    return add
+
+
+def _sub(left, right):
+    def sub(env):
+        return left(env) - right(env)
+    return sub
+
+
+def _mul(left, right):
+    def mul(env):
+        return left(env) * right(env)
+    return mul
+
+
+def _div(left, right):
+    def div(env):
+        return divide(left(env), right(env))
+    return div
+
+
+def _mod(left, right):
+    def mod(env):
+        return left(env) % right(env)
+    return mod
+
+
+def _eq(left, right):
+    def eq(env):
+        return left(env) == right(env)
+    return eq
+
+
+def _ne(left, right):
+    def ne(env):
+        return left(env) != right(env)
+    return ne
+
+
+def _gt(left, right):
+    def gt(env):
+        return left(env) > right(env)
+    return gt
+
+
+def _lt(left, right):
+    def lt(env):
+        return left(env) < right(env)
+    return lt
+
+
+def _ge(left, right):
+    def ge(env):
+        return left(env) >= right(env)
+    return ge
+
+
+def _le(left, right):
+    def le(env):
+        return left(env) <= right(env)
+    return le
+
+
+def _and(left, right):
+    def and_(env):
+        return left(env) and right(env)
+    return and_
+
+
+def _or(left, right):
+    def or_(env):
+        return left(env) or right(env)
+    return or_
+
+
+# One closure factory per operator, so the operator is chosen once at compile time
+BINOP_FACTORIES = {
+    '+': _add,
+    '-': _sub,
+    '*': _mul,
+    '/': _div,
+    '%': _mod,
+    '==': _eq,
+    '!=': _ne,
+    '>': _gt,
+    '<': _lt,
+    '>=': _ge,
+    '<=': _le,
+    '&&': _and,
+    '||': _or,
+}
+
+
+class Compiler:
+    """
+        Translate AST nodes into trees of Python closures. Each closure takes the current environment
+        frame and evaluates its node in it, so the per-node type dispatch and operator lookup happen
+        once, when the tree is compiled, instead of on every evaluation.
+
+        Names are resolved while compiling. A frame is a list of parameter values followed by the
+        enclosing frame, so a parameter is read by following a fixed number of parent links and
+        indexing a fixed slot, without hashing. Global names are read through the interpreter's
+        binding cells, and a call site checks the argument count only when its cell holds a
+        function it has not checked before, which happens again only when the name is redefined.
+    """
+
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        # Compiled function and lambda bodies, keyed by the id of their node. Lambda nodes are shared
+        # between identical subtrees, but the same lambda can be nested in different scopes, so each
+        # occurrence gets its own copy of the node. Entries are dropped when their node is freed, since
+        # recompiled statements (the REPL, the server and batch workers run new ones all the time) would
+        # otherwise keep adding bodies that nothing can reach.
+        self.bodies = {}
+        self.body_refs = {}  # id of a node -> weak reference that drops its entry
+        self.dispatch = {
+            FunctionDef: self.compile_function_def,
+            LambdaExpr: self.compile_lambda_expr,
+            BinOp: self.compile_binop,
+            UnaryOp: self.compile_unaryop,
+            Variable: self.compile_variable,
+            Number: self.compile_literal,
+            Boolean: self.compile_literal,
+            Call: self.compile_call,
+            Conditional: self.compile_conditional,
+        }
+
+    def compile(self, node, scopes=()):
+        """
+            Compile a single AST node into a closure over an environment frame. scopes lists the
+            parameters of the enclosing functions, innermost last.
+        """
+        try:
+            compile_node = self.dispatch[type(node)]
+        except KeyError:
+            raise Exception(f"Unknown AST node: {node}")
+        return compile_node(node, scopes)
+
+    def body(self, func):
+        """
+            Return the compiled body of a FunctionDef or LambdaExpr, compiling it on first use.
+        """
+        code = self.bodies.get(id(func))
+        if code is None:
+            code = self.compile(func.body, (func.params,))
+            self.store_body(func, code)
+        return code
+
+    def store_body(self, func, code):
+        key = id(func)
+        bodies = self.bodies
+        body_refs = self.body_refs
+
+        def forget(_):
+            bodies.pop(key, None)
+            body_refs.pop(key, None)
+        bodies[key] = code
+        body_refs[key] = ref(func, forget)
+
+    def call(self, func, env, args):
+        """
+            Run the body of func in a new frame holding args, whose parent is env.
+        """
+        code = self.bodies.get(id(func))
+        if code is None:
+            code = self.body(func)
+        missing = len(func.params) - len(args)
+        if missing == 0:
+            frame = [*args, env]
+        elif missing > 0:
+            frame = [*args, *[UNBOUND] * missing, env]
+        else:
+            frame = [*args[:len(func.params)], env]
+        return code(frame)
+
+    def occurrence(self, node, scopes):
+        # A private copy of a lambda node, with its body compiled in the scopes it appears in
+        copy = LambdaExpr(node.params, node.body)
+        self.store_body(copy, self.compile(node.body, scopes + (node.params,)))
+        return copy
+
+    def compile_function_def(self, node, scopes):
+        define_function = self.interpreter.define_function
+
+        def define(env):
+            define_function(node)
+        return define
+
+    def compile_lambda_expr(self, node, scopes):
+        node = self.occurrence(node, scopes)
+
+        def make_closure(env):
+            return Closure(node, env)
+        return make_closure
+
+    def compile_binop(self, node, scopes):
+        fork_join = self.interpreter.fork_join
+        if fork_join is not None and fork_join.is_fork_site(node):
+            # Both operands are calls that may be evaluated in parallel
+            op = BINARY_OPS[node.op]
+            operands = fork_join.operands((node.left, node.right), lambda n: self.compile(n, scopes),
+                                         lambda name: self.compile_load(name, scopes))
+            evaluate = fork_join.evaluate
+            return lambda env: op(*evaluate(operands, env))
+        left = self.compile(node.left, scopes)
+        right = self.compile(node.right, scopes)
+        factory = BINOP_FACTORIES.get(node.op)
+        if factory is not None:
+            return factory(left, right)
+        if node.op not in BINARY_OPS:
+            raise Exception(f"Unknown operator: {node.op}")
+        op = BINARY_OPS[node.op]
+        return lambda env: op(left(env), right(env))
+
+    def compile_unaryop(self, node, scopes):
+        expr = self.compile(node.expr, scopes)
+        if node.op == '!':
+            return lambda env: not expr(env)
+        elif node.op == '-':
+            return lambda env: -expr(env)
+        raise Exception(f"Unknown unary operator: {node.op}")
+
+    def compile_variable(self, node, scopes):
+        return self.compile_load(node.name, scopes)
+
+    def compile_load(self, name, scopes):
+        # Read a parameter by its (depth, slot) address, or a global through its binding cell
+        address = resolve(name, scopes)
+        if address is None:
+            cell = self.interpreter.global_cell(name)
+
+            def load_global(env):
+                value = cell.value
+                if value is UNBOUND:
+                    raise Exception(f"Undefined variable: {name}")
+                return value
+            return load_global
+
+        depth, slot = address
+        # A lambda called with fewer arguments than parameters leaves the rest UNBOUND in its frame;
+        # the name then refers to its binding in the enclosing scopes, as with Environment lookup
+        outer = self.compile_load(name, scopes[:len(scopes) - depth - 1])
+        if depth == 0:
+            def load_slot(env):
+                value = env[slot]
+                if value is UNBOUND:
+                    return outer(env[-1])
+                return value
+            return load_slot
+
+        def load_deref(env):
+            for _ in range(depth):
+                env = env[-1]
+            value = env[slot]
+            if value is UNBOUND:
+                return outer(env[-1])
+            return value
+        return load_deref
+
+    def compile_literal(self, node, scopes):
+        value = node.value
+        return lambda env: value
+
+    def compile_conditional(self, node, scopes):
+        condition = self.compile(node.condition, scopes)
+        true_expr = self.compile(node.true_expr, scopes)
+        false_expr = self.compile(node.false_expr, scopes)
+        return lambda env: true_expr(env) if condition(env) else false_expr(env)
+
+    def compile_call(self, node, scopes):
+        interpreter = self.interpreter
+        global_env = interpreter.global_env
+        args = [self.compile(arg, scopes) for arg in node.args]
+        target = node.func
+        if isinstance(target, LambdaExpr):
+            target = self.occurrence(target, scopes)
+
+        fork_join = interpreter.fork_join
+        if fork_join is not None and fork_join.is_fork_site(node):
+            # Several arguments are calls that may be evaluated in parallel
+            operands = fork_join.operands(node.args, lambda n: self.compile(n, scopes),
+                                         lambda name: self.compile_load(name, scopes))
+            evaluate = fork_join.evaluate
+            load = None if isinstance(target, LambdaExpr) else self.compile_load(target, scopes)
+
+            def call_forked(env):
+                if load is None:
+                    func, func_env = target, env
+                else:
+                    func, func_env = load(env), global_env
+                interpreter.check_call(func, node)
+                return interpreter.apply_function(func, func_env, evaluate(operands, env))
+            return call_forked
+
+        if isinstance(target, LambdaExpr):
+            def call_lambda(env):
+                interpreter.check_call(target, node)
+                return interpreter.apply_function(target, env, [arg(env) for arg in args])
+            return call_lambda
+
+        if resolve(target, scopes) is not None:
+            # The callee is a parameter, so it can differ on every call
+            load = self.compile_load(target, scopes)
+
+            def call_parameter(env):
+                func = load(env)
+                interpreter.check_call(func, node)
+                return interpreter.apply_function(func, global_env, [arg(env) for arg in args])
+            return call_parameter
+
+        # Inline cache: the function in the cell when the argument count was last checked
+        cell = interpreter.global_cell(target)
+        checked = None
+
+        def call_named(env):
+            nonlocal checked
+            func = cell.value
+            if func is not checked:
+                if func is UNBOUND:
+                    raise Exception(f"Undefined variable: {target}")
+                interpreter.check_call(func, node)
+                checked = func
+            return interpreter.apply_function(func, global_env, [arg(env) for arg in args])
+        return call_named
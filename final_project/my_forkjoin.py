@@ -0,0 +1,257 @@
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from weakref import WeakKeyDictionary, ref
+
+from AST_Node import BinOp, Call
+from my_runtime import BINARY_OPS
+from my_memo import memo_key
+from my_purity import PurityAnalyzer
+from my_parallel import init_worker, load_definitions, reachable_definitions
+
+# Engines that evaluate operands through Python calls the fork-join evaluator can take over
+FORK_JOIN_ENGINES = ('compiled', 'tree')
+COST_ENTRIES = 1 << 12  # Measured calls remembered; the least recently used are dropped first
+
+
+def call_job(name, args, definitions):
+    # Apply a global function in a worker, returning the result and how long it took
+    interpreter = load_definitions(definitions)
+    start = time.perf_counter()
+    result = interpreter.apply_function(interpreter.global_scope[name], interpreter.global_env, args)
+    return result, time.perf_counter() - start
+
+
+class Operand:
+    # One operand of a fork site: how to evaluate it normally and, for a named call, its callee and arguments
+    __slots__ = ('call', 'value', 'callee', 'args')
+
+    def __init__(self, call, value, callee, args):
+        self.call = call  # Call node with a named callee, or None
+        self.value = value  # env -> value, evaluated in this process
+        self.callee = callee  # env -> the function call names
+        self.args = args  # env -> value for each argument of call
+
+
+class Task:
+    # A call running in a worker process
+    __slots__ = ('future', 'func', 'args', 'key')
+
+    def __init__(self, future, func, args, key):
+        self.future = future
+        self.func = func
+        self.args = args
+        self.key = key
+
+
+class ForkJoin:
+    """
+        Evaluate independent pure calls in parallel. A fork site is a BinOp (other than && and ||)
+        or a Call with at least two operands that are calls to global functions. At a fork site,
+        every such call but the last is sent to a worker process if its function is pure, its
+        arguments are integers or booleans and it is expected to be expensive; the rest is
+        evaluated here, and the forked results are joined in operand order. Errors are raised as
+        in sequential evaluation: the error of the leftmost failing operand wins.
+
+        Forks happen in this process only, so a recursive function spawns work along the spine
+        of its call tree (fib(n - 1) in a worker, fib(n - 2) here, then fib(n - 3) in a worker...).
+        A call is forked when it is expected to take at least threshold seconds: the cost of an
+        earlier run of the same call when one was measured, or else the largest cost measured
+        for its function, so the calls of a cheap function run here whatever their arguments.
+        A function that has not been measured yet is forked until its first result comes back.
+        Calls that run here instead are timed too. Whatever the estimate, forking stops
+        max_depth fork sites deep.
+        Idle workers pull the next task from the pool's shared queue, and a parent that reaches
+        a join before its task has started cancels it and runs it itself, so no process waits
+        on work that nobody is doing.
+    """
+
+    def __init__(self, interpreter, workers=None, threshold=0.01, max_depth=None):
+        if interpreter.engine not in FORK_JOIN_ENGINES:
+            raise ValueError(f"Fork-join evaluation supports the {' and '.join(FORK_JOIN_ENGINES)} engines")
+        self.interpreter = interpreter
+        self.workers = workers or os.cpu_count() or 1
+        self.threshold = threshold  # Calls measured to take less than this many seconds are not forked
+        # Enough levels for every worker to get a task, plus a few for uneven call trees
+        self.max_depth = max_depth if max_depth is not None else self.workers.bit_length() + 4
+        self.analyzer = PurityAnalyzer(interpreter.global_scope)
+        self.costs = OrderedDict()  # (FunctionDef, argument key) -> measured seconds, the last COST_ENTRIES calls
+        self.estimates = WeakKeyDictionary()  # FunctionDef -> largest cost measured for any of its calls
+        # Operands of the tree engine's fork sites, keyed by the id of the site node and dropped
+        # with the node, so the statements of a long session do not stay alive
+        self.sites = {}
+        self.site_refs = {}  # id of a fork site node -> weak reference that drops its entry
+        self.serials = WeakKeyDictionary()  # FunctionDef -> serial number identifying it in workers
+        self.next_serial = 1
+        self.depth = 0  # Fork sites being evaluated in this process
+        self.pool = None
+
+    def install(self):
+        # Route definitions through this evaluator, so purity verdicts are dropped when a name is rebound
+        interpreter = self.interpreter
+        define_function = interpreter.define_function
+        analyzer = self.analyzer
+
+        def fork_join_define_function(node):
+            analyzer.invalidate()
+            define_function(node)
+
+        interpreter.define_function = fork_join_define_function
+        interpreter.fork_join = self
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+
+    @staticmethod
+    def is_fork_site(node):
+        if isinstance(node, BinOp):
+            if node.op not in BINARY_OPS:
+                return False
+            operands = (node.left, node.right)
+        elif isinstance(node, Call):
+            operands = node.args
+        else:
+            return False
+        return sum(isinstance(operand, Call) and isinstance(operand.func, str) for operand in operands) >= 2
+
+    def operands(self, nodes, compile, load):
+        # Build the operands of a fork site, compiling each node with compile(node) -> (env -> value)
+        # and each callee with load(name) -> (env -> function)
+        operands = []
+        for node in nodes:
+            if isinstance(node, Call) and isinstance(node.func, str):
+                operands.append(Operand(node, compile(node), load(node.func), [compile(arg) for arg in node.args]))
+            else:
+                operands.append(Operand(None, compile(node), None, None))
+        return operands
+
+    def tree_operands(self, node):
+        # Operands of a BinOp or Call for the tree walker, or None when it is not a fork site
+        key = id(node)
+        try:
+            return self.sites[key]
+        except KeyError:
+            pass
+        operands = None
+        if self.is_fork_site(node):
+            execute = self.interpreter.execute
+            nodes = (node.left, node.right) if isinstance(node, BinOp) else node.args
+            operands = self.operands(nodes, lambda n: lambda env: execute(n, env),
+                                     lambda name: lambda env: env.lookup(name))
+        sites = self.sites
+        site_refs = self.site_refs
+
+        def forget(_):
+            sites.pop(key, None)
+            site_refs.pop(key, None)
+        sites[key] = operands
+        site_refs[key] = ref(node, forget)
+        return operands
+
+    def evaluate(self, operands, env):
+        """
+            Evaluate operands left to right in env and return their values.
+        """
+        last = max(i for i, operand in enumerate(operands) if operand.call is not None)
+        results = []
+        error = None
+        self.depth += 1
+        try:
+            for i, operand in enumerate(operands):
+                if i < last and operand.call is not None and self.depth <= self.max_depth:
+                    results.append(self.spawn(operand, env))
+                else:
+                    results.append(operand.value(env))
+        except Exception as e:
+            error = e
+        finally:
+            self.depth -= 1
+        # Join in operand order, so an earlier operand's error takes precedence
+        values = [self.join(result) if isinstance(result, Task) else result for result in results]
+        if error is not None:
+            raise error
+        return values
+
+    def spawn(self, operand, env):
+        # Evaluate the arguments of a named call, then start it in a worker if that is worthwhile
+        interpreter = self.interpreter
+        call = operand.call
+        func = operand.callee(env)
+        interpreter.check_call(func, call)
+        args = [arg(env) for arg in operand.args]
+        if self.analyzer.is_pure(func) and all(type(arg) is int or type(arg) is bool for arg in args):
+            key = memo_key(args)
+            if self.is_cached(func, key):
+                return interpreter.apply_function(func, interpreter.global_env, args)
+            if self.expected_cost(func, key) >= self.threshold:
+                definitions = reachable_definitions(interpreter.global_scope, [call.func], self.version)
+                future = self.get_pool().submit(call_job, call.func, args, definitions)
+                return Task(future, func, args, key)
+            start = time.perf_counter()
+            result = interpreter.apply_function(func, interpreter.global_env, args)
+            self.measured(func, key, time.perf_counter() - start)
+            return result
+        return interpreter.apply_function(func, interpreter.global_env, args)
+
+    def expected_cost(self, func, key):
+        # Seconds a call is expected to take: its own measurement, or its function's largest one
+        costs = self.costs
+        cost = costs.get((func, key))
+        if cost is not None:
+            costs.move_to_end((func, key))
+            return cost
+        # Not measured at all yet: worth forking, which measures it
+        return self.estimates.get(func, self.threshold)
+
+    def measured(self, func, key, elapsed):
+        costs = self.costs
+        costs[(func, key)] = elapsed
+        costs.move_to_end((func, key))
+        if len(costs) > COST_ENTRIES:
+            costs.popitem(last=False)
+        if elapsed > self.estimates.get(func, 0.0):
+            self.estimates[func] = elapsed
+
+    def join(self, task):
+        interpreter = self.interpreter
+        if task.future.cancel():
+            # No worker has picked it up yet: run it here instead of waiting
+            start = time.perf_counter()
+            result = interpreter.apply_function(task.func, interpreter.global_env, task.args)
+            self.measured(task.func, task.key, time.perf_counter() - start)
+            return result
+        result, elapsed = task.future.result()
+        self.measured(task.func, task.key, elapsed)
+        memo = interpreter.memo
+        if memo is not None:
+            cache = memo.cache_for(task.func)
+            if cache is not None:
+                cache.put(task.key, result)
+        return result
+
+    def is_cached(self, func, key):
+        # Whether the memo cache can answer the call without any work
+        memo = self.interpreter.memo
+        if memo is None:
+            return False
+        cache = memo.cache_for(func)
+        return cache is not None and key in cache.data
+
+    def version(self, name, func):
+        # Serial number of a binding; workers rebind a name when its serial changes
+        if func is None:
+            return 0
+        serial = self.serials.get(func)
+        if serial is None:
+            serial = self.serials[func] = self.next_serial
+            self.next_serial += 1
+        return serial
+
+    def get_pool(self):
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker,
+                                            initargs=(self.interpreter.options,))
+        return self.pool
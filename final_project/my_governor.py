@@ -0,0 +1,134 @@
+import os
+import sys
+
+try:
+    import resource
+except ImportError:  # Not available on Windows; memory is then sampled from /proc only
+    resource = None
+
+CHECK_INTERVAL = 1000  # Steps between two memory samples
+
+
+class ResourceLimitExceeded(Exception):
+    # A statement used more than the governor allows; the subclasses say which budget ran out
+    pass
+
+
+class StepLimitExceeded(ResourceLimitExceeded):
+    pass
+
+
+class CallDepthExceeded(ResourceLimitExceeded):
+    pass
+
+
+class MemoryLimitExceeded(ResourceLimitExceeded):
+    pass
+
+
+def memory_usage():
+    """
+        Return the resident set size of this process in bytes, or None if it cannot be measured.
+    """
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    if resource is not None:
+        # Peak rather than current size, in kilobytes on Linux and in bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+    return None
+
+
+class Governor:
+    """
+        Budgets for one top-level statement: how many steps it may take, how deep its calls may
+        nest and how much the process may grow while it runs. A step is one function call; the
+        language has no loops, so a statement that makes no calls finishes in time proportional
+        to its size, and one that runs away does so through calls. Each call costs a counter
+        increment and two comparisons. Memory is sampled every check_interval steps, so the cap
+        is approximate: a statement may overshoot it by what that many calls allocate.
+
+        install() hooks the governor into an interpreter. The compiled and tree engines are
+        governed through a wrapper around apply_function, as the profiler does; the cek and vm
+        engines call inline and check the governor themselves, using the length of their own
+        stacks as the depth. A Python RecursionError or MemoryError raised while a statement is
+        governed is reported as CallDepthExceeded or MemoryLimitExceeded, so every way of
+        running out surfaces as a ResourceLimitExceeded.
+    """
+
+    def __init__(self, max_steps=None, max_call_depth=None, max_memory=None, check_interval=CHECK_INTERVAL):
+        self.max_steps = max_steps
+        self.max_call_depth = sys.maxsize if max_call_depth is None else max_call_depth
+        self.max_memory = max_memory  # Bytes the process may grow by during one statement
+        self.check_interval = check_interval
+        self.steps = 0
+        self.depth = 0  # Calls active in the compiled and tree engines
+        self.next_check = 0  # Step count at which the next checkpoint runs
+        self.baseline = None  # Memory usage when the statement started
+
+    def install(self, interpreter):
+        interpreter.governor = self
+        if interpreter.engine not in ('compiled', 'tree'):
+            return
+        apply_function = interpreter.apply_function
+        governor = self
+
+        def governed_apply_function(func, env, args):
+            governor.depth += 1
+            try:
+                governor.call(governor.depth)
+                return apply_function(func, env, args)
+            finally:
+                governor.depth -= 1
+
+        interpreter.apply_function = governed_apply_function
+
+    def start(self):
+        # Reset the budgets for a new statement
+        self.steps = 0
+        self.depth = 0
+        self.baseline = memory_usage() if self.max_memory is not None else None
+        self.schedule()
+
+    def run(self, function, *args):
+        """
+            Call function(*args) as one governed statement.
+        """
+        self.start()
+        try:
+            return function(*args)
+        except RecursionError:
+            raise CallDepthExceeded(f"Error: call depth limit exceeded: the Python stack ran out "
+                                    f"after {self.steps} steps") from None
+        except MemoryError:
+            raise MemoryLimitExceeded(f"Error: memory limit exceeded: out of memory after {self.steps} steps") from None
+
+    def call(self, depth):
+        """
+            Account for one call made depth calls deep.
+        """
+        if depth > self.max_call_depth:
+            raise CallDepthExceeded(f"Error: call depth limit of {self.max_call_depth} exceeded")
+        self.steps += 1
+        if self.steps >= self.next_check:
+            self.checkpoint()
+
+    def checkpoint(self):
+        if self.max_steps is not None and self.steps > self.max_steps:
+            raise StepLimitExceeded(f"Error: step limit of {self.max_steps} exceeded")
+        if self.baseline is not None:
+            used = memory_usage() - self.baseline
+            if used > self.max_memory:
+                raise MemoryLimitExceeded(f"Error: memory limit of {self.max_memory} bytes exceeded "
+                                          f"({used} bytes allocated)")
+        self.schedule()
+
+    def schedule(self):
+        # Check again after check_interval steps, or exactly when the step budget runs out
+        next_check = self.steps + self.check_interval
+        if self.max_steps is not None:
+            next_check = min(next_check, self.max_steps + 1)
+        self.next_check = next_check
@@ -1,50 +1,147 @@
-from AST_Node import ASTNode, FunctionDef, LambdaExpr, BinOp, UnaryOp, Variable, Number, Boolean, Call, Conditional
-from my_lexer import tokenize
-from my_parser import Parser
+import os
 
+from AST_Node import ASTNode, FunctionDef, Import, LambdaExpr, BinOp, UnaryOp, Variable, Number, Boolean, Call, Conditional
+from my_lexer import tokenize, iter_file_tokens
+from my_parser import Parser
+from my_runtime import Closure, Environment, Cell, Builtin, UNBOUND
+from my_compiler import Compiler
+from my_cek import CEKMachine
+from my_bytecode import BytecodeCompiler, disassemble
+from my_vm import VM
+from my_memo import MemoTable, MISSING, memo_key
+from my_optimizer import Optimizer
+from my_parallel import ParallelRunner
+from my_vectorize import Vectorizer
+from my_jit import JIT, JIT_ENGINES, DEFAULT_THRESHOLD
+from my_lazy import Thunk, StrictnessAnalyzer, LAZY_ENGINES, delay
+from my_streams import BUILTINS
+from my_modules import ModuleLoader
+from my_cache import CacheError
 
-class Closure:
-    def __init__(self, func, env):
-        self.func = func
-        self.env = env
+# Evaluation engines: compiled closures, the recursive tree walker, the explicit-stack machine,
+# and the bytecode virtual machine
+ENGINES = ('compiled', 'tree', 'cek', 'vm')
 
 
 class Interpreter:
-    def __init__(self):
-        self.global_scope = {}
-        self.call_stack = []
+    def __init__(self, engine='compiled', max_depth=None, memo_size=1024, optimize=True, disabled_passes=(),
+                 jit_threshold=DEFAULT_THRESHOLD, lazy=False):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine: {engine}")
+        if lazy and engine not in LAZY_ENGINES:
+            raise ValueError(f"Lazy evaluation supports the {' and '.join(LAZY_ENGINES)} engine")
+        # Top-level frame of the lexical environment; global_scope is its variable dict
+        self.global_env = Environment()
+        self.global_scope = self.global_env.vars
+        self.global_cells = {}  # name -> Cell tracking its binding, for compiled code that reads the name
+        # Built-in functions (the stream primitives) are ordinary global bindings, so a Defun can replace them
+        for builtin in BUILTINS:
+            self.global_scope[builtin.name] = builtin
+        self.engine = engine
+        # Constructor arguments, used to build identical interpreters in worker processes
+        self.options = {'engine': engine, 'max_depth': max_depth, 'memo_size': memo_size,
+                        'optimize': optimize, 'disabled_passes': tuple(disabled_passes),
+                        'jit_threshold': jit_threshold, 'lazy': lazy}
+        # Results of pure global functions are cached per function, up to memo_size entries each (0 disables)
+        self.memo = MemoTable(self.global_scope, memo_size) if memo_size else None
+        self.compiler = Compiler(self)
+        # max_depth bounds the continuation stack of the 'cek' engine and the frame stack of the 'vm' engine
+        self.machine = CEKMachine(self, max_depth)
+        self.bytecode = BytecodeCompiler()
+        self.vm = VM(self, self.bytecode, max_depth)
+        self.dump_bytecode = False  # Print the disassembly of each statement run by the 'vm' engine
+        # Statements are rewritten by the AST optimization passes before they run
+        self.optimizer = Optimizer(disabled_passes) if optimize else None
+        self.dump_optimized = False  # Print each statement after optimization
+        self.cache = None  # ProgramCache that lets run_program skip parsing unchanged files
+        self.modules = ModuleLoader(self)  # Imported libraries, whose functions are parsed when first needed
+        self.fork_join = None  # ForkJoin evaluator that runs independent pure calls in worker processes
+        self.vectorizer = Vectorizer(self)
+        self.resolver = None  # Resolver that checks each statement of run_program before it runs
+        self.governor = None  # Governor that limits the steps, call depth and memory of each statement
+        # In lazy mode, arguments a function is not strict in are passed as thunks, evaluated on first use
+        self.lazy = lazy
+        self.strictness = StrictnessAnalyzer(self.global_scope) if lazy else None
+        # Global functions called jit_threshold times are translated to Python (0 disables).
+        # Translated code takes evaluated arguments, so it is not used in lazy mode.
+        self.jit = None
+        if jit_threshold and engine in JIT_ENGINES and not lazy:
+            JIT(self, jit_threshold).install()
+
+    def evaluate(self, node):
+        # Evaluate a top-level statement with the configured engine
+        if isinstance(node, Import):
+            return self.modules.import_module(node)
+        self.modules.resolve(node)
+        if self.optimizer is not None:
+            node = self.optimizer.optimize(node)
+            if self.dump_optimized:
+                print(f"Optimized: {node}")
+        if self.governor is not None:
+            return self.governor.run(self.run_statement, node)
+        return self.run_statement(node)
+
+    def run_statement(self, node):
+        # Run an already optimized statement on the configured engine
+        if self.engine == 'compiled':
+            return self.compiler.compile(node)(self.global_env)
+        elif self.engine == 'cek':
+            return self.machine.run(node, self.global_env)
+        elif self.engine == 'vm':
+            code = self.bytecode.compile_statement(node)
+            if self.dump_bytecode:
+                print(disassemble(code))
+                if isinstance(node, FunctionDef):
+                    print(disassemble(self.bytecode.compile_function(node)))
+            return self.vm.run(code)
+        return self.execute(node)
+
+    def run_body(self, func, env):
+        # Evaluate the body of a function or lambda in the given call frame
+        if self.engine == 'cek':
+            return self.machine.run(func.body, env)
+        return self.execute(func.body, env)
 
-    def execute(self, node):
+    def execute(self, node, env=None):
         # Execute the given AST node based on its type
+        if env is None:
+            env = self.global_env
         if isinstance(node, FunctionDef):
             # Store function definitions in the global scope
-            self.global_scope[node.name] = node
+            self.define_function(node)
         elif isinstance(node, LambdaExpr):
-            # Return a closure for lambda expressions
-            return Closure(node, self.global_scope.copy())
+            # Return a closure that captures the current frame
+            return Closure(node, env)
         elif isinstance(node, BinOp):
             # Handle binary operations
             if node.op == '||':
-                left = self.execute(node.left)
+                left = self.execute(node.left, env)
                 if left:
                     return left
-                return self.execute(node.right)
+                return self.execute(node.right, env)
             elif node.op == '&&':
-                left = self.execute(node.left)
+                left = self.execute(node.left, env)
                 if not left:
                     return left
-                return self.execute(node.right)
+                return self.execute(node.right, env)
             else:
-                left = self.execute(node.left)
-                right = self.execute(node.right)
+                if self.fork_join is not None:
+                    operands = self.fork_join.tree_operands(node)
+                    if operands is not None:
+                        left, right = self.fork_join.evaluate(operands, env)
+                        return self.evaluate_binop(node.op, left, right)
+                left = self.execute(node.left, env)
+                right = self.execute(node.right, env)
                 return self.evaluate_binop(node.op, left, right)
         elif isinstance(node, UnaryOp):
             # Handle unary operations
-            expr = self.execute(node.expr)
+            expr = self.execute(node.expr, env)
             return self.evaluate_unaryop(node.op, expr)
         elif isinstance(node, Variable):
             # Look up variable values
-            value = self.lookup_variable(node.name)
+            value = env.lookup(node.name)
+            if type(value) is Thunk:
+                return value.force()
             return value
         elif isinstance(node, Number):
             # Return number values directly
@@ -54,14 +151,14 @@ class Interpreter:
             return node.value
         elif isinstance(node, Call):
             # Handle function calls
-            return self.execute_call(node)
+            return self.execute_call(node, env)
         elif isinstance(node, Conditional):
             # Handle conditional expressions
-            condition = self.execute(node.condition)
+            condition = self.execute(node.condition, env)
             if condition:
-                return self.execute(node.true_expr)
+                return self.execute(node.true_expr, env)
             else:
-                return self.execute(node.false_expr)
+                return self.execute(node.false_expr, env)
         else:
             raise Exception(f"Unknown AST node: {node}")
 
@@ -107,71 +204,153 @@ class Interpreter:
         else:
             raise Exception(f"Unknown unary operator: {op}")
 
-    def lookup_variable(self, name):
-        # Look up variable values in the current scope and call stack
-        if name in self.global_scope:
-            return self.global_scope[name]
-        for scope in reversed(self.call_stack):
-            if name in scope:
-                return scope[name]
-        raise Exception(f"Undefined variable: {name}")
+    def lookup_variable(self, name, env=None):
+        # Look up a variable by walking the frame chain outwards to the global frame
+        return (env or self.global_env).lookup(name)
 
-    def execute_call(self, node):
+    def execute_call(self, node, env=None):
         # Execute function calls
+        if env is None:
+            env = self.global_env
         if isinstance(node.func, Closure):
             func = node.func.func
-            env = node.func.env
+            func_env = node.func.env
         elif isinstance(node.func, LambdaExpr):
             func = node.func
-            env = self.global_scope.copy()
+            func_env = env
         else:
-            func = self.lookup_variable(node.func)
-            env = self.global_scope.copy()
+            func = env.lookup(node.func)
+            if type(func) is Thunk:
+                func = func.force()
+            func_env = self.global_env
 
-        # Check if the function is a named FunctionDef (not a lambda)
+        self.check_call(func, node)
+        if self.lazy:
+            # Evaluate the arguments the callee is strict in; delay the rest
+            if isinstance(func, FunctionDef):
+                strict = self.strictness.strict_params(func)
+            elif isinstance(func, Builtin):
+                strict = (True,) * len(node.args)
+            else:
+                strict = ()
+            execute = self.execute
+            evaluated_args = [execute(arg, env) if i < len(strict) and strict[i] else delay(execute, arg, env)
+                              for i, arg in enumerate(node.args)]
+            return self.apply_function(func, func_env, evaluated_args)
+        # Evaluate arguments
+        operands = self.fork_join.tree_operands(node) if self.fork_join is not None else None
+        if operands is not None:
+            evaluated_args = self.fork_join.evaluate(operands, env)
+        else:
+            evaluated_args = [self.execute(arg, env) for arg in node.args]
+        return self.apply_function(func, func_env, evaluated_args)
+
+    def check_call(self, func, node):
+        # Make sure the callee can be applied to the arguments of the call node
+        if not isinstance(func, (FunctionDef, Builtin, LambdaExpr)):
+            raise Exception(f"Unknown function: {node.func}")
+        self.check_arity(func, len(node.args))
+
+    def check_arity(self, func, nargs):
+        # Make sure a function value can be called with nargs arguments
         if isinstance(func, FunctionDef):
             # Perform argument count check only for named functions
-            if len(node.args) != len(func.params):
-                raise Exception(f"Error: {func.name} expects {len(func.params)} arguments but got {len(node.args)}")
+            if nargs != len(func.params):
+                raise Exception(f"Error: {func.name} expects {len(func.params)} arguments but got {nargs}")
+        elif isinstance(func, Builtin):
+            if not func.min_args <= nargs <= func.max_args:
+                expected = (func.min_args if func.min_args == func.max_args
+                            else f"{func.min_args} to {func.max_args}")
+                raise Exception(f"Error: {func.name} expects {expected} arguments but got {nargs}")
 
-        if isinstance(func, FunctionDef) or isinstance(func, LambdaExpr):
-            # Evaluate arguments
-            evaluated_args = [self.execute(arg) for arg in node.args]
+    def define_function(self, node):
+        # Bind a FunctionDef in the global scope, dropping memoized results the new binding invalidates
+        if self.memo is not None:
+            self.memo.define(node.name)
+        if self.strictness is not None:
+            self.strictness.invalidate()
+        self.modules.defined(node.name)
+        self.global_scope[node.name] = node
+        cell = self.global_cells.get(node.name)
+        if cell is not None:
+            cell.value = node
 
-            if isinstance(func, FunctionDef):
-                func_params = func.params
-                func_body = func.body
-            else:  # LambdaExpr
-                func_params = func.params
-                func_body = func.body
-
-            # Create a new scope for the function call
-            new_scope = env.copy()
-            new_scope.update(dict(zip(func_params, evaluated_args)))
-            self.call_stack.append(self.global_scope.copy())
-            self.global_scope = new_scope
-
-            # Execute the function body
-            result = self.execute(func_body)
-
-            # Restore the previous scope
-            self.global_scope = self.call_stack.pop()
-
-            # If the result is another Closure, execute it with the remaining arguments
-            while isinstance(result, Closure) and len(node.args) > len(func_params):
-                remaining_args = node.args[len(func_params):]
-                result = self.execute(Call(func=result, args=remaining_args))
-
-            return result
+    def undefine(self, name):
+        # Remove a global binding, as if name had never been defined
+        if self.memo is not None:
+            self.memo.define(name)
+        self.global_scope.pop(name, None)
+        cell = self.global_cells.get(name)
+        if cell is not None:
+            cell.value = UNBOUND
+
+    def global_cell(self, name):
+        # The Cell that follows the binding of the global name
+        cell = self.global_cells.get(name)
+        if cell is None:
+            cell = self.global_cells[name] = Cell(self.global_scope.get(name, UNBOUND))
+        return cell
+
+    def apply_function(self, func, env, args):
+        # Apply a FunctionDef or LambdaExpr to already evaluated arguments, through the memo cache if it is pure
+        memo = self.memo
+        if memo is not None:
+            cache = memo.cache_for(func)
+            if cache is not None and not (self.lazy and any(type(arg) is Thunk for arg in args)):
+                # Calls with unevaluated arguments are not memoized: their values are not known
+                key = memo_key(args)
+                result = cache.get(key)
+                if result is MISSING:
+                    result = self.invoke_function(func, env, args)
+                    cache.put(key, result)
+                return result
+        return self.invoke_function(func, env, args)
+
+    def map_call(self, name, *arrays):
+        # Apply the global function name elementwise: the i-th result is name(arrays[0][i], arrays[1][i], ...).
+        # Returns a NumPy array when NumPy is installed, otherwise a list.
+        self.modules.resolve_names([name])
+        return self.vectorizer.map_call(name, arrays)
+
+    def call_value(self, func, args):
+        # Apply a function value (a closure, a global function or a builtin) from Python code, such as a builtin
+        if isinstance(func, Builtin):
+            return func.function(self, args)
+        if self.engine == 'vm':
+            return self.vm.call(func, args)
+        if isinstance(func, Closure):
+            return self.apply_function(func.func, func.env, args)
+        return self.apply_function(func, self.global_env, args)
+
+    def invoke_function(self, func, env, args):
+        if type(func) is Builtin:
+            return func.function(self, args)
+        # Only the parameters are allocated: the new frame links to the defining environment.
+        func_params = func.params
+        if self.engine == 'compiled':
+            # Compiled bodies address parameters by slot, in a frame built by the compiler
+            result = self.compiler.call(func, env, args)
         else:
-            raise Exception(f"Unknown function: {node.func}")
+            frame = Environment(dict(zip(func_params, args)), env)
+            result = self.run_body(func, frame)
+
+        # If the result is another Closure, apply it to the remaining arguments
+        while isinstance(result, Closure) and len(args) > len(func_params):
+            result = self.apply_function(result.func, result.env, args[len(func_params):])
+
+        return result
 
     def repl(self):
         # Read-Eval-Print Loop (REPL) for interactive execution
         print("Type 'exit' or 'quit' to leave the interactive mode.")
         while True:
             try:
-                code = input(">>> ")
+                try:
+                    code = input(">>> ")
+                except EOFError:
+                    # End of input (Ctrl-D, or a closed pipe) ends the session like 'exit'
+                    print()
+                    break
                 if code.lower() in {'exit', 'quit'}:
                     print("Goodbye!")
                     break
@@ -180,7 +359,7 @@ class Interpreter:
                 ast = parser.parse()
                 print(ast)
                 for node in ast:
-                    result = self.execute(node)
+                    result = self.evaluate(node)
                     if result is not None:
                         print(result)
                         print()
@@ -188,11 +367,11 @@ class Interpreter:
                 print(e)
                 print()
 
-    def run_program(self, file_path):
-        # Execute a program from a file
+    def run_program(self, file_path, jobs=1):
+        # Execute a program from a file, running each statement as soon as it has been parsed.
+        # With jobs > 1, top-level expressions are spread over that many worker processes.
         try:
-            with open(file_path, 'r') as file:
-                code = file.read()
+            file = open(file_path, 'r')
         except FileNotFoundError:
             print(f"Error: The file '{file_path}' was not found.")
             return
@@ -200,21 +379,79 @@ class Interpreter:
             print(f"An error occurred while reading the file: {e}")
             return
 
-        try:
-            tokens = tokenize(code)
-            parser = Parser(tokens)
-            ast = parser.parse()
-        except Exception as e:
-            print(f"An error occurred while parsing the code: {e}")
-            return
+        with file:
+            self.modules.directory = os.path.dirname(file_path)
+            if self.cache is None or not file.seekable():
+                statements = Parser(iter_file_tokens(file)).iter_statements()
+            else:
+                statements = self.cached_statements(file)
+            if jobs > 1:
+                ParallelRunner(self, jobs).run(statements)
+                return
+            while True:
+                try:
+                    node = next(statements)
+                except StopIteration:
+                    break
+                except (OSError, UnicodeError) as e:
+                    print(f"An error occurred while reading the file: {e}")
+                    return
+                except Exception as e:
+                    # Statements before the error have already run; nothing after it can be parsed
+                    print(f"An error occurred while parsing the code: {e}")
+                    return
 
-        for node in ast:
-            print(node)
-            try:
-                result = self.execute(node)
-                if result is not None:
-                    print(result)
+                print(node)
+                try:
+                    if self.resolver is not None:
+                        # Problems the statement will run into if it reaches the code in question.
+                        # Imported functions it reaches are loaded first, so that they are known.
+                        self.modules.resolve(node)
+                        for message in self.resolver.check(node):
+                            print(f"Warning: {message}")
+                    result = self.evaluate(node)
+                    if result is not None:
+                        print(result)
+                        print()
+                except Exception as e:
+                    print(f"An error occurred during execution: {e}")
                     print()
-            except Exception as e:
-                print(f"An error occurred during execution: {e}")
-                print()
+            if self.resolver is not None:
+                for message in self.resolver.finish():
+                    print(f"Warning: {message}")
+
+    def cached_statements(self, file):
+        # Yield the statements of an open program file, from the program cache when it has them.
+        # Either way one statement is held at a time: the file is hashed in chunks, a cached entry
+        # is unpickled statement by statement, and on a miss each statement is written to the new
+        # entry as soon as it has been parsed.
+        key = self.cache.file_key(file)
+        file.seek(0)
+        cached = self.cache.read_statements(key)
+        if cached is not None:
+            count = 0
+            try:
+                for node in cached:
+                    count += 1
+                    yield node
+                return
+            except CacheError:
+                # The entry is damaged: parse the statements it did not provide
+                statements = Parser(iter_file_tokens(file)).iter_statements()
+                for _ in range(count):
+                    next(statements)
+                yield from statements
+                return
+        writer = self.cache.writer(key)
+        if writer is None:
+            yield from Parser(iter_file_tokens(file)).iter_statements()
+            return
+        try:
+            for node in Parser(iter_file_tokens(file)).iter_statements():
+                writer.write(node)
+                yield node
+        except BaseException:
+            # A parse error, or the caller stopped early: no entry for an incomplete program
+            writer.abort()
+            raise
+        writer.commit()
\ No newline at end of file
@@ -0,0 +1,320 @@
+from AST_Node import FunctionDef, BinOp, UnaryOp, Variable, Number, Boolean, Call, Conditional
+from my_runtime import Environment, divide
+from my_memo import MISSING, memo_key
+
+# Engines whose calls all go through Interpreter.apply_function, where the JIT intercepts them
+JIT_ENGINES = ('compiled', 'tree')
+DEFAULT_THRESHOLD = 100  # Interpreted calls before a function is translated
+
+# Pragma that keeps a function interpreted: "# pragma: no-jit" before its Defun
+NO_JIT_PRAGMA = 'no-jit'
+
+# Operators with the same meaning in Python ('/' is floor division that reports division by zero)
+NATIVE_OPS = {'+': '+', '-': '-', '*': '*', '%': '%', '==': '==', '!=': '!=',
+              '>': '>', '<': '<', '>=': '>=', '<=': '<='}
+
+FAILED = object()  # Marks a function whose body has no translation
+
+
+class NotTranslatable(Exception):
+    # The body uses something the translator does not handle; the function stays interpreted
+    pass
+
+
+def entry_name(func):
+    # Python name of a translated function; names of module functions are qualified with a dot
+    return f"f_{func.name.replace('.', '_')}"
+
+
+class Translator:
+    """
+        Translate the body of a FunctionDef into the source of a Python function. Parameters
+        become locals, Conditionals become conditional expressions, && and || become and/or
+        (which return the same operand the interpreter does), and calls to the function itself
+        with the right number of arguments become direct Python calls. Self-calls in tail
+        position are turned into a loop that rebinds the parameters, so tail-recursive
+        functions such as gcd run in constant stack space. Other calls go back through the
+        interpreter. Lambdas, and globals used as values, are not translated: the function
+        stays interpreted, unless they only occur in branches listed in cold, which are then
+        evaluated by the interpreter with the current parameter values.
+    """
+
+    def __init__(self, func, cold=frozenset()):
+        self.func = func
+        self.cold = cold  # (Conditional, branch) pairs that may be left to the interpreter; branch is True for true_expr
+        self.constants = {}  # Name in the generated code -> node evaluated through the interpreter
+
+    def translate(self):
+        """
+            Return the source of the Python function, and the constants it refers to.
+        """
+        func = self.func
+        params = ', '.join(self.local(param) for param in func.params)
+        if self.has_tail_call(func.body):
+            lines = [f"def {self.entry()}({params}):", "    while True:"]
+            self.statements(func.body, 2, lines)
+        else:
+            lines = [f"def {self.entry()}({params}):", f"    return {self.expression(func.body)}"]
+        return "\n".join(lines) + "\n", self.constants
+
+    def entry(self):
+        return entry_name(self.func)
+
+    def local(self, name):
+        # Prefixed so that parameters named like Python keywords or helpers do not clash
+        return f"v_{name}"
+
+    def is_self_call(self, node):
+        func = self.func
+        return (isinstance(node, Call) and node.func == func.name and func.name not in func.params
+                and len(node.args) == len(func.params))
+
+    def has_tail_call(self, node):
+        if self.is_self_call(node):
+            return True
+        if isinstance(node, Conditional):
+            return self.has_tail_call(node.true_expr) or self.has_tail_call(node.false_expr)
+        return False
+
+    def statements(self, node, depth, lines):
+        # Append the statements that finish a call whose result is node, in tail position
+        indent = "    " * depth
+        if isinstance(node, Conditional):
+            lines.append(f"{indent}if {self.expression(node.condition)}:")
+            self.branch_statements(node, True, depth + 1, lines)
+            lines.append(f"{indent}else:")
+            self.branch_statements(node, False, depth + 1, lines)
+        elif self.is_self_call(node):
+            # Arguments are evaluated before any parameter is rebound, as in a real call
+            targets = ', '.join(self.local(param) for param in self.func.params)
+            values = ', '.join(self.expression(arg) for arg in node.args)
+            if len(node.args) == 1:
+                targets += ','
+                values += ','
+            lines.append(f"{indent}{targets} = {values}")
+            lines.append(f"{indent}continue")
+        else:
+            lines.append(f"{indent}return {self.expression(node)}")
+
+    def branch_statements(self, conditional, branch, depth, lines):
+        node = conditional.true_expr if branch else conditional.false_expr
+        if (conditional, branch) not in self.cold:
+            self.statements(node, depth, lines)
+            return
+        start = len(lines)
+        try:
+            self.statements(node, depth, lines)
+        except NotTranslatable:
+            del lines[start:]
+            lines.append(f"{'    ' * depth}return {self.interpreted(node)}")
+
+    def branch(self, conditional, branch):
+        node = conditional.true_expr if branch else conditional.false_expr
+        if (conditional, branch) not in self.cold:
+            return self.expression(node)
+        try:
+            return self.expression(node)
+        except NotTranslatable:
+            return self.interpreted(node)
+
+    def interpreted(self, node):
+        # Evaluate node with the interpreter, in a frame holding the parameters
+        name = f"cold_{len(self.constants)}"
+        self.constants[name] = node
+        return f"interpret({name}, [{', '.join(self.local(param) for param in self.func.params)}])"
+
+    def expression(self, node):
+        if isinstance(node, Number):
+            if type(node.value) is not int:
+                raise NotTranslatable()
+            return repr(node.value)
+        if isinstance(node, Boolean):
+            return repr(node.value)
+        if isinstance(node, Variable):
+            if node.name not in self.func.params:
+                raise NotTranslatable()
+            return self.local(node.name)
+        if isinstance(node, BinOp):
+            left = self.expression(node.left)
+            right = self.expression(node.right)
+            if node.op == '&&':
+                return f"({left} and {right})"
+            if node.op == '||':
+                return f"({left} or {right})"
+            if node.op == '/':
+                return f"divide({left}, {right})"
+            if node.op not in NATIVE_OPS:
+                raise NotTranslatable()
+            return f"({left} {NATIVE_OPS[node.op]} {right})"
+        if isinstance(node, UnaryOp):
+            if node.op == '!':
+                return f"(not {self.expression(node.expr)})"
+            if node.op == '-':
+                return f"(-{self.expression(node.expr)})"
+            raise NotTranslatable()
+        if isinstance(node, Conditional):
+            return (f"({self.branch(node, True)} if {self.expression(node.condition)} "
+                    f"else {self.branch(node, False)})")
+        if isinstance(node, Call):
+            if not isinstance(node.func, str) or node.func in self.func.params:
+                # Lambdas, and closures passed in as arguments
+                raise NotTranslatable()
+            args = ', '.join(self.expression(arg) for arg in node.args)
+            if self.is_self_call(node):
+                return f"{self.entry()}({args})"
+            # The callee is looked up and checked before the arguments are evaluated, as the interpreter does
+            name = f"call_{len(self.constants)}"
+            self.constants[name] = node
+            return f"apply(resolve({name}), [{args}])"
+        raise NotTranslatable()
+
+
+class JIT:
+    """
+        Tiered execution of global functions. Every call of a FunctionDef is counted, and once
+        a function has been called threshold times its body is translated into Python source
+        (see Translator), compiled with compile() and used for all later calls. The generated
+        code is linked against the memo cache: a memoized function's calls, including its
+        self-calls, still go through the cache.
+
+        Any global definition deoptimizes every function: the linked entry points are dropped,
+        since the redefined function must run its new body and a changed callee can change
+        whether its callers are memoized. Translations are kept, so a function that is still
+        hot is linked again on its next call without being translated again; only the counts
+        and translation of the definition being replaced or removed are dropped, so long-lived
+        interpreters do not keep every function they ever defined.
+
+        A profile (see my_pgo.ProfileGuide) can mark functions as hot before their first call
+        with prime(), and replace cold_branches() to name the branches that may be left to the
+        interpreter.
+    """
+
+    def __init__(self, interpreter, threshold=DEFAULT_THRESHOLD):
+        if interpreter.engine not in JIT_ENGINES:
+            raise ValueError(f"The JIT supports the {' and '.join(JIT_ENGINES)} engines")
+        self.interpreter = interpreter
+        self.threshold = threshold
+        self.counts = {}  # FunctionDef -> interpreted calls so far
+        self.code = {}  # FunctionDef -> (code object, constants), or FAILED
+        self.entries = {}  # FunctionDef -> linked Python function
+        self.dump = False  # Print the source of each function as it is translated
+
+    def install(self):
+        interpreter = self.interpreter
+        apply_function = interpreter.apply_function
+        define_function = interpreter.define_function
+        undefine = interpreter.undefine
+        global_scope = interpreter.global_scope
+        counts = self.counts
+        code = self.code
+        entries = self.entries
+        threshold = self.threshold
+
+        def jit_apply_function(func, env, args):
+            entry = entries.get(func)
+            if entry is None and type(func) is FunctionDef:
+                count = counts.get(func, 0) + 1
+                counts[func] = count
+                if count >= threshold:
+                    entry = self.link(func)
+            if entry is not None and entry is not FAILED and len(args) == len(func.params):
+                return entry(*args)
+            return apply_function(func, env, args)
+
+        def forget(name):
+            # Drop what was recorded for the definition that name is bound to
+            entries.clear()
+            old = global_scope.get(name)
+            counts.pop(old, None)
+            code.pop(old, None)
+
+        def jit_define_function(node):
+            forget(node.name)
+            define_function(node)
+
+        def jit_undefine(name):
+            forget(name)
+            undefine(name)
+
+        interpreter.apply_function = jit_apply_function
+        interpreter.define_function = jit_define_function
+        interpreter.undefine = jit_undefine
+        interpreter.jit = self
+
+    def prime(self, func):
+        # Treat func as hot already: it is translated on its next call
+        self.counts[func] = max(self.counts.get(func, 0), self.threshold - 1)
+
+    def cold_branches(self, func):
+        # Branches of func that are rarely taken, as (Conditional, branch) pairs
+        return frozenset()
+
+    def translate(self, func):
+        # Compile func's body to a code object, or return FAILED when it has no translation
+        code = self.code.get(func)
+        if code is None:
+            code = FAILED
+            if NO_JIT_PRAGMA not in func.pragmas:
+                try:
+                    source, constants = Translator(func, self.cold_branches(func)).translate()
+                except NotTranslatable:
+                    source = None
+                if source is not None:
+                    if self.dump:
+                        print(f"JIT: {func.name}\n{source}")
+                    code = (compile(source, f"<jit {func.name}>", 'exec'), constants)
+            self.code[func] = code
+        return code
+
+    def link(self, func):
+        """
+            Return the Python function that runs func, or FAILED if func stays interpreted.
+        """
+        code = self.translate(func)
+        if code is FAILED:
+            self.entries[func] = FAILED
+            return FAILED
+        interpreter = self.interpreter
+        global_env = interpreter.global_env
+        code, constants = code
+
+        def resolve(node):
+            callee = global_env.lookup(node.func)
+            interpreter.check_call(callee, node)
+            return callee
+
+        def apply(callee, args):
+            return interpreter.apply_function(callee, global_env, args)
+
+        params = func.params
+        if interpreter.engine == 'compiled':
+            compiled = {}
+
+            def interpret(node, args):
+                code = compiled.get(node)
+                if code is None:
+                    code = compiled[node] = interpreter.compiler.compile(node, (params,))
+                return code([*args, global_env])
+        else:
+            def interpret(node, args):
+                return interpreter.execute(node, Environment(dict(zip(params, args)), global_env))
+
+        namespace = {'divide': divide, 'resolve': resolve, 'apply': apply, 'interpret': interpret, **constants}
+        exec(code, namespace)
+        name = entry_name(func)
+        entry = namespace[name]
+        cache = interpreter.memo.cache_for(func) if interpreter.memo is not None else None
+        if cache is not None:
+            body = entry
+
+            def entry(*args):
+                key = memo_key(args)
+                result = cache.get(key)
+                if result is MISSING:
+                    result = body(*args)
+                    cache.put(key, result)
+                return result
+            # Self-calls in the body go through the cache too
+            namespace[name] = entry
+        self.entries[func] = entry
+        return entry
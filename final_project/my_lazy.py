@@ -0,0 +1,135 @@
+from AST_Node import FunctionDef, LambdaExpr, BinOp, UnaryOp, Variable, Number, Boolean, Call, Conditional
+from my_runtime import Closure
+from my_purity import free_names
+
+# Engines that can pass arguments as thunks
+LAZY_ENGINES = ('tree',)
+
+
+class Thunk:
+    """
+        An argument that has not been evaluated yet: its expression and the frame it appeared in.
+        force() evaluates it on first use and keeps the value, dropping the expression and frame
+        so that nothing they refer to is kept alive. A thunk whose evaluation raised is left
+        unevaluated, so forcing it again raises the same error.
+    """
+    __slots__ = ('execute', 'node', 'env', 'value')
+
+    def __init__(self, execute, node, env):
+        self.execute = execute
+        self.node = node
+        self.env = env
+        self.value = None
+
+    def force(self):
+        if self.node is not None:
+            self.value = self.execute(self.node, self.env)
+            self.execute = self.node = self.env = None
+        return self.value
+
+
+def delay(execute, node, env):
+    """
+        Return the value of node as an argument passed by need: constants, lambdas and variables
+        are cheap to produce and cannot fail, so they are passed as they are (a variable that
+        holds a thunk passes that thunk on); anything else becomes a Thunk.
+    """
+    node_type = type(node)
+    if node_type is Number or node_type is Boolean:
+        return node.value
+    if node_type is LambdaExpr:
+        return Closure(node, env)
+    if node_type is Variable:
+        vars_env = env
+        while vars_env is not None:
+            if node.name in vars_env.vars:
+                return vars_env.vars[node.name]
+            vars_env = vars_env.parent
+        # Undefined: report it only if the argument is used
+    return Thunk(execute, node, env)
+
+
+class StrictnessAnalyzer:
+    """
+        Decide which parameters of each global function are strict: evaluated by every call that
+        returns. Strict arguments can be evaluated before the call at no risk, so only the others
+        are passed as thunks. A parameter is strict in a body when the body always evaluates it:
+        both branches of a Conditional must use it (or its condition), only the left operand of
+        && and || counts, lambda bodies never count, and a call counts the arguments the callee
+        is strict in. Recursive functions are solved by iterating from "all strict" down to a
+        fixpoint, so a parameter that is only passed to the recursive call is not strict.
+    """
+
+    def __init__(self, global_scope):
+        self.global_scope = global_scope
+        self.verdicts = {}  # FunctionDef -> tuple of booleans, one per parameter
+
+    def strict_params(self, func):
+        verdict = self.verdicts.get(func)
+        if verdict is None:
+            self.analyze(func)
+            verdict = self.verdicts[func]
+        return verdict
+
+    def analyze(self, func):
+        # Solve func together with every global function it can reach that has no verdict yet
+        group = []
+        seen = {func}
+        pending = [func]
+        while pending:
+            current = pending.pop()
+            group.append(current)
+            for name in free_names(current.body, current.params):
+                callee = self.global_scope.get(name)
+                if isinstance(callee, FunctionDef) and callee not in seen and callee not in self.verdicts:
+                    seen.add(callee)
+                    pending.append(callee)
+        assumed = {member: (True,) * len(member.params) for member in group}
+        changed = True
+        while changed:
+            changed = False
+            for member in group:
+                used = self.strict_names(member.body, member.params, assumed)
+                verdict = tuple(param in used for param in member.params)
+                if verdict != assumed[member]:
+                    assumed[member] = verdict
+                    changed = True
+        self.verdicts.update(assumed)
+
+    def strict_names(self, node, params, assumed):
+        """
+            Return the parameters that evaluating node always evaluates.
+        """
+        if isinstance(node, Variable):
+            return {node.name} if node.name in params else set()
+        if isinstance(node, BinOp):
+            left = self.strict_names(node.left, params, assumed)
+            if node.op == '&&' or node.op == '||':
+                return left
+            return left | self.strict_names(node.right, params, assumed)
+        if isinstance(node, UnaryOp):
+            return self.strict_names(node.expr, params, assumed)
+        if isinstance(node, Conditional):
+            return (self.strict_names(node.condition, params, assumed)
+                    | (self.strict_names(node.true_expr, params, assumed)
+                       & self.strict_names(node.false_expr, params, assumed)))
+        if isinstance(node, Call):
+            if isinstance(node.func, LambdaExpr):
+                return set()
+            if node.func in params:
+                # Calling a parameter forces it; its own parameters are unknown, so the arguments are lazy
+                return {node.func}
+            callee = self.global_scope.get(node.func)
+            if not isinstance(callee, FunctionDef) or len(callee.params) != len(node.args):
+                return set()  # The call fails before any argument is evaluated
+            verdict = assumed[callee] if callee in assumed else self.verdicts[callee]
+            used = set()
+            for arg, strict in zip(node.args, verdict):
+                if strict:
+                    used |= self.strict_names(arg, params, assumed)
+            return used
+        return set()
+
+    def invalidate(self):
+        # Forget every verdict; called whenever a global name is bound
+        self.verdicts.clear()
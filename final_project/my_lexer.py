@@ -1,8 +1,10 @@
 import re
+from collections import namedtuple
 
 # Define token patterns
 token_patterns = [
     ('DEFUN', r'Defun'),                            # Matches function definition keyword
+    ('IMPORT', r'Import\b'),                        # Matches the import keyword
     ('LAMBDA', r'Lambd'),                           # Matches lambda keyword
     ('ARITH_OP', r'[+\-*/%]'),                      # Matches arithmetic operators
     ('INTEGER', r'-?\d+'),                          # Matches integers (including negative integers)
@@ -19,6 +21,7 @@ token_patterns = [
     ('LBRACE', r'\{'),                              # Matches left curly brace
     ('RBRACE', r'\}'),                              # Matches right curly brace
     ('QUESTION', r'\?'),                            # Matches question mark in conditional expressions
+    ('PRAGMA', r'#[ \t]*pragma:.*'),                # Matches pragma comments such as "# pragma: no-memo"
     ('COMMENT', r'#.*'),                            # Matches comments
     ('WHITESPACE', r'\s+'),                         # Matches whitespace (will be ignored)
 ]
@@ -29,18 +32,79 @@ master_pattern = '|'.join(f'(?P<{name}>{pattern})' for name, pattern in token_pa
 # Compile the master pattern into a regex object
 master_regex = re.compile(master_pattern)
 
-def tokenize(code):
-    tokens = []
-    for match in master_regex.finditer(code):
-        for name, _ in token_patterns:
-            value = match.group(name)
-            if value:
-                if name == 'INTEGER':
-                    value = int(value)  # Convert integers from string to int
-                elif name == 'BOOLEAN':
-                    value = (value == 'TRUE')  # Convert boolean strings to True/False
-                if name not in ['COMMENT', 'WHITESPACE']:  # Skip comments and whitespace
-                    tokens.append((name, value))
-                break
-    return tokens
+# Tokens skipped by the lexer
+IGNORED = frozenset(('COMMENT', 'WHITESPACE'))
+
+
+def _pragma_name(text):
+    return text.split('pragma:', 1)[1].strip()  # Keep only the pragma name
+
+
+# Conversions from matched text to token values
+converters = {
+    'INTEGER': int,                             # Convert integers from string to int
+    'BOOLEAN': lambda text: text == 'TRUE',     # Convert boolean strings to True/False
+    'PRAGMA': _pragma_name,
+}
+
+
+class Token(namedtuple('Token', ['type', 'value', 'offset', 'line', 'column'])):
+    """
+        A token with its source position. It is still a tuple, so token[0] and token[1] are the type and value.
+    """
+    __slots__ = ()
+
+    def __repr__(self):
+        return repr((self.type, self.value))
 
+
+class LexerError(Exception):
+    def __init__(self, message, line, column):
+        super().__init__(f"{message} at line {line}, column {column}")
+        self.line = line
+        self.column = column
+
+
+def iter_tokens(code, line=1, offset=0):
+    """
+        Lazily yield the tokens of code. The alternative that matched is read from match.lastgroup,
+        and a character that no pattern matches raises a LexerError with its line and column.
+        line and offset locate the start of code in a larger source, for callers that tokenize a file piecewise.
+    """
+    match_at = master_regex.match
+    pos = 0
+    line_start = 0  # Offset of the first character of the current line
+    end = len(code)
+    while pos < end:
+        match = match_at(code, pos)
+        if match is None:
+            raise LexerError(f"Unexpected character {code[pos]!r}", line, pos - line_start + 1)
+        name = match.lastgroup
+        text = match.group()
+        if name not in IGNORED:
+            converter = converters.get(name)
+            yield Token(name, converter(text) if converter else text, offset + pos, line, pos - line_start + 1)
+        elif name == 'WHITESPACE':
+            newlines = text.count('\n')
+            if newlines:
+                line += newlines
+                line_start = pos + text.rindex('\n') + 1
+        pos = match.end()
+
+
+def iter_file_tokens(lines):
+    """
+        Lazily tokenize a source read line by line, such as an open file. No token spans a line
+        break, so each line is tokenized on its own and only the current line is held in memory.
+    """
+    offset = 0
+    for line_number, text in enumerate(lines, 1):
+        yield from iter_tokens(text, line_number, offset)
+        offset += len(text)
+
+
+def tokenize(code):
+    """
+        Return the list of tokens of code.
+    """
+    return list(iter_tokens(code))
@@ -0,0 +1,130 @@
+from collections import OrderedDict
+
+from AST_Node import FunctionDef
+from my_purity import PurityAnalyzer
+
+# Marks a function whose memoization has not been decided yet, and a cache miss
+UNANALYZED = object()
+MISSING = object()
+
+# Pragma that opts a function out of memoization: "# pragma: no-memo" before its Defun
+NO_MEMO_PRAGMA = 'no-memo'
+
+# Results stored for a chain of memoized tail calls: the machines keep the keys of the first calls
+# only, so tail-recursive loops run in constant space
+TAIL_CALL_KEYS = 32
+
+
+def memo_key(args):
+    # Argument values plus their types, so that 1 and TRUE (equal in Python) get separate entries
+    return (*args, *map(type, args))
+
+
+class LRUCache:
+    """
+        Bounded result cache that evicts the least recently used entry and counts hits and misses.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        data = self.data
+        if key in data:
+            data.move_to_end(key)
+            self.hits += 1
+            return data[key]
+        self.misses += 1
+        return MISSING
+
+    def put(self, key, value):
+        data = self.data
+        data[key] = value
+        if len(data) > self.maxsize:
+            data.popitem(last=False)
+
+    def clear(self):
+        self.data.clear()
+
+
+class MemoTable:
+    """
+        Per-function result caches for pure global functions. Whether a function is memoized is
+        decided on its first call; every binding of a global name drops those decisions, and
+        rebinding an existing name also empties the caches, since cached results may depend on it.
+        The cache of a definition that is replaced is dropped with it; its counts are kept under
+        its name, so the statistics cover every definition without keeping old ones alive.
+    """
+
+    def __init__(self, global_scope, maxsize=1024):
+        self.global_scope = global_scope
+        self.maxsize = maxsize
+        self.analyzer = PurityAnalyzer(global_scope)
+        self.active = {}  # FunctionDef -> its LRUCache, or None when not memoized
+        self.caches = {}  # FunctionDef -> its LRUCache, for every current definition that has one
+        self.retired = {}  # name -> [hits, misses] of the caches of its replaced definitions
+
+    def cache_for(self, func):
+        """
+            Return the cache of func, or None if its calls must not be memoized.
+        """
+        cache = self.active.get(func, UNANALYZED)
+        if cache is UNANALYZED:
+            if type(func) is not FunctionDef:
+                # Lambdas are never memoized, and are not kept here: a compiled lambda is a new node
+                # every time a statement is compiled
+                return None
+            cache = None
+            if self.analyzer.is_pure(func) and NO_MEMO_PRAGMA not in func.pragmas:
+                cache = self.caches.get(func)
+                if cache is None:
+                    cache = self.caches[func] = LRUCache(self.cache_size(func))
+            self.active[func] = cache
+        return cache
+
+    def cache_size(self, func):
+        # Entries kept in the cache of func; a profile can replace this to give some functions more
+        return self.maxsize
+
+    def define(self, name):
+        """
+            Account for the global name being bound to a new function.
+        """
+        self.analyzer.invalidate()
+        self.active.clear()
+        if name in self.global_scope:
+            self.retire(self.global_scope[name])
+            for cache in self.caches.values():
+                cache.clear()
+
+    def retire(self, func):
+        # Drop the cache of a definition that is being replaced, keeping its counts
+        cache = self.caches.pop(func, None)
+        if cache is not None:
+            counts = self.retired.setdefault(func.name, [0, 0])
+            counts[0] += cache.hits
+            counts[1] += cache.misses
+
+    def forget(self, funcs):
+        """
+            Drop the caches of functions that will not be called again, with their statistics.
+        """
+        for func in funcs:
+            self.caches.pop(func, None)
+            self.active.pop(func, None)
+            self.retired.pop(func.name, None)
+
+    def stats(self):
+        """
+            Return (function name, hits, misses, entries) for every memoized function name.
+        """
+        totals = {name: [hits, misses, 0] for name, (hits, misses) in self.retired.items()}
+        for func, cache in self.caches.items():
+            total = totals.setdefault(func.name, [0, 0, 0])
+            total[0] += cache.hits
+            total[1] += cache.misses
+            total[2] += len(cache.data)
+        return [(name, *total) for name, total in totals.items()]
@@ -0,0 +1,252 @@
+import os
+from weakref import WeakSet
+
+from AST_Node import FunctionDef, Import, LambdaExpr, BinOp, UnaryOp, Variable, Call, Conditional, NodeFactory
+from my_lexer import iter_tokens
+from my_parser import Parser
+from my_purity import free_names
+
+MODULE_SUFFIX = '.lambda'
+# Prefix of the source hashed for a module's index in the parse cache, so it never shares an entry
+# with the same text run as a program
+INDEX_TAG = '\0module-index\0'
+
+
+class Module:
+    """
+        An imported source file of function definitions. index maps each name the module defines
+        to (start, end, line): the slice of source holding its Defun, with the pragma comments
+        before it, and the line the slice starts on. When a name is defined more than once, the
+        last definition is the one imported, as if the module had been run.
+    """
+    __slots__ = ('name', 'path', 'source', 'index')
+
+    def __init__(self, name, path, source, index):
+        self.name = name
+        self.path = path
+        self.source = source
+        self.index = index
+
+
+def build_index(name, source):
+    """
+        Return the index of a module's source. Only the lexer runs over the whole file: the
+        definitions are found from their Defun tokens, and their bodies are left unparsed.
+    """
+    index = {}
+    previous = None  # (name, start, line) of the definition whose end has not been found yet
+    start = None  # Where the next definition starts: its first pragma, or the Defun itself
+    tokens = iter_tokens(source)
+    for token in tokens:
+        if token.type == 'PRAGMA':
+            if start is None:
+                start = token
+            continue
+        if token.type == 'DEFUN':
+            header = [next(tokens, None) for _ in range(4)]
+            if (None in header or [t.type for t in header] != ['LBRACE', 'IDENTIFIER', 'COLON', 'IDENTIFIER']):
+                raise Exception(f"Error: malformed Defun in module {name} at line {token.line}")
+            first = start if start is not None else token
+            if previous is not None:
+                index[previous[0]] = (previous[1], first.offset, previous[2])
+            previous = (header[3].value, first.offset, first.line)
+        elif previous is None:
+            raise Exception(f"Error: module {name} may only contain function definitions (line {token.line})")
+        start = None
+    if previous is not None:
+        index[previous[0]] = (previous[1], len(source), previous[2])
+    return index
+
+
+def qualified_name(module, name):
+    # Global name of a module function when another function of the module calls it. Identifiers
+    # cannot contain a dot, so it never clashes with a name the program defines.
+    return f"{module.name}.{name}"
+
+
+def qualify(node, module, bound, nodes, references):
+    """
+        Return node with every reference to a name the module defines, other than a parameter in
+        bound, replaced by its qualified name, and add those qualified names to references.
+        Module functions then call each other whatever the importing program binds the names to.
+    """
+    if isinstance(node, Variable):
+        if node.name in module.index and node.name not in bound:
+            references.add(node.name)
+            return nodes.variable(qualified_name(module, node.name))
+        return node
+    elif isinstance(node, BinOp):
+        return nodes.binop(qualify(node.left, module, bound, nodes, references), node.op,
+                           qualify(node.right, module, bound, nodes, references))
+    elif isinstance(node, UnaryOp):
+        return nodes.unary_op(node.op, qualify(node.expr, module, bound, nodes, references))
+    elif isinstance(node, Conditional):
+        return nodes.conditional(qualify(node.condition, module, bound, nodes, references),
+                                 qualify(node.true_expr, module, bound, nodes, references),
+                                 qualify(node.false_expr, module, bound, nodes, references))
+    elif isinstance(node, Call):
+        func = node.func
+        if isinstance(func, LambdaExpr):
+            func = qualify(func, module, bound, nodes, references)
+        elif func in module.index and func not in bound:
+            references.add(func)
+            func = qualified_name(module, func)
+        return nodes.call(func, [qualify(arg, module, bound, nodes, references) for arg in node.args])
+    elif isinstance(node, LambdaExpr):
+        return nodes.lambda_expr(node.params, qualify(node.body, module, bound | set(node.params), nodes, references))
+    return node
+
+
+class ModuleLoader:
+    """
+        Imports of function libraries. An Import binds the names a module defines (or the ones it
+        lists) without parsing any function: the module is only read and indexed, and the index
+        is kept in the parse cache, keyed by the module's source. A function is parsed when a
+        statement that can reach it is about to run, along with the imported functions it
+        reaches in turn, and each parsed function is cached on its own, keyed by its source
+        text. A program that uses a few helpers of a large library therefore parses and holds
+        only those helpers.
+
+        Module functions see their own module first: inside a module, a name the module defines
+        refers to its definition there, which is loaded under the qualified name module.name
+        (see qualify), and other names to the program's globals. An imported function therefore
+        calls the module's helpers whether or not they were imported, and a program that defines
+        a function of the same name as a helper does not change what the module computes.
+
+        Functions are loaded before the statement runs rather than when the call happens, since
+        memoization, the JIT and the parallel runners analyze every function a call can reach.
+    """
+
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        self.directory = None  # Directory of the running program, searched first (the working directory if None)
+        self.search_path = []  # Further directories searched for modules, in order
+        self.modules = {}  # path -> Module
+        self.pending = {}  # Global name -> (Module, name in the module) of a function still to be parsed
+        self.linked = WeakSet()  # Functions whose reachable imports are all loaded, since the last import
+        self.nodes = NodeFactory()
+
+    def find(self, name):
+        for directory in [self.directory or os.curdir, *self.search_path]:
+            path = os.path.join(directory, name + MODULE_SUFFIX)
+            if os.path.isfile(path):
+                return path
+        raise Exception(f"Error: module {name} not found")
+
+    def load(self, name):
+        """
+            Return the Module called name, reading and indexing it if its file has changed.
+        """
+        path = self.find(name)
+        try:
+            with open(path, 'r') as file:
+                source = file.read()
+        except (OSError, UnicodeError) as e:
+            raise Exception(f"Error: could not read module {name}: {e}")
+        module = self.modules.get(path)
+        if module is not None and module.source == source:
+            return module
+        if module is not None:
+            self.forget(module)
+        cache = self.interpreter.cache
+        key = cache.key(INDEX_TAG + source) if cache is not None else None
+        index = cache.load(key) if cache is not None else None
+        if index is None:
+            index = build_index(name, source)
+            if cache is not None:
+                cache.store(key, index)
+        module = self.modules[path] = Module(name, path, source, index)
+        return module
+
+    def import_module(self, node):
+        """
+            Run an Import statement: bind the names it imports, to be parsed when first needed.
+        """
+        module = self.load(node.module)
+        names = node.names if node.names is not None else tuple(module.index)
+        for name in names:
+            if name not in module.index:
+                raise Exception(f"Error: module {node.module} does not define {name}")
+        interpreter = self.interpreter
+        for name in names:
+            if name in interpreter.global_scope:
+                # The imported definition replaces the current one
+                interpreter.undefine(name)
+            self.pending[name] = (module, name)
+        self.linked = WeakSet()
+
+    def forget(self, module):
+        # The module's file has changed: its functions are loaded again, from the new source, when needed
+        prefix = qualified_name(module, '')
+        interpreter = self.interpreter
+        for name in [name for name in interpreter.global_scope if name.startswith(prefix)]:
+            interpreter.undefine(name)
+        for name in [name for name, (source, _) in self.pending.items() if source is module]:
+            del self.pending[name]
+
+    def exports(self, node):
+        # The names an Import statement binds
+        if node.names is not None:
+            return node.names
+        return tuple(self.load(node.module).index)
+
+    def resolve(self, node):
+        """
+            Load the imported functions that the statement node can reach.
+        """
+        if not self.pending or isinstance(node, Import):
+            return
+        if isinstance(node, FunctionDef):
+            # Its own name is about to be rebound
+            self.resolve_names(free_names(node.body, node.params) - {node.name})
+        else:
+            self.resolve_names(free_names(node, ()))
+
+    def resolve_names(self, names):
+        global_scope = self.interpreter.global_scope
+        todo = list(names)
+        while todo and self.pending:
+            name = todo.pop()
+            entry = self.pending.get(name)
+            if entry is not None:
+                module, local_name = entry
+                func, references = self.parse(module, local_name, name)
+                self.interpreter.define_function(func)
+                for reference in references:
+                    qualified = qualified_name(module, reference)
+                    if qualified not in global_scope:
+                        self.pending[qualified] = (module, reference)
+            else:
+                func = global_scope.get(name)
+            if isinstance(func, FunctionDef) and func not in self.linked:
+                self.linked.add(func)
+                todo.extend(free_names(func.body, func.params))
+
+    def defined(self, name):
+        # A Defun of the program replaces an imported function that has not been loaded
+        self.pending.pop(name, None)
+
+    def parse(self, module, name, binding):
+        """
+            Return the FunctionDef of name in module, to be bound to the global binding, and the
+            module's names it refers to. The parsed definition comes from the parse cache when
+            the cache has it.
+        """
+        start, end, line = module.index[name]
+        text = module.source[start:end]
+        cache = self.interpreter.cache
+        key = cache.key(text) if cache is not None else None
+        statements = cache.load(key) if cache is not None else None
+        if statements is None:
+            try:
+                statements = Parser(iter_tokens(text, line, start), self.nodes).parse()
+            except Exception as e:
+                raise Exception(f"Error: could not parse {name} in module {module.name}: {e}")
+            if cache is not None:
+                cache.store(key, statements)
+        if len(statements) != 1 or not isinstance(statements[0], FunctionDef) or statements[0].name != name:
+            raise Exception(f"Error: module {module.name} may only contain function definitions (line {line})")
+        func = statements[0]
+        references = set()
+        body = qualify(func.body, module, set(func.params), self.nodes, references)
+        return self.nodes.function_def(binding, func.params, body, func.pragmas), references
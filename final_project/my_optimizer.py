@@ -0,0 +1,176 @@
+from AST_Node import FunctionDef, LambdaExpr, BinOp, UnaryOp, Number, Boolean, Call, Conditional
+from my_runtime import BINARY_OPS, UNARY_OPS
+
+ARITHMETIC_OPS = ('+', '-', '*', '/', '%')
+COMPARISON_OPS = ('==', '!=', '>', '<', '>=', '<=')
+
+
+def transform(node, rewrite):
+    """
+        Rebuild node bottom-up, applying rewrite to every node after its children have been rewritten.
+        Nodes whose children are unchanged are reused, so an untouched tree comes back as the same object.
+    """
+    if isinstance(node, FunctionDef):
+        body = transform(node.body, rewrite)
+        if body is not node.body:
+            node = FunctionDef(node.name, node.params, body, node.pragmas)
+    elif isinstance(node, LambdaExpr):
+        body = transform(node.body, rewrite)
+        if body is not node.body:
+            node = LambdaExpr(node.params, body)
+    elif isinstance(node, BinOp):
+        left = transform(node.left, rewrite)
+        right = transform(node.right, rewrite)
+        if left is not node.left or right is not node.right:
+            node = BinOp(left, node.op, right)
+    elif isinstance(node, UnaryOp):
+        expr = transform(node.expr, rewrite)
+        if expr is not node.expr:
+            node = UnaryOp(node.op, expr)
+    elif isinstance(node, Conditional):
+        condition = transform(node.condition, rewrite)
+        true_expr = transform(node.true_expr, rewrite)
+        false_expr = transform(node.false_expr, rewrite)
+        if (condition is not node.condition or true_expr is not node.true_expr
+                or false_expr is not node.false_expr):
+            node = Conditional(condition, true_expr, false_expr)
+    elif isinstance(node, Call):
+        func = transform(node.func, rewrite) if isinstance(node.func, LambdaExpr) else node.func
+        args = [transform(arg, rewrite) for arg in node.args]
+        if func is not node.func or any(new is not old for new, old in zip(args, node.args)):
+            node = Call(func, args)
+    return rewrite(node)
+
+
+def is_literal(node):
+    return isinstance(node, (Number, Boolean))
+
+
+def literal(value):
+    # Wrap a Python value produced by folding back into a literal node
+    if isinstance(value, bool):
+        return Boolean(value)
+    return Number(value)
+
+
+def is_integer_expr(node):
+    # True when node can only evaluate to an integer (or fail): arithmetic never yields a boolean or closure
+    if isinstance(node, Number):
+        return True
+    if isinstance(node, BinOp):
+        return node.op in ARITHMETIC_OPS
+    if isinstance(node, UnaryOp):
+        return node.op == '-'
+    return False
+
+
+def is_boolean_expr(node):
+    # True when node can only evaluate to a boolean (or fail)
+    if isinstance(node, Boolean):
+        return True
+    if isinstance(node, BinOp):
+        return node.op in COMPARISON_OPS
+    if isinstance(node, UnaryOp):
+        return node.op == '!'
+    return False
+
+
+def fold_constants(node):
+    """
+        Evaluate operators whose operands are all literals. Operations that would fail at run time,
+        such as division by zero, are left in place so the error is still reported when reached.
+    """
+    if isinstance(node, BinOp) and is_literal(node.left):
+        if node.op == '&&':
+            return node.left if not node.left.value else node.right
+        if node.op == '||':
+            return node.left if node.left.value else node.right
+        if is_literal(node.right) and node.op in BINARY_OPS:
+            try:
+                return literal(BINARY_OPS[node.op](node.left.value, node.right.value))
+            except Exception:
+                return node
+    elif isinstance(node, UnaryOp) and is_literal(node.expr) and node.op in UNARY_OPS:
+        return literal(UNARY_OPS[node.op](node.expr.value))
+    return node
+
+
+def eliminate_dead_branches(node):
+    """
+        Replace a Conditional whose condition is a literal by the branch that will be taken.
+    """
+    if isinstance(node, Conditional) and is_literal(node.condition):
+        return node.true_expr if node.condition.value else node.false_expr
+    return node
+
+
+def simplify_algebra(node):
+    """
+        Apply identities such as x * 1, x + 0 and !!x. They only fire when x is known to be an integer
+        (or a boolean for !!x), since TRUE * 1 evaluates to 1 and !!5 to TRUE.
+    """
+    if isinstance(node, BinOp):
+        left, op, right = node.left, node.op, node.right
+        if op == '*':
+            if is_one(right) and is_integer_expr(left):
+                return left
+            if is_one(left) and is_integer_expr(right):
+                return right
+        elif op == '+':
+            if is_zero(right) and is_integer_expr(left):
+                return left
+            if is_zero(left) and is_integer_expr(right):
+                return right
+        elif op == '-':
+            if is_zero(right) and is_integer_expr(left):
+                return left
+        elif op == '/':
+            if is_one(right) and is_integer_expr(left):
+                return left
+    elif isinstance(node, UnaryOp) and isinstance(node.expr, UnaryOp) and node.op == node.expr.op:
+        inner = node.expr.expr
+        if node.op == '!' and is_boolean_expr(inner):
+            return inner
+        if node.op == '-' and is_integer_expr(inner):
+            return inner
+    return node
+
+
+def is_zero(node):
+    return type(node) is Number and node.value == 0
+
+
+def is_one(node):
+    return type(node) is Number and node.value == 1
+
+
+# Available passes, in the order the pipeline runs them
+PASSES = {
+    'fold': fold_constants,
+    'dead-branch': eliminate_dead_branches,
+    'algebraic': simplify_algebra,
+}
+
+
+class Optimizer:
+    """
+        Pass manager that rewrites parsed statements before they are executed. Each enabled pass
+        walks the whole tree; the pipeline is repeated until no pass changes anything, since one
+        rewrite (say, folding a condition) can open up another (dropping the dead branch).
+    """
+
+    def __init__(self, disabled=(), max_rounds=8):
+        unknown = set(disabled) - set(PASSES)
+        if unknown:
+            raise ValueError(f"Unknown optimization passes: {', '.join(sorted(unknown))}")
+        self.passes = [(name, rewrite) for name, rewrite in PASSES.items() if name not in disabled]
+        self.max_rounds = max_rounds
+
+    def optimize(self, node):
+        for _ in range(self.max_rounds):
+            previous = node
+            for name, rewrite in self.passes:
+                node = transform(node, rewrite)
+            if node is previous:
+                break
+        return node
@@ -0,0 +1,177 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from AST_Node import FunctionDef, Import, LambdaExpr
+from my_purity import free_names
+
+# Outcomes of a statement, as printed by run_program
+NO_VALUE = 0  # Statement returned None (a definition): only the statement itself is printed
+VALUE = 1  # (VALUE, printed form of the result)
+ERROR = 2  # (ERROR, error message)
+
+# State of a worker process, set up by init_worker
+_worker_interpreter = None
+_worker_loaded = {}  # name -> version of the definition bound in the worker
+
+
+def run_statement(interpreter, node):
+    # Evaluate a top-level statement and return its outcome. Results are returned in printed
+    # form, since that is all run_program needs and closures cannot leave a worker process.
+    try:
+        result = interpreter.evaluate(node)
+    except Exception as e:
+        return ERROR, str(e)
+    if result is None:
+        return NO_VALUE, None
+    return VALUE, str(result)
+
+
+def print_outcome(node, outcome):
+    # Print a statement and its outcome exactly as the serial run_program does
+    print(node)
+    kind, text = outcome
+    if kind == VALUE:
+        print(text)
+        print()
+    elif kind == ERROR:
+        print(f"An error occurred during execution: {text}")
+        print()
+
+
+def init_worker(options):
+    global _worker_interpreter
+    from my_interpreter import Interpreter
+    _worker_interpreter = Interpreter(**options)
+    _worker_loaded.clear()
+
+
+def load_definitions(definitions):
+    """
+        Bring the worker's global scope in line with definitions: (name, version, FunctionDef or
+        None) for every global a job can reach, as bound in the main process when the job was
+        created. Bindings that differ from what the worker already has are replaced.
+    """
+    interpreter = _worker_interpreter
+    for name, version, func in definitions:
+        if _worker_loaded.get(name) == version:
+            continue
+        if func is None:
+            # Not defined yet at this point of the program
+            interpreter.undefine(name)
+        else:
+            interpreter.define_function(func)
+        _worker_loaded[name] = version
+    return interpreter
+
+
+def run_job(node, definitions):
+    # Run one top-level statement in a worker
+    return run_statement(load_definitions(definitions), node)
+
+
+def reachable_definitions(global_scope, names, version):
+    """
+        Return (name, version, binding) for every global name reachable from names, following the
+        bodies of the functions they are bound to. version(name, binding) identifies the binding.
+    """
+    definitions = []
+    seen = set()
+    pending = list(names)
+    while pending:
+        name = pending.pop()
+        if name in seen:
+            continue
+        seen.add(name)
+        func = global_scope.get(name)
+        definitions.append((name, version(name, func), func))
+        if isinstance(func, FunctionDef):
+            pending.extend(free_names(func.body, func.params))
+    return definitions
+
+
+class ParallelRunner:
+    """
+        Run the statements of a program with independent top-level expressions spread over a
+        pool of worker processes. Statements only read the global scope, and definitions are
+        applied in order in the main process, so an expression can run anywhere as long as it
+        sees the definitions that preceded it: each job carries the definitions its statement
+        can reach. Outcomes are printed in source order as they become available, so the
+        output is the same as a serial run. If a worker dies, the statements that were running
+        in the pool fail and the rest of the program runs serially.
+    """
+
+    def __init__(self, interpreter, jobs):
+        self.interpreter = interpreter
+        self.jobs = jobs
+        self.versions = {}  # name -> number of definitions of name seen so far
+        self.broken = False  # Set once a worker has died; later statements run in this process
+
+    def definitions(self, node):
+        # Current binding of every global name node can reach
+        return reachable_definitions(self.interpreter.global_scope, free_names(node, ()),
+                                     lambda name, func: self.versions.get(name, 0))
+
+    def submit(self, pool, node):
+        # Start running node, returning its outcome or a future for it
+        if isinstance(node, FunctionDef):
+            self.versions[node.name] = self.versions.get(node.name, 0) + 1
+            return run_statement(self.interpreter, node)
+        if isinstance(node, Import):
+            outcome = run_statement(self.interpreter, node)
+            if outcome[0] != ERROR:
+                for name in self.interpreter.modules.exports(node):
+                    self.versions[name] = self.versions.get(name, 0) + 1
+            return outcome
+        if self.broken or isinstance(node, LambdaExpr) or not free_names(node, ()):
+            # Nothing worth shipping to another process, or no pool left to ship it to
+            return run_statement(self.interpreter, node)
+        try:
+            # Imported functions are parsed here, so that the job can carry them
+            self.interpreter.modules.resolve(node)
+        except Exception as e:
+            return ERROR, str(e)
+        try:
+            return pool.submit(run_job, node, self.definitions(node))
+        except BrokenProcessPool as e:
+            # This statement fails like those that were in flight when the worker died
+            self.broken = True
+            return ERROR, str(e)
+
+    def flush(self, pending, wait):
+        # Print the outcomes at the front of the queue, stopping at the first unfinished one unless wait is set
+        while pending:
+            node, outcome = pending[0]
+            if not isinstance(outcome, tuple):
+                if not wait and not outcome.done():
+                    return
+                try:
+                    outcome = outcome.result()
+                except BrokenProcessPool as e:
+                    self.broken = True
+                    outcome = (ERROR, str(e))
+                except Exception as e:
+                    outcome = (ERROR, str(e))
+            pending.popleft()
+            print_outcome(node, outcome)
+
+    def run(self, statements):
+        pending = deque()  # (node, outcome or future), in source order
+        with ProcessPoolExecutor(max_workers=self.jobs, initializer=init_worker,
+                                 initargs=(self.interpreter.options,)) as pool:
+            while True:
+                try:
+                    node = next(statements)
+                except StopIteration:
+                    break
+                except (OSError, UnicodeError) as e:
+                    self.flush(pending, wait=True)
+                    print(f"An error occurred while reading the file: {e}")
+                    return
+                except Exception as e:
+                    self.flush(pending, wait=True)
+                    print(f"An error occurred while parsing the code: {e}")
+                    return
+                pending.append((node, self.submit(pool, node)))
+                self.flush(pending, wait=False)
+            self.flush(pending, wait=True)
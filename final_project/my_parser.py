@@ -1,12 +1,47 @@
-from AST_Node import ASTNode, FunctionDef, LambdaExpr, BinOp, UnaryOp, Variable, Number, Boolean, Call, Conditional
+from AST_Node import LambdaExpr, NodeFactory
 
 
 class Parser:
-    def __init__(self, tokens):
-        self.tokens = tokens
-        self.pos = 0  # Position of the current token in the tokens list
-        self.current_token = self.tokens[self.pos] if tokens else None
+    def __init__(self, tokens, nodes=None):
+        # Nodes are built through a hash-consing factory, so identical subtrees are shared
+        self.nodes = nodes if nodes is not None else NodeFactory()
+        # Tokens are pulled lazily from any iterable, keeping at most one token of lookahead
+        self.tokens = iter(tokens)
+        self.lookahead = None  # (token, pragmas) read ahead by peek()
         self.current_lambda_expr = None  # Track current lambda expression for calls
+        self.current_token, self.current_pragmas = self.next_token()
+
+    def next_token(self):
+        """
+            Return the next grammar token, with the pragma comments that came right before it.
+            Pragma comments are not part of the grammar, so they never become the current token.
+        """
+        if self.lookahead is not None:
+            token, self.lookahead = self.lookahead, None
+            return token
+        pragmas = ()
+        for token in self.tokens:
+            if token[0] == 'PRAGMA':
+                pragmas += (token[1],)
+            else:
+                return token, pragmas
+        return (None, None), pragmas  # End of token stream
+
+    def peek(self):
+        """
+            Return the token after the current one without consuming it.
+        """
+        if self.lookahead is None:
+            self.lookahead = self.next_token()
+        return self.lookahead[0]
+
+    def location(self):
+        """
+            Describe where the current token is in the source, for error messages.
+        """
+        if len(self.current_token) > 2:
+            return f" at line {self.current_token.line}, column {self.current_token.column}"
+        return " at end of input"
 
     def eat(self, token_type):
         """
@@ -16,24 +51,24 @@ class Parser:
         # print(f"Trying to eat {token_type}, current token: {self.current_token}")  # Debug
         if self.current_token and self.current_token[0] == token_type:
             # print(f"Token {self.current_token} matched {token_type}, advancing...")  # Debug
-            self.pos += 1
-            if self.pos < len(self.tokens):
-                self.current_token = self.tokens[self.pos]
-            else:
-                self.current_token = (None, None)  # End of token stream
+            self.current_token, self.current_pragmas = self.next_token()
         else:
-            raise Exception(f"Expected token {token_type} but got {self.current_token}")
+            raise Exception(f"Expected token {token_type} but got {self.current_token}{self.location()}")
 
     def parse(self):
         """
             Parse the entire token stream by repeatedly parsing statements until no tokens remain.
         """
-        statements = []
+        return list(self.iter_statements())
+
+    def iter_statements(self):
+        """
+            Yield top-level statements one at a time, reading only the tokens each one needs.
+        """
         while self.current_token[0] is not None:  # Continue until no more tokens
             statement = self.parse_statement()
             if statement is not None:
-                statements.append(statement)  # Add valid parsed statements to the list
-        return statements
+                yield statement
 
     def parse_statement(self):
         """
@@ -42,6 +77,8 @@ class Parser:
         # print(f"Parsing statement with token: {self.current_token}")  # Debug
         if self.current_token[0] == 'DEFUN':
             return self.parse_function_def()
+        elif self.current_token[0] == 'IMPORT':
+            return self.parse_import()
         elif self.current_token[0] == 'LAMBDA':
             return self.parse_lambda_expr()
         else:
@@ -53,6 +90,7 @@ class Parser:
             Defun { name : identifier, arguments : (params) } body
         """
         # print("Parsing function definition")  # Debug
+        pragmas = self.current_pragmas  # Pragmas written just before the Defun
         self.eat('DEFUN')
         self.eat('LBRACE')
         self.eat('IDENTIFIER')  # Keyword 'name'
@@ -64,7 +102,29 @@ class Parser:
         params = self.parse_params()  # Parse function parameters
         self.eat('RBRACE')
         body = self.parse_expression()  # Parse the function body (expression)
-        return FunctionDef(func_name, params, body)  # Return the function definition AST node
+        return self.nodes.function_def(func_name, params, body, pragmas)  # Return the function definition AST node
+
+    def parse_import(self):
+        """
+            Parse an import of the form:
+            Import { module : identifier } or Import { module : identifier, names : (names) }
+        """
+        self.eat('IMPORT')
+        self.eat('LBRACE')
+        self.eat('IDENTIFIER')  # Keyword 'module'
+        self.eat('COLON')
+        module = self.parse_identifier()
+        names = None
+        if self.current_token[0] == 'COMMA':
+            self.eat('COMMA')
+            if self.current_token[0] == 'IDENTIFIER':
+                self.eat('IDENTIFIER')  # Keyword 'names'
+                self.eat('COLON')
+                names = self.parse_params()
+                if self.current_token[0] == 'COMMA':
+                    self.eat('COMMA')
+        self.eat('RBRACE')
+        return self.nodes.import_statement(module, names)
 
     def parse_lambda_expr(self):
         """
@@ -82,7 +142,7 @@ class Parser:
                 self.eat('COMMA')
         self.eat('DOT')
         body = self.parse_expression()
-        lambda_expr = LambdaExpr(params, body)
+        lambda_expr = self.nodes.lambda_expr(params, body)
         # print(f"Constructed lambda expression: {lambda_expr}")  # Debug
 
         # Check if the lambda expression is immediately followed by a call (lambda call)
@@ -101,7 +161,7 @@ class Parser:
         args = self.parse_args()  # Parse the arguments of the lambda call
         self.eat('RPAREN')
         # print(f"Lambda call with args: {args}")  # Debug
-        return Call(lambda_expr, args)  # Return a call node with the lambda expression and its arguments
+        return self.nodes.call(lambda_expr, args)  # Return a call node with the lambda expression and its arguments
 
     def parse_params(self):
         """
@@ -133,7 +193,7 @@ class Parser:
                 # print("End of argument list found")  # Debug
                 break
             else:
-                raise Exception(f"Unexpected token in argument list: {self.current_token}")
+                raise Exception(f"Unexpected token in argument list: {self.current_token}{self.location()}")
         return args
 
     def parse_expression(self):
@@ -153,7 +213,7 @@ class Parser:
         true_branch = self.parse_expression()  # Parse the true branch
         self.eat('COLON')  # Expect the ':' token
         false_branch = self.parse_expression()  # Parse the false branch
-        return Conditional(condition, true_branch, false_branch)
+        return self.nodes.conditional(condition, true_branch, false_branch)
 
     def parse_comparison_expr(self):
         """
@@ -164,7 +224,7 @@ class Parser:
             op = self.current_token[1]
             self.eat('COMP_OP')
             right = self.parse_boolean_expr()
-            left = BinOp(left, op, right)
+            left = self.nodes.binop(left, op, right)
         return left
 
     def parse_boolean_expr(self):
@@ -176,7 +236,7 @@ class Parser:
             op = self.current_token[1]
             self.eat('BOOL_OP')
             right = self.parse_arithmetic_expr()
-            left = BinOp(left, op, right)
+            left = self.nodes.binop(left, op, right)
         return left
 
     def parse_arithmetic_expr(self):
@@ -193,7 +253,7 @@ class Parser:
                 op = self.current_token[1]
                 self.eat('ARITH_OP')
                 right = parse_factor()
-                left = BinOp(left, op, right)
+                left = self.nodes.binop(left, op, right)
             return left
 
         left = parse_term()  # Parse a full term (with *, /, %)
@@ -201,7 +261,7 @@ class Parser:
             op = self.current_token[1]
             self.eat('ARITH_OP')
             right = parse_term()
-            left = BinOp(left, op, right)
+            left = self.nodes.binop(left, op, right)
         return left
 
     def parse_term(self):
@@ -210,22 +270,22 @@ class Parser:
         """
         if self.current_token[0] == 'NOT':
             self.eat('NOT')
-            return UnaryOp('!', self.parse_term())  # Parse a unary NOT operation
+            return self.nodes.unary_op('!', self.parse_term())  # Parse a unary NOT operation
         elif self.current_token[0] == 'ARITH_OP' and self.current_token[1] == '-':
             self.eat('ARITH_OP')
-            return UnaryOp('-', self.parse_term())  # Parse a unary minus operation
+            return self.nodes.unary_op('-', self.parse_term())  # Parse a unary minus operation
         elif self.current_token[0] == 'IDENTIFIER':
             # Check if it's a function call
-            if (self.pos + 1 < len(self.tokens) and self.tokens[self.pos + 1][0] == 'LPAREN'):
+            if self.peek()[0] == 'LPAREN':
                 return self.parse_function_call()  # Parse a function call
-            identifier = Variable(self.parse_identifier())  # Parse an identifier
+            identifier = self.nodes.variable(self.parse_identifier())  # Parse an identifier
             return identifier
         elif self.current_token[0] == 'INTEGER':
-            number = Number(self.current_token[1])  # Parse an integer literal
+            number = self.nodes.number(self.current_token[1])  # Parse an integer literal
             self.eat('INTEGER')
             return number
         elif self.current_token[0] == 'BOOLEAN':
-            boolean = Boolean(self.current_token[1])  # Parse a boolean literal
+            boolean = self.nodes.boolean(self.current_token[1])  # Parse a boolean literal
             self.eat('BOOLEAN')
             return boolean
         elif self.current_token[0] == 'LPAREN':
@@ -244,7 +304,7 @@ class Parser:
                 return self.parse_lambda_call(lambda_expr)
             return lambda_expr
         else:
-            raise Exception(f"Unexpected token: {self.current_token}")
+            raise Exception(f"Unexpected token: {self.current_token}{self.location()}")
 
     def parse_function_call(self):
         """
@@ -257,7 +317,7 @@ class Parser:
         args = self.parse_args()
         self.eat('RPAREN')
         # print(f"Function call '{func_name}' with args: {args}")  # Debug
-        return Call(func_name, args)
+        return self.nodes.call(func_name, args)
 
     def parse_identifier(self):
         """
@@ -267,4 +327,4 @@ class Parser:
             identifier = self.current_token[1]
             self.eat('IDENTIFIER')
             return identifier
-        raise Exception(f"Expected IDENTIFIER but got {self.current_token}")
+        raise Exception(f"Expected IDENTIFIER but got {self.current_token}{self.location()}")
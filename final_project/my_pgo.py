@@ -0,0 +1,386 @@
+import hashlib
+import json
+import os
+import tempfile
+
+from AST_Node import FunctionDef, LambdaExpr, BinOp, UnaryOp, Call, Conditional
+from my_memo import memo_key
+from my_runtime import Closure, Builtin
+
+# Engines whose function bodies are built by the Compiler, where the recorder instruments them
+PGO_ENGINES = ('compiled',)
+PROFILE_VERSION = 1
+PROFILE_SUFFIX = '.pgo.json'  # Sidecar profile of a program: prog.lambda -> prog.lambda.pgo.json
+
+DISTINCT_LIMIT = 1 << 16  # Distinct argument tuples counted per function, and the largest cache a profile can ask for
+COLD_FRACTION = 0.01  # A branch taken at most this fraction of the time is cold
+
+# Names of argument types in profiles; other values are named after their Python class
+TYPE_NAMES = {int: 'int', bool: 'bool', float: 'float', Closure: 'function', FunctionDef: 'function',
+              Builtin: 'function'}
+
+
+def sidecar_path(program):
+    return program + PROFILE_SUFFIX
+
+
+def fingerprint(func):
+    # Identifies a definition across runs, so counts recorded for another body of the same name are not used
+    return hashlib.sha256(repr(func).encode()).hexdigest()[:16]
+
+
+def type_name(value):
+    return TYPE_NAMES.get(type(value)) or type(value).__name__.lower()
+
+
+def site_ids(func):
+    """
+        Number the Conditional and Call nodes of a function body, lambdas included, in the order
+        they first appear. Identical subtrees are one shared node, so they get a single number
+        and share their counts. The numbers depend only on the body, so they are the same in
+        every run of the program.
+    """
+    sites = {}
+    _number_sites(func.body, sites, set())
+    return sites
+
+
+def _number_sites(node, sites, seen):
+    if id(node) in seen:
+        return
+    seen.add(id(node))
+    if isinstance(node, (Conditional, Call)):
+        sites[node] = len(sites)
+    if isinstance(node, BinOp):
+        _number_sites(node.left, sites, seen)
+        _number_sites(node.right, sites, seen)
+    elif isinstance(node, UnaryOp):
+        _number_sites(node.expr, sites, seen)
+    elif isinstance(node, Conditional):
+        _number_sites(node.condition, sites, seen)
+        _number_sites(node.true_expr, sites, seen)
+        _number_sites(node.false_expr, sites, seen)
+    elif isinstance(node, Call):
+        if isinstance(node.func, LambdaExpr):
+            _number_sites(node.func, sites, seen)
+        for arg in node.args:
+            _number_sites(arg, sites, seen)
+    elif isinstance(node, LambdaExpr):
+        _number_sites(node.body, sites, seen)
+
+
+class FunctionProfile:
+    """
+        What the profile knows about one global function: its calls, the number of distinct
+        argument tuples they passed, the [true, false] counts of each Conditional and the
+        [hits, {argument types: hits}] of each Call site, by site number (see site_ids).
+        Counts are totals over runs.
+    """
+    __slots__ = ('name', 'fingerprint', 'runs', 'calls', 'keys', 'distinct', 'branches', 'sites')
+
+    def __init__(self, name, fingerprint):
+        self.name = name
+        self.fingerprint = fingerprint
+        self.runs = 1
+        self.calls = 0
+        self.keys = set()  # Argument tuples seen while recording, up to DISTINCT_LIMIT
+        self.distinct = 0  # Largest number of distinct argument tuples seen in one run
+        self.branches = {}
+        self.sites = {}
+
+    def merge(self, other):
+        # Add the counts of another profile of the same definition (the caller accounts for its runs)
+        self.calls += other.calls
+        self.keys |= other.keys
+        self.distinct = max(self.distinct, other.distinct)
+        for site, (taken, not_taken) in other.branches.items():
+            counts = self.branches.setdefault(site, [0, 0])
+            counts[0] += taken
+            counts[1] += not_taken
+        for site, (hits, types) in other.sites.items():
+            record = self.sites.setdefault(site, [0, {}])
+            record[0] += hits
+            for signature, count in types.items():
+                record[1][signature] = record[1].get(signature, 0) + count
+
+    def to_json(self):
+        return {'fingerprint': self.fingerprint, 'runs': self.runs, 'calls': self.calls,
+                'distinct': max(self.distinct, len(self.keys)),
+                'branches': {str(site): counts for site, counts in sorted(self.branches.items())},
+                'sites': {str(site): {'hits': hits, 'types': types}
+                          for site, (hits, types) in sorted(self.sites.items())}}
+
+    @classmethod
+    def from_json(cls, name, data):
+        profile = cls(name, data['fingerprint'])
+        profile.runs = int(data['runs'])
+        profile.calls = int(data['calls'])
+        profile.distinct = int(data['distinct'])
+        profile.branches = {int(site): [int(taken), int(not_taken)]
+                            for site, (taken, not_taken) in data['branches'].items()}
+        profile.sites = {int(site): [int(record['hits']), {str(k): int(v) for k, v in record['types'].items()}]
+                         for site, record in data['sites'].items()}
+        return profile
+
+
+def load_profile(path):
+    """
+        Return the function profiles stored in path by name, or None when there is no readable
+        profile there.
+    """
+    try:
+        with open(path, 'r') as file:
+            data = json.load(file)
+        if data['version'] != PROFILE_VERSION:
+            return None
+        return {name: FunctionProfile.from_json(name, entry) for name, entry in data['functions'].items()}
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        return None
+
+
+def is_profile_file(path):
+    """
+        Whether path may be written as a profile: it does not exist yet, or it holds a profile
+        (of any version).
+    """
+    if not os.path.exists(path):
+        return True
+    try:
+        with open(path, 'r') as file:
+            data = json.load(file)
+    except (OSError, ValueError):
+        return False
+    return isinstance(data, dict) and 'version' in data and isinstance(data.get('functions'), dict)
+
+
+def save_profile(path, profiles):
+    # Written to a temporary file that is renamed into place, so a concurrent run never reads half a profile
+    data = {'version': PROFILE_VERSION,
+            'functions': {name: profiles[name].to_json() for name in sorted(profiles)}}
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as file:
+            json.dump(data, file, indent=1)
+            file.write("\n")
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+class ProfileRecorder:
+    """
+        Record how the global functions of a program run, for later runs to be tuned to it.
+        install() instruments the bodies of global functions as the compiler builds them: each
+        Conditional counts how often it takes each branch, and each Call site counts its hits
+        and the types of the arguments it passes. Calls of global functions are counted along
+        with their distinct argument tuples. Top-level statements are not recorded, since they
+        are what changes from one input to the next.
+    """
+
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        self.profiles = {}  # FunctionDef -> FunctionProfile
+        self.sites = {}  # FunctionDef -> site numbers of its body
+        self.current = None  # Global function whose body is being compiled
+
+    def install(self):
+        interpreter = self.interpreter
+        if interpreter.engine not in PGO_ENGINES:
+            raise ValueError(f"Profiles can be recorded with the {' and '.join(PGO_ENGINES)} engine")
+        compiler = interpreter.compiler
+        body = compiler.body
+        compile_conditional = compiler.dispatch[Conditional]
+        compile_call = compiler.dispatch[Call]
+        apply_function = interpreter.apply_function
+        fork_join = interpreter.fork_join
+        global_env = interpreter.global_env
+
+        def recording_body(func):
+            outer = self.current
+            self.current = func if type(func) is FunctionDef else None
+            try:
+                return body(func)
+            finally:
+                self.current = outer
+
+        def recording_conditional(node, scopes):
+            if self.current is None:
+                return compile_conditional(node, scopes)
+            condition = compiler.compile(node.condition, scopes)
+            true_expr = compiler.compile(node.true_expr, scopes)
+            false_expr = compiler.compile(node.false_expr, scopes)
+            counts = self.site(node, self.profile(self.current).branches, [0, 0])
+
+            def conditional(env):
+                if condition(env):
+                    counts[0] += 1
+                    return true_expr(env)
+                counts[1] += 1
+                return false_expr(env)
+            return conditional
+
+        def recording_call(node, scopes):
+            # Built like Compiler.compile_call, recording the site on the way, so that recording
+            # does not add a Python frame per call (recursion would hit the limit much sooner)
+            if self.current is None or (fork_join is not None and fork_join.is_fork_site(node)):
+                return compile_call(node, scopes)
+            record = self.site(node, self.profile(self.current).sites, [0, {}])
+            types = record[1]
+            args = [compiler.compile(arg, scopes) for arg in node.args]
+            target = node.func
+            if isinstance(target, LambdaExpr):
+                target = compiler.occurrence(target, scopes)
+                load = None
+            else:
+                # A global function or a parameter
+                load = compiler.compile_load(target, scopes)
+
+            def recorded_call(env):
+                if load is None:
+                    func, func_env = target, env
+                else:
+                    func = load(env)
+                    func_env = global_env
+                interpreter.check_call(func, node)
+                values = [arg(env) for arg in args]
+                record[0] += 1
+                signature = ','.join(map(type_name, values))
+                types[signature] = types.get(signature, 0) + 1
+                return interpreter.apply_function(func, func_env, values)
+            return recorded_call
+
+        def recording_apply_function(func, env, args):
+            if type(func) is FunctionDef:
+                profile = self.profile(func)
+                profile.calls += 1
+                if len(profile.keys) < DISTINCT_LIMIT:
+                    profile.keys.add(memo_key(args))
+            return apply_function(func, env, args)
+
+        compiler.body = recording_body
+        compiler.dispatch[Conditional] = recording_conditional
+        compiler.dispatch[Call] = recording_call
+        interpreter.apply_function = recording_apply_function
+
+    def profile(self, func):
+        profile = self.profiles.get(func)
+        if profile is None:
+            profile = self.profiles[func] = FunctionProfile(func.name, fingerprint(func))
+        return profile
+
+    def site(self, node, records, empty):
+        # The counts of node in the body being compiled, in records (branches or sites)
+        func = self.current
+        numbers = self.sites.get(func)
+        if numbers is None:
+            numbers = self.sites[func] = site_ids(func)
+        return records.setdefault(numbers[node], empty)
+
+    def save(self, path):
+        """
+            Add this run to the profile in path: the counts of a definition that is already there
+            are added to, any other profile of the same name is replaced. When a name was bound
+            to several bodies during the run, the one called most often is kept.
+        """
+        run = {}
+        for profile in self.profiles.values():
+            if not profile.calls:
+                continue
+            kept = run.get(profile.name)
+            if kept is not None and kept.fingerprint == profile.fingerprint:
+                # The same body defined again during the run
+                kept.merge(profile)
+            elif kept is None or profile.calls > kept.calls:
+                run[profile.name] = profile
+        if not is_profile_file(path):
+            raise Exception(f"Error: {path} exists and is not a profile, so it will not be overwritten")
+        profiles = load_profile(path) or {}
+        for name, profile in run.items():
+            profile.distinct = max(profile.distinct, len(profile.keys))
+            previous = profiles.get(name)
+            if previous is not None and previous.fingerprint == profile.fingerprint:
+                previous.merge(profile)
+                previous.runs += profile.runs
+            else:
+                profiles[name] = profile
+        save_profile(path, profiles)
+
+
+class ProfileGuide:
+    """
+        Tune an interpreter to a recorded profile. Only the counts of definitions whose body is
+        unchanged since they were recorded are used:
+        - A memoized function that received more distinct arguments per run than the memo size
+          gets a cache large enough to hold them all (up to DISTINCT_LIMIT), instead of
+          evicting entries it will need again.
+        - A function called at least as often per run as the JIT threshold is translated on its
+          first call rather than after threshold interpreted ones.
+        - A branch that was cold (taken at most COLD_FRACTION of the time) and has no
+          translation is left to the interpreter, so the JIT can still translate the rest of
+          the function instead of giving up on all of it.
+    """
+
+    def __init__(self, profiles):
+        self.profiles = profiles  # name -> FunctionProfile
+        self.matched = {}  # FunctionDef -> its FunctionProfile, or None when the profile does not apply
+
+    def profile(self, func):
+        if type(func) is not FunctionDef:
+            return None
+        if func in self.matched:
+            return self.matched[func]
+        profile = self.profiles.get(func.name)
+        if profile is not None and profile.fingerprint != fingerprint(func):
+            profile = None
+        self.matched[func] = profile
+        return profile
+
+    def install(self, interpreter):
+        memo = interpreter.memo
+        if memo is not None:
+            maxsize = memo.maxsize
+
+            def cache_size(func):
+                profile = self.profile(func)
+                if profile is None:
+                    return maxsize
+                return max(maxsize, min(profile.distinct, DISTINCT_LIMIT))
+            memo.cache_size = cache_size
+        jit = interpreter.jit
+        if jit is not None:
+            define_function = interpreter.define_function
+
+            def guided_define_function(node):
+                define_function(node)
+                profile = self.profile(node)
+                if profile is not None and profile.calls >= jit.threshold * profile.runs:
+                    jit.prime(node)
+            interpreter.define_function = guided_define_function
+            jit.cold_branches = self.cold_branches
+
+    def cold_branches(self, func):
+        """
+            Return the (Conditional, branch) pairs of func's body that the profile saw taken at
+            most COLD_FRACTION of the times the Conditional ran; branch is True for the true branch.
+        """
+        profile = self.profile(func)
+        if profile is None or not profile.branches:
+            return frozenset()
+        cold = set()
+        for node, site in site_ids(func).items():
+            counts = profile.branches.get(site)
+            if counts is None or not isinstance(node, Conditional):
+                continue
+            total = counts[0] + counts[1]
+            if total == 0:
+                continue
+            if counts[0] <= COLD_FRACTION * total:
+                cold.add((node, True))
+            if counts[1] <= COLD_FRACTION * total:
+                cold.add((node, False))
+        return frozenset(cold)
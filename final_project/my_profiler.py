@@ -0,0 +1,129 @@
+import time
+
+from AST_Node import FunctionDef
+from my_memo import memo_key
+from my_pgo import DISTINCT_LIMIT
+from my_runtime import Builtin
+
+# Engines whose calls all go through Interpreter.apply_function (the 'cek' and 'vm' engines call inline)
+PROFILED_ENGINES = ('compiled', 'tree')
+ROOT = 'main'  # Name of the bottom frame in collapsed stacks
+
+
+class FunctionStats:
+    __slots__ = ('name', 'calls', 'self_time', 'total_time', 'active', 'max_depth', 'keys', 'repeats', 'memoized',
+                 'saturated')
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.self_time = 0.0
+        self.total_time = 0.0  # Time inside the outermost active call, so recursion is not counted twice
+        self.active = 0  # Calls currently on the stack
+        self.max_depth = 0
+        self.keys = set()  # Argument tuples seen so far, up to DISTINCT_LIMIT (None for lambdas and builtins)
+        self.repeats = 0  # Calls with arguments that had been seen before
+        self.memoized = False
+        self.saturated = False  # keys hit DISTINCT_LIMIT, so repeats of later arguments are not counted
+
+
+def repeats_column(stats):
+    # Once the key set is full the repeat count is only a lower bound
+    if stats.keys is None:
+        return '-'
+    return f"{stats.repeats}+" if stats.saturated else str(stats.repeats)
+
+
+class Profiler:
+    """
+        Per-function profile of a lambda program. install() replaces apply_function on one
+        interpreter instance with a timing wrapper, so an interpreter that is not profiled runs
+        the unmodified method. Every call records its function, its self time (time not spent in
+        nested calls) and the stack of function names it ran under, for flame graphs.
+    """
+
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        self.functions = {}  # name -> FunctionStats
+        self.stacks = {}  # collapsed stack ("main;f;g") -> self time in seconds
+        self.frames = []  # [stats, collapsed stack, start time, time spent in nested calls]
+        self.clock = time.perf_counter
+
+    def install(self):
+        if self.interpreter.engine not in PROFILED_ENGINES:
+            raise ValueError(f"The profiler supports the {' and '.join(PROFILED_ENGINES)} engines")
+        apply_function = self.interpreter.apply_function
+        memo = self.interpreter.memo
+        functions = self.functions
+        stacks = self.stacks
+        frames = self.frames
+        clock = self.clock
+
+        def profiled_apply_function(func, env, args):
+            name = func.name if isinstance(func, (FunctionDef, Builtin)) else '<lambda>'
+            stats = functions.get(name)
+            if stats is None:
+                stats = functions[name] = FunctionStats(name)
+                if not isinstance(func, FunctionDef):
+                    stats.keys = None
+            stats.calls += 1
+            if stats.keys is not None:
+                key = memo_key(args)
+                if key in stats.keys:
+                    stats.repeats += 1
+                elif len(stats.keys) < DISTINCT_LIMIT:
+                    stats.keys.add(key)
+                else:
+                    stats.saturated = True
+            if memo is not None and not stats.memoized:
+                stats.memoized = memo.cache_for(func) is not None
+            stats.active += 1
+            if stats.active > stats.max_depth:
+                stats.max_depth = stats.active
+            stack = (frames[-1][1] if frames else ROOT) + ';' + name
+            frame = [stats, stack, clock(), 0.0]
+            frames.append(frame)
+            try:
+                return apply_function(func, env, args)
+            finally:
+                elapsed = clock() - frame[2]
+                frames.pop()
+                stats.active -= 1
+                own = elapsed - frame[3]
+                stats.self_time += own
+                if stats.active == 0:
+                    stats.total_time += elapsed
+                stacks[stack] = stacks.get(stack, 0.0) + own
+                if frames:
+                    frames[-1][3] += elapsed
+
+        self.interpreter.apply_function = profiled_apply_function
+
+    def uninstall(self):
+        # Remove the instance attribute, exposing the class method again
+        self.interpreter.__dict__.pop('apply_function', None)
+
+    def report(self):
+        """
+            Return the table of per-function statistics, slowest total time first.
+        """
+        lines = [f"{'function':<20} {'calls':>9} {'self ms':>10} {'total ms':>10} {'depth':>7} "
+                 f"{'repeats':>9}  memoized"]
+        for stats in sorted(self.functions.values(), key=lambda s: s.total_time, reverse=True):
+            lines.append(f"{stats.name:<20} {stats.calls:>9} {stats.self_time * 1000:>10.3f} "
+                         f"{stats.total_time * 1000:>10.3f} {stats.max_depth:>7} "
+                         f"{repeats_column(stats):>9}  "
+                         f"{'yes' if stats.memoized else 'no'}")
+        # Functions that keep being called with the same arguments but are not cached
+        candidates = [s for s in self.functions.values() if s.repeats and not s.memoized]
+        for stats in sorted(candidates, key=lambda s: s.repeats, reverse=True):
+            lines.append(f"Cache opportunity: {stats.name} was called {repeats_column(stats)} times "
+                         f"with arguments it had already received")
+        return "\n".join(lines)
+
+    def collapsed_stacks(self):
+        """
+            Return the profile in the collapsed-stack format read by flamegraph.pl and speedscope:
+            one "main;caller;callee microseconds" line per distinct stack.
+        """
+        return "\n".join(f"{stack} {round(seconds * 1e6)}" for stack, seconds in sorted(self.stacks.items()))
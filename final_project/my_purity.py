@@ -0,0 +1,98 @@
+from AST_Node import FunctionDef, LambdaExpr, BinOp, UnaryOp, Variable, Call, Conditional
+
+
+def free_names(node, bound):
+    """
+        Collect the names a node refers to (as variables or callees) that are not in bound.
+    """
+    names = set()
+    _collect_free_names(node, frozenset(bound), names)
+    return names
+
+
+def _collect_free_names(node, bound, names):
+    if isinstance(node, Variable):
+        if node.name not in bound:
+            names.add(node.name)
+    elif isinstance(node, BinOp):
+        _collect_free_names(node.left, bound, names)
+        _collect_free_names(node.right, bound, names)
+    elif isinstance(node, UnaryOp):
+        _collect_free_names(node.expr, bound, names)
+    elif isinstance(node, Conditional):
+        _collect_free_names(node.condition, bound, names)
+        _collect_free_names(node.true_expr, bound, names)
+        _collect_free_names(node.false_expr, bound, names)
+    elif isinstance(node, Call):
+        if isinstance(node.func, LambdaExpr):
+            _collect_free_names(node.func, bound, names)
+        elif node.func not in bound:
+            names.add(node.func)
+        for arg in node.args:
+            _collect_free_names(arg, bound, names)
+    elif isinstance(node, LambdaExpr):
+        # Not bound by the lambda's parameters: a parameter the call does not pass refers to the
+        # enclosing binding of its name
+        _collect_free_names(node.body, bound, names)
+
+
+def contains_lambda(node):
+    """
+        Report whether a closure can be created anywhere inside node.
+    """
+    if isinstance(node, LambdaExpr):
+        return True
+    elif isinstance(node, BinOp):
+        return contains_lambda(node.left) or contains_lambda(node.right)
+    elif isinstance(node, UnaryOp):
+        return contains_lambda(node.expr)
+    elif isinstance(node, Conditional):
+        return (contains_lambda(node.condition) or contains_lambda(node.true_expr)
+                or contains_lambda(node.false_expr))
+    elif isinstance(node, Call):
+        return isinstance(node.func, LambdaExpr) or any(contains_lambda(arg) for arg in node.args)
+    return False
+
+
+class PurityAnalyzer:
+    """
+        Decide which global functions are pure: their result depends only on their arguments.
+        A FunctionDef is pure when its body creates no closures and every name it uses besides its
+        parameters is a global function that is itself pure. Recursive and mutually recursive
+        references are assumed pure while they are being analyzed.
+    """
+
+    def __init__(self, global_scope):
+        self.global_scope = global_scope
+        self.verdicts = {}  # FunctionDef -> bool
+
+    def is_pure(self, func):
+        if not isinstance(func, FunctionDef):
+            return False
+        if func not in self.verdicts:
+            self.analyze(func, set())
+        return self.verdicts[func]
+
+    def analyze(self, func, in_progress):
+        if func in self.verdicts:
+            return self.verdicts[func]
+        if func in in_progress:
+            return True
+        in_progress.add(func)
+        pure = not contains_lambda(func.body)
+        if pure:
+            for name in free_names(func.body, func.params):
+                callee = self.global_scope.get(name)
+                if not isinstance(callee, FunctionDef) or not self.analyze(callee, in_progress):
+                    pure = False
+                    break
+        in_progress.discard(func)
+        # Verdicts reached while a caller was still in progress may rest on that caller's assumption
+        if pure and in_progress:
+            return True
+        self.verdicts[func] = pure
+        return pure
+
+    def invalidate(self):
+        # Forget every verdict; called whenever a global name is bound
+        self.verdicts.clear()
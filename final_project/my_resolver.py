@@ -0,0 +1,85 @@
+from AST_Node import FunctionDef, LambdaExpr, BinOp, UnaryOp, Variable, Call, Conditional
+
+
+def resolve(name, scopes):
+    """
+        Find name among the parameter lists of the enclosing functions, innermost last in scopes.
+        Returns (depth, slot): the frame depth levels out and the parameter's index in it, or None
+        for a global name.
+    """
+    for depth, params in enumerate(reversed(scopes)):
+        if name in params:
+            return depth, params.index(name)
+    return None
+
+
+class Resolver:
+    """
+        Static check of statements before they run. A top-level expression is checked against the
+        functions defined so far: a call to an unknown name, or with the wrong number of arguments,
+        fails if it is reached. Function bodies may call functions defined later, so their unknown
+        names are only reported by finish(), once the whole program has been seen. Everything is
+        reported as a warning, since the offending code may sit in a branch that is never taken.
+    """
+
+    def __init__(self, global_scope):
+        self.global_scope = global_scope
+        self.pending = []  # (function name, name used in its body), checked by finish()
+
+    def check(self, node):
+        """
+            Return the problems found in a top-level statement, as messages.
+        """
+        messages = []
+        if isinstance(node, FunctionDef):
+            self.visit(node.body, [node.params], messages, node.name)
+        else:
+            self.visit(node, [], messages, None)
+        return messages
+
+    def finish(self):
+        """
+            Return the names used in function bodies that no definition has supplied.
+        """
+        messages = [f"{function} uses undefined name {name}" for function, name in self.pending
+                    if name not in self.global_scope]
+        self.pending = []
+        return messages
+
+    def visit(self, node, scopes, messages, function):
+        # function is the name of the Defun whose body is being checked, or None at top level
+        if isinstance(node, Variable):
+            self.check_global(node.name, scopes, messages, function)
+        elif isinstance(node, BinOp):
+            self.visit(node.left, scopes, messages, function)
+            self.visit(node.right, scopes, messages, function)
+        elif isinstance(node, UnaryOp):
+            self.visit(node.expr, scopes, messages, function)
+        elif isinstance(node, Conditional):
+            self.visit(node.condition, scopes, messages, function)
+            self.visit(node.true_expr, scopes, messages, function)
+            self.visit(node.false_expr, scopes, messages, function)
+        elif isinstance(node, LambdaExpr):
+            self.visit(node.body, scopes + [node.params], messages, function)
+        elif isinstance(node, Call):
+            if isinstance(node.func, LambdaExpr):
+                self.visit(node.func, scopes, messages, function)
+            elif self.check_global(node.func, scopes, messages, function):
+                callee = self.global_scope[node.func]
+                if isinstance(callee, FunctionDef) and len(callee.params) != len(node.args):
+                    messages.append(f"{callee.name} expects {len(callee.params)} arguments "
+                                    f"but is called with {len(node.args)}")
+            for arg in node.args:
+                self.visit(arg, scopes, messages, function)
+
+    def check_global(self, name, scopes, messages, function):
+        # Report name if it is neither a parameter nor defined; True when it refers to a current global
+        if resolve(name, scopes) is not None:
+            return False
+        if name in self.global_scope:
+            return True
+        if function is None:
+            messages.append(f"Undefined variable: {name}")
+        else:
+            self.pending.append((function, name))
+        return False
@@ -0,0 +1,90 @@
+import operator
+
+
+class EvaluationDepthError(Exception):
+    # Raised when evaluation nests deeper than the configured limit
+    pass
+
+
+class Environment:
+    """
+        A lexical scope frame. Each frame holds only the names bound at its own level and links to
+        the frame it was created in, so calls and closures never copy the enclosing scopes.
+    """
+    __slots__ = ('vars', 'parent')
+
+    def __init__(self, vars=None, parent=None):
+        self.vars = {} if vars is None else vars
+        self.parent = parent
+
+    def lookup(self, name):
+        env = self
+        while env is not None:
+            vars = env.vars
+            if name in vars:
+                return vars[name]
+            env = env.parent
+        raise Exception(f"Undefined variable: {name}")
+
+
+# Value of a parameter slot that a call did not supply, or of a global cell whose name is not defined
+UNBOUND = object()
+
+
+class Cell:
+    # The current binding of a global name; code that holds the cell sees every redefinition
+    __slots__ = ('value',)
+
+    def __init__(self, value=UNBOUND):
+        self.value = value
+
+
+class Closure:
+    def __init__(self, func, env):
+        self.func = func
+        self.env = env
+
+
+class Builtin:
+    """
+        A global function implemented in Python. function(interpreter, args) receives the evaluated
+        arguments; calls are checked against min_args and max_args like calls to a FunctionDef.
+    """
+    __slots__ = ('name', 'function', 'min_args', 'max_args')
+
+    def __init__(self, name, function, min_args, max_args=None):
+        self.name = name
+        self.function = function
+        self.min_args = min_args
+        self.max_args = min_args if max_args is None else max_args
+
+    def __repr__(self):
+        return f"<builtin {self.name}>"
+
+
+def divide(left, right):
+    # Integer division that reports division by zero in the language's own words
+    if right == 0:
+        raise ZeroDivisionError("Error: Division by zero")
+    return left // right
+
+
+# Strict binary operators (&& and || short-circuit, so they are handled by the evaluators)
+BINARY_OPS = {
+    '+': operator.add,
+    '-': operator.sub,
+    '*': operator.mul,
+    '/': divide,
+    '%': operator.mod,
+    '==': operator.eq,
+    '!=': operator.ne,
+    '>': operator.gt,
+    '<': operator.lt,
+    '>=': operator.ge,
+    '<=': operator.le,
+}
+
+UNARY_OPS = {
+    '!': operator.not_,
+    '-': operator.neg,
+}
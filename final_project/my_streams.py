@@ -0,0 +1,204 @@
+from AST_Node import FunctionDef
+from my_runtime import Closure, Builtin, Environment
+
+# Stage kinds of a stream pipeline
+MAP = 'map'
+FILTER = 'filter'
+TAKE = 'take'
+
+PRINT_LIMIT = 20  # Elements shown when a stream is printed
+
+# Generated pipeline functions, keyed by (stage kinds, reduce?)
+_pipelines = {}
+
+
+class Stream:
+    """
+        A lazy sequence: a range of integers followed by map, filter and take stages. Adding a
+        stage returns a new Stream that shares the source, so streams are immutable values and
+        can be consumed any number of times. Nothing is evaluated until the stream is consumed
+        by reduce or printed, and the elements are never stored, so memory use does not depend
+        on the length of the range.
+
+        All the stages of a stream are fused into one Python loop over the source (see
+        pipeline), instead of one generator per stage, and reduce folds inside that loop.
+    """
+    __slots__ = ('source', 'kinds', 'stages')
+
+    def __init__(self, source, kinds=(), stages=()):
+        self.source = source  # range object
+        self.kinds = kinds  # Kind of each stage
+        self.stages = stages  # Callable (map, filter) or count (take) of each stage
+
+    def extend(self, kind, stage):
+        return Stream(self.source, self.kinds + (kind,), self.stages + (stage,))
+
+    def __iter__(self):
+        return pipeline(self.kinds, False)(self.source, *self.stages)
+
+    def __str__(self):
+        elements = []
+        for value in self:
+            if len(elements) == PRINT_LIMIT:
+                elements.append('...')
+                break
+            elements.append(str(value))
+        return f"[{', '.join(elements)}]"
+
+
+def pipeline(kinds, reduce):
+    """
+        Return the Python function that runs a pipeline with the given stage kinds. Without
+        reduce it is a generator over the elements: pipeline(source, *stages). With reduce it
+        folds them: pipeline(source, *stages, function, initial, empty) returns the result.
+        The function is generated once per shape and cached.
+    """
+    key = (kinds, reduce)
+    function = _pipelines.get(key)
+    if function is None:
+        function = _pipelines[key] = build_pipeline(kinds, reduce)
+    return function
+
+
+def build_pipeline(kinds, reduce):
+    params = [f"s{i}" for i in range(len(kinds))]
+    if reduce:
+        params += ['function', 'acc', 'empty']
+    lines = [f"def run(source, {', '.join(params)}):"]
+    takes = []  # Counters of the take stages seen so far
+    body = []
+    for i, kind in enumerate(kinds):
+        if kind == MAP:
+            body.append(f"v = s{i}(v)")
+        elif kind == FILTER:
+            body.append(f"if not s{i}(v):")
+            if takes:
+                # An earlier take stage may have let its last element through
+                body.append(f"    if {' or '.join(f't{j} >= s{j}' for j in takes)}:")
+                body.append("        break")
+            body.append("    continue")
+        elif kind == TAKE:
+            # Consume nothing at all when a stage takes no elements
+            lines.append(f"    if s{i} <= 0:")
+            lines.append("        source = ()")
+            lines.append(f"    t{i} = 0")
+            body.append(f"t{i} += 1")
+            takes.append(i)
+    if reduce:
+        body += ["if empty:", "    acc = v", "    empty = False", "else:", "    acc = function(acc, v)"]
+    else:
+        body.append("yield v")
+    if takes:
+        # Stop as soon as a take stage has passed its last element, before computing another one
+        body.append(f"if {' or '.join(f't{j} >= s{j}' for j in takes)}:")
+        body.append("    break")
+    lines.append("    for v in source:")
+    lines += ["        " + line for line in body]
+    if reduce:
+        lines += ["    if empty:",
+                  "        raise Exception('Error: reduce of an empty stream with no initial value')",
+                  "    return acc"]
+    namespace = {}
+    exec("\n".join(lines) + "\n", namespace)
+    return namespace['run']
+
+
+def is_function(value):
+    return isinstance(value, (Closure, FunctionDef, Builtin))
+
+
+def caller(interpreter, value, nargs):
+    """
+        Return a Python callable that applies the function value to nargs arguments.
+    """
+    if interpreter.governor is None and isinstance(value, Closure) and len(value.func.params) == nargs:
+        # Run the lambda body directly in a new frame, skipping the generic call path.
+        # Lambdas are never memoized, so only the governor's accounting would be skipped.
+        env = value.env
+        if interpreter.engine == 'compiled':
+            body = interpreter.compiler.body(value.func)
+            if nargs == 1:
+                return lambda x: body([x, env])
+            return lambda x, y: body([x, y, env])
+        if interpreter.engine == 'vm':
+            run = interpreter.vm.run
+            code = value.code
+            if nargs == 1:
+                return lambda x: run(code, [x, env])
+            return lambda x, y: run(code, [x, y, env])
+        if interpreter.engine == 'tree':
+            execute = interpreter.execute
+            body = value.func.body
+            params = value.func.params
+            if nargs == 1:
+                return lambda x: execute(body, Environment({params[0]: x}, env))
+            return lambda x, y: execute(body, Environment({params[0]: x, params[1]: y}, env))
+    call_value = interpreter.call_value
+    return lambda *args: call_value(value, list(args))
+
+
+def check_int(name, value):
+    if type(value) is not int:
+        raise Exception(f"Error: {name} expects integers but got {value}")
+
+
+def check_function(interpreter, name, value, nargs):
+    # The function must be callable with the nargs arguments the stage passes it, before any element runs
+    if not is_function(value):
+        raise Exception(f"Error: {name} expects a function but got {value}")
+    interpreter.check_arity(value, nargs)
+
+
+def check_stream(name, value):
+    if not isinstance(value, Stream):
+        raise Exception(f"Error: {name} expects a stream but got {value}")
+
+
+def builtin_range(interpreter, args):
+    # range(stop), range(start, stop) or range(start, stop, step), as in Python
+    for arg in args:
+        check_int('range', arg)
+    if len(args) == 3 and args[2] == 0:
+        raise Exception("Error: range step must not be zero")
+    return Stream(range(*args))
+
+
+def builtin_map(interpreter, args):
+    function, stream = args
+    check_function(interpreter, 'map', function, 1)
+    check_stream('map', stream)
+    return stream.extend(MAP, caller(interpreter, function, 1))
+
+
+def builtin_filter(interpreter, args):
+    function, stream = args
+    check_function(interpreter, 'filter', function, 1)
+    check_stream('filter', stream)
+    return stream.extend(FILTER, caller(interpreter, function, 1))
+
+
+def builtin_take(interpreter, args):
+    count, stream = args
+    check_int('take', count)
+    check_stream('take', stream)
+    return stream.extend(TAKE, count)
+
+
+def builtin_reduce(interpreter, args):
+    # reduce(function, stream) or reduce(function, stream, initial), as functools.reduce
+    function, stream = args[0], args[1]
+    check_function(interpreter, 'reduce', function, 2)
+    check_stream('reduce', stream)
+    run = pipeline(stream.kinds, True)
+    if len(args) == 3:
+        return run(stream.source, *stream.stages, caller(interpreter, function, 2), args[2], False)
+    return run(stream.source, *stream.stages, caller(interpreter, function, 2), None, True)
+
+
+BUILTINS = (
+    Builtin('range', builtin_range, 1, 3),
+    Builtin('map', builtin_map, 2),
+    Builtin('filter', builtin_filter, 2),
+    Builtin('take', builtin_take, 2),
+    Builtin('reduce', builtin_reduce, 2, 3),
+)
@@ -0,0 +1,223 @@
+from AST_Node import FunctionDef, BinOp, UnaryOp, Variable, Number, Boolean, Call, Conditional
+
+try:
+    import numpy
+except ImportError:  # Batch calls still work, one element at a time
+    numpy = None
+
+INT64_MIN = -2 ** 63
+INT64_MAX = 2 ** 63 - 1
+# Products whose magnitude may exceed this (judged in floating point) are redone exactly
+MUL_LIMIT = 2.0 ** 62
+
+COMPARISONS = {'==': 'equal', '!=': 'not_equal', '>': 'greater', '<': 'less',
+               '>=': 'greater_equal', '<=': 'less_equal'}
+
+
+class NotVectorizable(Exception):
+    # The body uses something that has no array translation; the whole batch runs element by element
+    pass
+
+
+class Batch:
+    """
+        State of one vectorized evaluation. invalid marks the lanes whose array result cannot be
+        trusted (an int64 overflow, or a division or modulo by zero that must raise); those lanes
+        are evaluated again on the scalar path, which gives exact big-integer results or raises
+        the same error a scalar call would.
+    """
+
+    def __init__(self, size):
+        self.invalid = numpy.zeros(size, dtype=bool)
+
+
+class Vectorizer:
+    """
+        Evaluate a global function elementwise over arrays of arguments. With NumPy, the body is
+        evaluated once over whole arrays: arithmetic and comparisons become array operations,
+        Conditionals and the short-circuit operators become masked selections, and calls to other
+        non-recursive global functions are inlined. Each subexpression only runs on the lanes that
+        reach it, so a division guarded by a Conditional raises only when a lane really divides by
+        zero. Bodies that recurse on a reachable lane, create closures or mix booleans and integers
+        in one result fall back to calling the function once per element, as does everything when
+        NumPy is not installed.
+    """
+
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+
+    def map_call(self, name, arrays):
+        func = self.interpreter.global_scope.get(name)
+        if not isinstance(func, FunctionDef):
+            raise Exception(f"Unknown function: {name}")
+        if len(arrays) != len(func.params):
+            raise Exception(f"Error: {name} expects {len(func.params)} arguments but got {len(arrays)}")
+        if numpy is None:
+            columns = [list(array) for array in arrays]
+            if any(len(column) != len(columns[0]) for column in columns):
+                raise ValueError("map_call needs arrays of the same length")
+            return self.scalar(func, columns, range(len(columns[0]) if columns else 0))
+
+        arrays = numpy.broadcast_arrays(*[numpy.asarray(array) for array in arrays]) if arrays else []
+        shape = arrays[0].shape if arrays else ()
+        flat = [array.ravel() for array in arrays]
+        size = flat[0].size if flat else 1
+        if all(array.dtype.kind in 'iub' for array in flat) and size:
+            try:
+                result = self.vectorized(func, flat, size)
+            except NotVectorizable:
+                result = None
+            if result is not None:
+                return result.reshape(shape)
+        columns = [array.tolist() for array in flat]
+        return to_array(self.scalar(func, columns, range(size))).reshape(shape)
+
+    def scalar(self, func, columns, lanes):
+        # Call func through the interpreter once per lane
+        interpreter = self.interpreter
+        return [interpreter.apply_function(func, interpreter.global_env, [column[i] for column in columns])
+                for i in lanes]
+
+    def vectorized(self, func, flat, size):
+        batch = Batch(size)
+        args = [array.astype(bool) if array.dtype.kind == 'b' else as_int64(array) for array in flat]
+        if any(arg is None for arg in args):
+            return None
+        active = numpy.ones(size, dtype=bool)
+        result = self.evaluate(func.body, dict(zip(func.params, args)), active, batch, (func,))
+        if result is None:
+            return None
+        invalid = numpy.flatnonzero(batch.invalid)
+        if invalid.size:
+            # Redo the untrustworthy lanes exactly; this raises if one of them really fails
+            columns = [array.tolist() for array in flat]
+            exact = self.scalar(func, columns, invalid.tolist())
+            expected = bool if result.dtype == bool else int
+            if any(type(value) is not expected or (expected is int and not INT64_MIN <= value <= INT64_MAX)
+                   for value in exact):
+                # Big integers (or a different type) came back: the result must hold Python objects
+                values = result.tolist()
+                for lane, value in zip(invalid.tolist(), exact):
+                    values[lane] = value
+                return to_array(values)
+            result = result.copy()
+            result[invalid] = exact
+        return result
+
+    def evaluate(self, node, env, active, batch, inlining):
+        """
+            Evaluate node over the lanes selected by active. Returns an int64 or bool array
+            (meaningful only on active lanes), or None when no lane is active.
+        """
+        if not active.any():
+            return None
+        if isinstance(node, Number):
+            if type(node.value) is not int or not INT64_MIN <= node.value <= INT64_MAX:
+                raise NotVectorizable()
+            return numpy.full(active.size, node.value, dtype=numpy.int64)
+        if isinstance(node, Boolean):
+            return numpy.full(active.size, node.value, dtype=bool)
+        if isinstance(node, Variable):
+            if node.name not in env:
+                raise NotVectorizable()  # A global name used as a value
+            return env[node.name]
+        if isinstance(node, UnaryOp):
+            value = self.evaluate(node.expr, env, active, batch, inlining)
+            if node.op == '!':
+                return value == 0 if value.dtype != bool else ~value
+            if node.op == '-':
+                value = value.astype(numpy.int64)
+                batch.invalid |= active & (value == INT64_MIN)
+                return -value
+            raise NotVectorizable()
+        if isinstance(node, Conditional):
+            condition = truth(self.evaluate(node.condition, env, active, batch, inlining))
+            true_value = self.evaluate(node.true_expr, env, active & condition, batch, inlining)
+            false_value = self.evaluate(node.false_expr, env, active & ~condition, batch, inlining)
+            return select(condition, true_value, false_value)
+        if isinstance(node, BinOp):
+            left = self.evaluate(node.left, env, active, batch, inlining)
+            if node.op == '&&' or node.op == '||':
+                taken = truth(left)
+                if node.op == '&&':
+                    # The right operand is only evaluated where the left one is truthy
+                    right = self.evaluate(node.right, env, active & taken, batch, inlining)
+                    return select(taken, right, left)
+                right = self.evaluate(node.right, env, active & ~taken, batch, inlining)
+                return select(taken, left, right)
+            right = self.evaluate(node.right, env, active, batch, inlining)
+            return binary(node.op, left, right, active, batch)
+        if isinstance(node, Call):
+            func = self.interpreter.global_scope.get(node.func) if isinstance(node.func, str) else None
+            if not isinstance(func, FunctionDef) or func in inlining or len(node.args) != len(func.params):
+                # Lambdas, recursion and calls that fail are left to the scalar path
+                raise NotVectorizable()
+            args = [self.evaluate(arg, env, active, batch, inlining) for arg in node.args]
+            return self.evaluate(func.body, dict(zip(func.params, args)), active, batch, inlining + (func,))
+        raise NotVectorizable()
+
+
+def as_int64(array):
+    # Convert an integer array to int64, or return None if some value does not fit
+    if array.dtype.kind == 'u' and array.size and array.max() > INT64_MAX:
+        return None
+    return array.astype(numpy.int64)
+
+
+def truth(value):
+    return value if value.dtype == bool else value != 0
+
+
+def select(condition, true_value, false_value):
+    # Merge the results of two branches; both must have the same type to be merged lane by lane
+    if true_value is None:
+        return false_value
+    if false_value is None:
+        return true_value
+    if true_value.dtype != false_value.dtype:
+        raise NotVectorizable()
+    return numpy.where(condition, true_value, false_value)
+
+
+def binary(op, left, right, active, batch):
+    # Apply a strict binary operator with Python's integer semantics
+    if op in COMPARISONS:
+        if (left.dtype == bool) != (right.dtype == bool) and op not in ('==', '!='):
+            left, right = left.astype(numpy.int64), right.astype(numpy.int64)
+        return getattr(numpy, COMPARISONS[op])(left, right)
+    # Booleans take part in arithmetic as 0 and 1, as they do in Python
+    left = left.astype(numpy.int64)
+    right = right.astype(numpy.int64)
+    with numpy.errstate(over='ignore'):
+        if op == '+':
+            result = left + right
+            batch.invalid |= active & (((left ^ result) & (right ^ result)) < 0)
+            return result
+        if op == '-':
+            result = left - right
+            batch.invalid |= active & (((left ^ right) & (left ^ result)) < 0)
+            return result
+        if op == '*':
+            estimate = numpy.abs(left.astype(numpy.float64) * right.astype(numpy.float64))
+            batch.invalid |= active & (estimate >= MUL_LIMIT)
+            return left * right
+        if op == '/' or op == '%':
+            # Lanes that divide by zero are redone on the scalar path, which raises the language's error
+            zero = right == 0
+            batch.invalid |= active & (zero | ((left == INT64_MIN) & (right == -1)))
+            divisor = numpy.where(zero, 1, right)
+            return numpy.floor_divide(left, divisor) if op == '/' else numpy.remainder(left, divisor)
+    raise NotVectorizable()
+
+
+def to_array(values):
+    # Pack scalar results: int64 or bool when they all fit, objects (big integers, closures) otherwise
+    if numpy is None:
+        return values
+    if values and all(type(value) is bool for value in values):
+        return numpy.array(values, dtype=bool)
+    if all(type(value) is int and INT64_MIN <= value <= INT64_MAX for value in values):
+        return numpy.array(values, dtype=numpy.int64)
+    array = numpy.empty(len(values), dtype=object)
+    array[:] = values
+    return array
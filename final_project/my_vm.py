@@ -0,0 +1,264 @@
+import sys
+
+from AST_Node import FunctionDef
+from my_runtime import Closure, Builtin, EvaluationDepthError, UNBOUND, divide
+from my_memo import MISSING, TAIL_CALL_KEYS, memo_key
+from my_resolver import resolve
+from my_bytecode import (LOAD_CONST, LOAD_SLOT, LOAD_DEREF, LOAD_GLOBAL, BINARY_ADD, BINARY_SUB, BINARY_MUL,
+                         BINARY_DIV, BINARY_MOD, COMPARE_EQ, COMPARE_NE, COMPARE_GT, COMPARE_LT, COMPARE_GE,
+                         COMPARE_LE, UNARY_NOT, UNARY_NEG, JUMP, JUMP_IF_FALSE, JUMP_IF_FALSE_OR_POP,
+                         JUMP_IF_TRUE_OR_POP, MAKE_CLOSURE, CHECK_CALL, CALL, TAIL_CALL, RETURN, DEFINE)
+
+# First element of a frame record that stores the result of memoized calls
+MEMO_RECORD = object()
+
+
+class VMClosure(Closure):
+    def __init__(self, func, env, code):
+        super().__init__(func, env)
+        self.code = code  # CodeObject of the lambda body, resolved against env
+
+
+class VM:
+    """
+        Stack-based virtual machine for CodeObjects. A frame's environment is a list holding its
+        parameter slots followed by the enclosing frame's environment, so LOAD_SLOT is a single list
+        index and LOAD_DEREF follows the last element outwards. Calls push a return record onto an
+        explicit frame stack instead of recursing in Python.
+    """
+
+    def __init__(self, interpreter, compiler, max_depth=None):
+        self.interpreter = interpreter
+        self.compiler = compiler
+        self.max_depth = sys.maxsize if max_depth is None else max_depth
+
+    def call(self, callee, args):
+        """
+            Apply a FunctionDef or VMClosure to args from Python and return its result.
+        """
+        if type(callee) is FunctionDef:
+            code_obj = self.compiler.compile_function(callee)
+            parent = None
+        else:
+            code_obj = callee.code
+            parent = callee.env
+        nparams = len(code_obj.params)
+        env = list(args[:nparams]) + [UNBOUND] * (nparams - len(args)) + [parent]
+        result = self.run(code_obj, env)
+        if len(args) > nparams and isinstance(result, Closure):
+            return self.interpreter.call_value(result, args[nparams:])
+        return result
+
+    def load_outer(self, code_obj, env, depth, name):
+        """
+            Return the value of name for a load that found it UNBOUND in the frame depth levels
+            out. That frame belongs to a lambda called with fewer arguments than parameters, and
+            as with Environment lookup the name then refers to its binding in the enclosing scopes.
+        """
+        scopes = code_obj.scopes[:len(code_obj.scopes) - depth - 1]
+        for _ in range(depth + 1):
+            env = env[-1]
+        while True:
+            address = resolve(name, scopes)
+            if address is None:
+                global_scope = self.interpreter.global_scope
+                if name not in global_scope:
+                    raise Exception(f"Undefined variable: {name}")
+                return global_scope[name]
+            depth, slot = address
+            for _ in range(depth):
+                env = env[-1]
+            value = env[slot]
+            if value is not UNBOUND:
+                return value
+            scopes = scopes[:len(scopes) - depth - 1]
+            env = env[-1]
+
+    def run(self, code_obj, env=None):
+        """
+            Run a code object to completion and return the value it leaves on the stack.
+        """
+        if env is None:
+            env = [None]
+        global_scope = self.interpreter.global_scope
+        check_call = self.interpreter.check_call
+        compile_function = self.compiler.compile_function
+        max_depth = self.max_depth
+
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        memo = self.interpreter.memo
+        governor = self.interpreter.governor
+        # Return records are (code object, pc, env); (None, surplus args) records feed surplus
+        # arguments to a closure returned by the call below them; (MEMO_RECORD, [(cache, key), ...])
+        # records store the result of memoized calls
+        frames = []
+
+        def enter(callee, args):
+            # Bind args for callee and return its code object and environment
+            if type(callee) is FunctionDef:
+                callee_code = compile_function(callee)
+                parent = None
+            else:
+                callee_code = callee.code
+                parent = callee.env
+            nparams = len(callee_code.params)
+            if len(args) > nparams:
+                frames.append((None, args[nparams:]))
+                args = args[:nparams]
+            elif len(args) < nparams:
+                args = args + [UNBOUND] * (nparams - len(args))
+            args.append(parent)
+            return callee_code, args
+
+        code = code_obj.code
+        consts = code_obj.consts
+        pc = 0
+
+        while True:
+            op = code[pc]
+            arg = code[pc + 1]
+            pc += 2
+            if op == LOAD_SLOT:
+                value = env[arg]
+                if value is UNBOUND:
+                    value = self.load_outer(code_obj, env, 0, code_obj.params[arg])
+                push(value)
+            elif op == LOAD_CONST:
+                push(consts[arg])
+            elif op == JUMP_IF_FALSE:
+                if not pop():
+                    pc = arg
+            elif op == BINARY_SUB:
+                right = pop()
+                stack[-1] = stack[-1] - right
+            elif op == BINARY_ADD:
+                right = pop()
+                stack[-1] = stack[-1] + right
+            elif op == BINARY_MUL:
+                right = pop()
+                stack[-1] = stack[-1] * right
+            elif op == COMPARE_EQ:
+                right = pop()
+                stack[-1] = stack[-1] == right
+            elif op == CHECK_CALL:
+                check_call(stack[-1], code_obj.call_sites[arg])
+            elif op == CALL or op == TAIL_CALL:
+                if arg:
+                    args = stack[-arg:]
+                    del stack[-arg:]
+                else:
+                    args = []
+                callee = pop()
+                if governor is not None:
+                    governor.call(len(frames) + 1)
+                if type(callee) is Builtin:
+                    # After a TAIL_CALL the next instruction is the RETURN
+                    push(callee.function(self.interpreter, args))
+                    continue
+                cache = memo.cache_for(callee) if memo is not None else None
+                if cache is not None:
+                    key = memo_key(args)
+                    value = cache.get(key)
+                    if value is not MISSING:
+                        # After a TAIL_CALL the next instruction is the RETURN
+                        push(value)
+                        continue
+                if op == CALL:
+                    frames.append((code_obj, pc, env))
+                    if len(frames) > max_depth:
+                        raise EvaluationDepthError(f"Error: maximum evaluation depth of {max_depth} exceeded")
+                if cache is not None:
+                    if frames and frames[-1][0] is MEMO_RECORD:
+                        keys = frames[-1][1]
+                        if len(keys) < TAIL_CALL_KEYS:
+                            keys.append((cache, key))
+                    else:
+                        frames.append((MEMO_RECORD, [(cache, key)]))
+                code_obj, env = enter(callee, args)
+                code = code_obj.code
+                consts = code_obj.consts
+                pc = 0
+            elif op == RETURN:
+                value = pop()
+                while True:
+                    if not frames:
+                        return value
+                    record = frames.pop()
+                    if record[0] is MEMO_RECORD:
+                        for cache, key in record[1]:
+                            cache.put(key, value)
+                        continue
+                    if record[0] is None:
+                        if not isinstance(value, Closure):
+                            continue
+                        # Apply the surplus arguments to the returned closure, then come back here
+                        frames.append(record)
+                        code_obj, env = enter(value, record[1])
+                        pc = 0
+                    else:
+                        code_obj, pc, env = record
+                        push(value)
+                    code = code_obj.code
+                    consts = code_obj.consts
+                    break
+            elif op == LOAD_GLOBAL:
+                name = code_obj.names[arg]
+                if name not in global_scope:
+                    raise Exception(f"Undefined variable: {name}")
+                push(global_scope[name])
+            elif op == LOAD_DEREF:
+                frame_env = env
+                for _ in range(arg >> 16):
+                    frame_env = frame_env[-1]
+                value = frame_env[arg & 0xFFFF]
+                if value is UNBOUND:
+                    value = self.load_outer(code_obj, env, arg >> 16, code_obj.scopes[-1 - (arg >> 16)][arg & 0xFFFF])
+                push(value)
+            elif op == JUMP:
+                pc = arg
+            elif op == JUMP_IF_FALSE_OR_POP:
+                if not stack[-1]:
+                    pc = arg
+                else:
+                    pop()
+            elif op == JUMP_IF_TRUE_OR_POP:
+                if stack[-1]:
+                    pc = arg
+                else:
+                    pop()
+            elif op == BINARY_DIV:
+                right = pop()
+                stack[-1] = divide(stack[-1], right)
+            elif op == BINARY_MOD:
+                right = pop()
+                stack[-1] = stack[-1] % right
+            elif op == COMPARE_NE:
+                right = pop()
+                stack[-1] = stack[-1] != right
+            elif op == COMPARE_GT:
+                right = pop()
+                stack[-1] = stack[-1] > right
+            elif op == COMPARE_LT:
+                right = pop()
+                stack[-1] = stack[-1] < right
+            elif op == COMPARE_GE:
+                right = pop()
+                stack[-1] = stack[-1] >= right
+            elif op == COMPARE_LE:
+                right = pop()
+                stack[-1] = stack[-1] <= right
+            elif op == UNARY_NOT:
+                stack[-1] = not stack[-1]
+            elif op == UNARY_NEG:
+                stack[-1] = -stack[-1]
+            elif op == MAKE_CLOSURE:
+                child = code_obj.children[arg]
+                push(VMClosure(child.node, env, child))
+            elif op == DEFINE:
+                self.interpreter.define_function(consts[arg])
+                push(None)
+            else:
+                raise Exception(f"Unknown opcode: {op}")
+
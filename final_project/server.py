@@ -0,0 +1,369 @@
+import argparse
+import asyncio
+import collections
+import json
+import math
+import os
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from AST_Node import FunctionDef, Import
+from my_governor import Governor
+from my_interpreter import Interpreter
+from my_lexer import tokenize
+from my_parser import Parser
+from my_runtime import Closure
+
+# Engines that enforce a depth limit without relying on the Python stack
+SERVER_ENGINES = ('vm', 'cek')
+LATENCY_WINDOW = 1000  # Latency percentiles are computed over this many recent requests
+
+
+class CPUTimeLimitExceeded(BaseException):
+    # Not an Exception, like KeyboardInterrupt, so that code which handles evaluation errors with
+    # `except Exception` cannot swallow it and leave the request running without a limit
+    pass
+
+
+# State of a worker process, set up by init_worker
+_worker = {}
+
+
+def _cpu_limit_reached(signum, frame):
+    raise CPUTimeLimitExceeded("Error: CPU time limit exceeded")
+
+
+def init_worker(options, library, max_memory):
+    """
+        Build the worker's interpreter and define the library functions in it.
+    """
+    # The server process handles Ctrl-C and shuts the pool down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if hasattr(signal, 'setitimer'):
+        signal.signal(signal.SIGPROF, _cpu_limit_reached)
+    definitions = [node for node in Parser(tokenize(library)).parse() if isinstance(node, FunctionDef)]
+    _worker['options'] = options
+    _worker['library'] = definitions
+    _worker['max_memory'] = max_memory
+    _worker['interpreter'] = new_interpreter()
+
+
+def worker_interpreter():
+    # The warm interpreter of this worker process, with the library defined
+    return _worker['interpreter']
+
+
+def new_interpreter():
+    interpreter = Interpreter(**_worker['options'])
+    Governor(max_memory=_worker['max_memory']).install(interpreter)
+    for node in _worker['library']:
+        interpreter.evaluate(node)
+    return interpreter
+
+
+def to_json(value):
+    # Integers and booleans are sent as JSON values, anything else (closures, functions) in printed form
+    if isinstance(value, (bool, int)):
+        return value
+    if isinstance(value, Closure):
+        return "<closure>"
+    return str(value)
+
+
+def run_statements(interpreter, statements, cpu_limit, describe=True):
+    """
+        Evaluate statements in order and return one outcome per statement, holding its result or
+        its error (and, if describe is set, the statement itself). Raises CPUTimeLimitExceeded
+        once they have used cpu_limit CPU seconds.
+    """
+    if cpu_limit is not None and hasattr(signal, 'setitimer'):
+        signal.setitimer(signal.ITIMER_PROF, cpu_limit)
+    try:
+        results = []
+        for node in statements:
+            outcome = {'statement': repr(node)} if describe else {}
+            try:
+                result = interpreter.evaluate(node)
+            except CPUTimeLimitExceeded:
+                raise
+            except Exception as e:
+                outcome['error'] = str(e)
+            else:
+                if result is not None:  # Definitions have no result
+                    outcome['result'] = to_json(result)
+            results.append(outcome)
+    finally:
+        if cpu_limit is not None and hasattr(signal, 'setitimer'):
+            signal.setitimer(signal.ITIMER_PROF, 0)
+    return results
+
+
+def request_limit(request, field, server_limit, integer=False):
+    """
+        Return the limit a request asks for in field, lowered to server_limit if it is above it, or
+        server_limit when the request does not set it. Raises ValueError unless the value is a
+        positive number (a positive integer if integer is set).
+    """
+    if field not in request:
+        return server_limit
+    value = request[field]
+    if (isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value) or value <= 0
+            or (integer and value != int(value))):
+        kind = "a positive integer" if integer else "a positive number"
+        raise ValueError(f"Error: {field} must be {kind}")
+    if integer:
+        value = int(value)
+    return value if server_limit is None else min(value, server_limit)
+
+
+def positive_number(text):
+    # argparse type of the limits that must be above zero
+    try:
+        value = float(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid number: {text!r}")
+    if not math.isfinite(value) or value <= 0:
+        raise argparse.ArgumentTypeError(f"must be a positive number: {text!r}")
+    return value
+
+
+def handle(request, cpu_limit, max_depth, max_steps):
+    """
+        Evaluate one request in a worker and return the response (without its id).
+        {"call": "expr"} evaluates one expression against the library; {"program": "source"}
+        runs every statement and reports each one, like run_program. Programs that define
+        functions run in a fresh interpreter, so their definitions do not outlive the request;
+        everything else uses the warm interpreter and its memo caches.
+    """
+    source = request.get('call', request.get('program'))
+    if not isinstance(source, str):
+        return {'ok': False, 'error': "Request needs a 'call' or 'program' string"}
+    try:
+        statements = Parser(tokenize(source)).parse()
+    except Exception as e:
+        return {'ok': False, 'error': f"An error occurred while parsing the code: {e}"}
+    if 'call' in request and len(statements) != 1:
+        return {'ok': False, 'error': "A call must be a single expression"}
+
+    if any(isinstance(node, (FunctionDef, Import)) for node in statements):
+        interpreter = new_interpreter()
+    else:
+        interpreter = _worker['interpreter']
+    interpreter.machine.max_depth = interpreter.vm.max_depth = max_depth
+    interpreter.governor.max_steps = max_steps
+
+    start = time.process_time()
+    try:
+        results = run_statements(interpreter, statements, cpu_limit)
+    except CPUTimeLimitExceeded as e:
+        return {'ok': False, 'error': str(e), 'cpu_time': time.process_time() - start}
+    response = {'cpu_time': time.process_time() - start}
+    if 'call' in request:
+        outcome = results[0]
+        response['ok'] = 'error' not in outcome
+        if response['ok']:
+            response['result'] = outcome.get('result')
+        else:
+            response['error'] = outcome['error']
+    else:
+        response['ok'] = True
+        response['statements'] = results
+    return response
+
+
+class Metrics:
+    def __init__(self):
+        self.started = time.time()
+        self.requests = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.in_flight = 0
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+
+    def snapshot(self, workers):
+        latencies = sorted(self.latencies)
+
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000 if latencies else None
+        return {
+            'uptime': time.time() - self.started,
+            'requests': self.requests,
+            'errors': self.errors,
+            'timeouts': self.timeouts,
+            'in_flight': self.in_flight,
+            'queue_depth': max(0, self.in_flight - workers),  # Requests waiting for a free worker
+            'latency_ms': {'p50': percentile(0.5), 'p95': percentile(0.95), 'p99': percentile(0.99)},
+        }
+
+
+class EvaluationServer:
+    """
+        asyncio server that evaluates JSON requests on a pool of warm worker processes. Each line
+        a client sends is one request; each response is one line holding the request's id. Requests
+        on one connection run concurrently, so responses may come back in a different order.
+        {"op": "metrics"} returns request counts, queue depth and latency percentiles.
+        A request may lower the server's limits with "cpu_limit" (seconds), "max_depth" and "max_steps".
+    """
+
+    def __init__(self, workers, options, library, cpu_limit=1.0, max_depth=10000, max_steps=None,
+                 max_memory=None, timeout=10.0):
+        self.workers = workers
+        self.cpu_limit = cpu_limit
+        self.max_depth = max_depth
+        self.max_steps = max_steps
+        self.timeout = timeout
+        self.metrics = Metrics()
+        self.initargs = (options, library, max_memory)
+        self.pool = self.new_pool()
+
+    def new_pool(self):
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker, initargs=self.initargs)
+
+    def restart(self, pool):
+        # Replace pool after one of its workers died; requests that failed on the same pool restart it once
+        if self.pool is pool:
+            pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = self.new_pool()
+
+    def submit(self, *call):
+        try:
+            return self.pool.submit(*call)
+        except BrokenProcessPool:
+            # A worker died since the last restart, before this request reached the pool
+            self.restart(self.pool)
+            return self.pool.submit(*call)
+
+    async def warm_up(self):
+        # Start every worker now, so the first requests do not pay for process startup
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[loop.run_in_executor(self.pool, os.getpid) for _ in range(self.workers)])
+
+    async def respond(self, request):
+        if not isinstance(request, dict):
+            return {'ok': False, 'error': "Request must be a JSON object"}
+        if request.get('op') == 'metrics':
+            return {'ok': True, 'metrics': self.metrics.snapshot(self.workers)}
+        try:
+            cpu_limit = request_limit(request, 'cpu_limit', self.cpu_limit)
+            max_depth = request_limit(request, 'max_depth', self.max_depth, integer=True)
+            max_steps = request_limit(request, 'max_steps', self.max_steps, integer=True)
+        except ValueError as e:
+            self.metrics.requests += 1
+            self.metrics.errors += 1
+            return {'ok': False, 'error': str(e)}
+        metrics = self.metrics
+        metrics.requests += 1
+        metrics.in_flight += 1
+        start = time.perf_counter()
+        pool = None
+        try:
+            future = self.submit(handle, request, cpu_limit, max_depth, max_steps)
+            pool = self.pool
+            response = await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            metrics.timeouts += 1
+            response = {'ok': False, 'error': "Error: request timed out"}
+        except BrokenProcessPool as e:
+            # The worker died (memory cap, crash): this request fails, later ones get a new pool
+            if pool is not None:
+                self.restart(pool)
+            response = {'ok': False, 'error': f"Worker failed: {e}"}
+        except Exception as e:
+            response = {'ok': False, 'error': f"Worker failed: {e}"}
+        finally:
+            metrics.in_flight -= 1
+        metrics.latencies.append(time.perf_counter() - start)
+        if not response['ok']:
+            metrics.errors += 1
+        return response
+
+    async def serve_request(self, line, writer, lock):
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            response, request_id = {'ok': False, 'error': f"Invalid JSON: {e}"}, None
+        else:
+            request_id = request.get('id') if isinstance(request, dict) else None
+            response = await self.respond(request)
+        response['id'] = request_id
+        async with lock:
+            writer.write(json.dumps(response).encode() + b"\n")
+            await writer.drain()
+
+    async def handle_connection(self, reader, writer):
+        lock = asyncio.Lock()
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                task = asyncio.create_task(self.serve_request(line, writer, lock))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            writer.close()
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Serve evaluations of the lambda language as JSON lines")
+    parser.add_argument('--socket', help="Listen on this Unix socket instead of TCP")
+    parser.add_argument('--host', default='127.0.0.1', help="TCP address to listen on (default: 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=7878, help="TCP port to listen on (default: 7878)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Number of worker processes")
+    parser.add_argument('--library', action='append', default=[],
+                        help="Program whose Defuns every request can call (may be repeated)")
+    parser.add_argument('--engine', choices=SERVER_ENGINES, default='vm', help="Evaluation engine of the workers")
+    parser.add_argument('--memo-size', type=int, default=1024, help="Cached results per pure function (0 disables)")
+    parser.add_argument('--max-depth', type=int, default=10000, help="Maximum evaluation depth of a request")
+    parser.add_argument('--max-steps', type=int, default=None, help="Function calls a request may make")
+    parser.add_argument('--max-memory', type=int, default=None, metavar='MB',
+                        help="Megabytes a worker may grow by while it evaluates a request")
+    parser.add_argument('--cpu-limit', type=positive_number, default=1.0, help="CPU seconds a request may use")
+    parser.add_argument('--timeout', type=float, default=10.0,
+                        help="Seconds before a request is answered with a timeout error")
+    return parser.parse_args()
+
+
+async def serve(args):
+    library = ""
+    for path in args.library:
+        with open(path) as file:
+            library += file.read() + "\n"
+    Parser(tokenize(library)).parse()  # Report syntax errors in the library before starting
+    options = {'engine': args.engine, 'max_depth': args.max_depth, 'memo_size': args.memo_size}
+    max_memory = args.max_memory * 1024 * 1024 if args.max_memory is not None else None
+    server = EvaluationServer(args.workers, options, library, args.cpu_limit, args.max_depth, args.max_steps,
+                              max_memory, args.timeout)
+    await server.warm_up()
+    if args.socket:
+        listener = await asyncio.start_unix_server(server.handle_connection, path=args.socket)
+        print(f"Listening on {args.socket}")
+    else:
+        listener = await asyncio.start_server(server.handle_connection, args.host, args.port)
+        print(f"Listening on {args.host}:{args.port}")
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.close()
+
+
+def main():
+    try:
+        asyncio.run(serve(parse_arguments()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
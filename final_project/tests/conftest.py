@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The interpreter's modules are imported by their flat names, as main.py does, and so is part_b
+PROJECT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT)
+sys.path.append(os.path.join(PROJECT, 'Part_B'))
@@ -0,0 +1,103 @@
+import io
+import json
+import os
+
+import batch
+from batch import BatchRunner, Summary, collect_jobs, read_jobs
+
+LIBRARY = """
+Defun { name: fact, arguments: (n,) } (n == 0) ? 1 : (n * fact(n - 1))
+Defun { name: spin, arguments: (n,) } spin(n + 1)
+"""
+OPTIONS = {'engine': 'vm', 'max_depth': 10000, 'memo_size': 0}
+
+run_job = batch.run_job
+
+
+def dying_job(job, *limits):
+    # Take the worker down on jobs that call crash, as a segfault or the memory cap would
+    if 'crash' in (job.get('call') or ''):
+        os._exit(1)
+    return run_job(job, *limits)
+
+
+def run_batch(jobs, workers=2, chunk_size=2, **limits):
+    runner = BatchRunner(workers, OPTIONS, LIBRARY, chunk_size=chunk_size, **limits)
+    output = io.StringIO()
+    summary = Summary()
+    try:
+        runner.run(iter(jobs), output, summary)
+    finally:
+        runner.close()
+    return [json.loads(line) for line in output.getvalue().splitlines()], summary
+
+
+def test_results_are_written_in_job_order():
+    jobs = [{'id': n, 'call': f"fact({n % 7})"} for n in range(40)]
+    results, summary = run_batch(jobs)
+    assert [result['id'] for result in results] == list(range(40))
+    assert [result['result'] for result in results] == [[1, 1, 2, 6, 24, 120, 720][n % 7] for n in range(40)]
+    assert summary.jobs == 40 and summary.failures == 0
+
+
+def test_failed_jobs_do_not_affect_the_others():
+    jobs = [{'id': 'parse', 'call': "fact(("}, {'id': 'runtime', 'call': "nope(1)"},
+            {'id': 'empty'}, {'id': 'spin', 'call': "spin(0)"}, {'id': 'ok', 'call': "fact(5)"}]
+    results, summary = run_batch(jobs, workers=1, cpu_limit=0.2)
+    outcomes = {result['id']: result for result in results}
+    assert not any(outcomes[name]['ok'] for name in ('parse', 'runtime', 'empty', 'spin'))
+    assert outcomes['spin']['error'] == "Error: CPU time limit exceeded"
+    assert outcomes['ok']['result'] == 120
+    assert summary.failures == 4
+
+
+def test_definitions_do_not_leak_into_later_jobs():
+    jobs = [{'id': 1, 'source': "Defun { name: fact, arguments: (n,) } 0\nDefun { name: g, arguments: () } 1",
+             'call': "fact(3)"},
+            {'id': 2, 'call': "fact(3)"}, {'id': 3, 'call': "g()"}]
+    results, _ = run_batch(jobs, workers=1, chunk_size=3)
+    assert results[0]['result'] == 0
+    assert results[1]['result'] == 6
+    assert not results[2]['ok']
+
+
+def test_worker_crash_fails_only_its_job(monkeypatch):
+    monkeypatch.setattr(batch, 'run_job', dying_job)
+    jobs = [{'id': n, 'call': "crash(1)" if n in (3, 8) else f"fact({n})"} for n in range(12)]
+    results, summary = run_batch(jobs, chunk_size=4)
+    assert [result['id'] for result in results] == list(range(12))
+    for result in results:
+        if result['id'] in (3, 8):
+            assert not result['ok'] and result['error'].startswith("Worker failed")
+        else:
+            assert result['ok'], result
+    assert summary.failures == 2
+
+
+def test_read_jobs_reports_bad_lines():
+    lines = ['{"call": "fact(1)"}\n', '\n', 'not json\n', '[1]\n', '{"id": "x", "call": "fact(2)"}\n']
+    jobs = list(read_jobs(lines, 'jobs.jsonl'))
+    assert jobs[0] == {'id': 'jobs.jsonl:1', 'call': "fact(1)"}
+    assert jobs[1]['id'] == 'jobs.jsonl:3' and jobs[1]['error'].startswith("Invalid JSON")
+    assert jobs[2] == {'id': 'jobs.jsonl:4', 'error': "Job must be a JSON object"}
+    assert jobs[3]['id'] == 'x'
+
+
+def test_collect_jobs(tmp_path):
+    (tmp_path / 'b.lambda').write_text("fact(2)\n")
+    (tmp_path / 'a.lambda').write_text("fact(1)\n")
+    (tmp_path / 'notes.txt').write_text("")
+    (tmp_path / 'jobs.jsonl').write_text('{"call": "fact(3)"}\n')
+    a, b = str(tmp_path / 'a.lambda'), str(tmp_path / 'b.lambda')
+    assert [job['id'] for job in collect_jobs([str(tmp_path)])] == [a, b]
+    assert [job['id'] for job in collect_jobs([str(tmp_path / '*.lambda')])] == [a, b]
+    assert list(collect_jobs([str(tmp_path / 'jobs.jsonl')])) == [
+        {'id': f"{tmp_path / 'jobs.jsonl'}:1", 'call': "fact(3)"}]
+
+
+def test_program_jobs_run_files(tmp_path):
+    (tmp_path / 'prog.lambda').write_text("Defun { name: h, arguments: (x,) } x + 1\nh(fact(3))\n")
+    results, _ = run_batch(collect_jobs([str(tmp_path)]), workers=1)
+    assert results[0]['ok'] and results[0]['statements'][1]['result'] == 7
+    missing, _ = run_batch([{'id': 'm', 'program': str(tmp_path / 'missing.lambda')}], workers=1)
+    assert not missing[0]['ok'] and "reading the file" in missing[0]['error']
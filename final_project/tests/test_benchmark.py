@@ -0,0 +1,45 @@
+import json
+import os
+import subprocess
+import sys
+
+from benchmark import PHASES, compare, describe_regression
+
+PROJECT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def report(size, seconds, peak):
+    phases = {phase: {'min_seconds': seconds, 'median_seconds': seconds, 'peak_bytes': peak,
+                      'allocated_blocks': 1} for phase in PHASES}
+    return {'results': {'classic': {'size': size, **phases}}}
+
+
+def test_compare_reports_slowdowns_and_memory_growth_past_the_threshold():
+    regressions = compare(report(10, 0.010, 10000), report(10, 0.020, 30000), 0.1)
+    assert {(phase, metric) for _, phase, metric, _, _ in regressions} == \
+        {(phase, metric) for phase in PHASES for metric in ('min_seconds', 'peak_bytes')}
+    assert compare(report(10, 0.010, 10000), report(10, 0.0105, 10500), 0.1) == []
+
+
+def test_compare_skips_workloads_of_another_size():
+    assert compare(report(10, 0.010, 10000), report(20, 1.0, 10 ** 9), 0.1) == []
+
+
+def test_regression_against_a_zero_baseline_is_described_as_an_absolute_change():
+    assert describe_regression('classic', 'parse', 'peak_bytes', 0, 4096) == \
+        "REGRESSION classic/parse peak_bytes: 0 -> 4096 (+4096)"
+    assert describe_regression('classic', 'parse', 'peak_bytes', 1000, 1500).endswith("(+50.0%)")
+
+
+def test_compare_exits_with_status_1_on_a_zero_baseline(tmp_path):
+    baseline = tmp_path / 'baseline.json'
+    command = [sys.executable, 'benchmark.py', '--workload', 'classic', '--scale', '0.05', '--repeat', '1']
+    subprocess.run(command + ['--output', str(baseline)], cwd=PROJECT, capture_output=True, check=True)
+    stored = json.loads(baseline.read_text())
+    for phases in stored['results'].values():
+        for phase in PHASES:
+            phases[phase]['peak_bytes'] = 0
+    baseline.write_text(json.dumps(stored))
+    result = subprocess.run(command + ['--compare', str(baseline)], cwd=PROJECT, capture_output=True, text=True)
+    assert result.returncode == 1, result.stderr
+    assert "REGRESSION classic/" in result.stdout and "Traceback" not in result.stderr
@@ -0,0 +1,102 @@
+import io
+import os
+import time
+
+import pytest
+
+from my_cache import ProgramCache, CacheError, CACHE_SUFFIX, TEMP_MAX_AGE
+from my_interpreter import Interpreter
+
+PROGRAM = """
+Defun { name: sq, arguments: (n,) } n * n
+sq(3)
+sq(4)
+"""
+
+
+def statements(cache, source):
+    # The statements run for source, read through the cache as main.py reads a program file
+    interpreter = Interpreter(engine='tree')
+    interpreter.cache = cache
+    return list(interpreter.cached_statements(io.StringIO(source)))
+
+
+def entries(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith(CACHE_SUFFIX))
+
+
+def age(path, seconds):
+    then = time.time() - seconds
+    os.utime(path, (then, then))
+
+
+def test_second_read_comes_from_the_cache(tmp_path, monkeypatch):
+    cache = ProgramCache(str(tmp_path))
+    parsed = statements(cache, PROGRAM)
+    assert len(entries(tmp_path)) == 1
+    monkeypatch.setattr('my_interpreter.Parser', None)  # A hit must not parse
+    assert repr(statements(cache, PROGRAM)) == repr(parsed)
+
+
+def test_edited_source_misses(tmp_path):
+    cache = ProgramCache(str(tmp_path))
+    statements(cache, PROGRAM)
+    edited = statements(cache, PROGRAM.replace("sq(4)", "sq(5)"))
+    assert "value=5" in repr(edited[-1])
+    assert len(entries(tmp_path)) == 2
+
+
+def test_damaged_entry_is_dropped_and_parsed_again(tmp_path):
+    cache = ProgramCache(str(tmp_path))
+    parsed = statements(cache, PROGRAM)
+    path = tmp_path / entries(tmp_path)[0]
+    path.write_bytes(path.read_bytes()[:-20])
+    with pytest.raises(CacheError):
+        list(cache.read_statements(path.name[:-len(CACHE_SUFFIX)]))
+    assert entries(tmp_path) == []
+    statements(cache, PROGRAM)
+    path.write_bytes(path.read_bytes()[:-20])
+    # The statements read before the damage are kept and the rest are parsed
+    assert repr(statements(cache, PROGRAM)) == repr(parsed)
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ProgramCache(str(tmp_path))
+    for n in range(3):
+        cache.store(cache.key(str(n)), [n])
+        age(cache.path(cache.key(str(n))), 100 - n)
+    assert cache.load(cache.key('0')) == [0]  # Now the most recently used
+    size = os.path.getsize(cache.path(cache.key('0')))
+    cache.max_bytes = 2 * size
+    cache.evict()
+    assert cache.load(cache.key('1')) is None
+    assert cache.load(cache.key('0')) == [0] and cache.load(cache.key('2')) == [2]
+
+
+def test_expired_entries_are_evicted(tmp_path):
+    cache = ProgramCache(str(tmp_path), max_age=60)
+    cache.store(cache.key('old'), [1])
+    age(cache.path(cache.key('old')), 120)
+    cache.store(cache.key('new'), [2])
+    assert entries(tmp_path) == [cache.key('new') + CACHE_SUFFIX]
+
+
+def test_abandoned_temporary_files_are_removed(tmp_path):
+    cache = ProgramCache(str(tmp_path))
+    abandoned = tmp_path / 'abandoned.tmp'
+    writing = tmp_path / 'writing.tmp'
+    abandoned.write_bytes(b'x' * 100)
+    writing.write_bytes(b'x' * 100)
+    age(abandoned, TEMP_MAX_AGE + 60)
+    cache.evict()
+    assert not abandoned.exists() and writing.exists()
+
+
+def test_temporary_files_count_against_the_size_limit(tmp_path):
+    cache = ProgramCache(str(tmp_path))
+    cache.store(cache.key('entry'), [1])
+    size = os.path.getsize(cache.path(cache.key('entry')))
+    (tmp_path / 'writing.tmp').write_bytes(b'x' * size)
+    cache.max_bytes = size
+    cache.evict()
+    assert entries(tmp_path) == []
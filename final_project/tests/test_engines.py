@@ -0,0 +1,74 @@
+import os
+import re
+import subprocess
+import sys
+
+import pytest
+
+# Every engine and flag combination must print what the tree engine prints for the same program.
+# Each program runs in a fresh main.py process, the way users run it.
+
+PROJECT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROGRAMS = os.path.join(PROJECT, 'tests', 'programs')
+MAIN = os.path.join(PROJECT, 'main.py')
+
+PROGRAM_FILES = [os.path.join(PROJECT, 'test_program.lambda')] + sorted(
+    os.path.join(PROGRAMS, name) for name in os.listdir(PROGRAMS) if name.endswith('.lambda'))
+
+FLAG_SETS = {
+    'compiled': ['--engine', 'compiled'],
+    'cek': ['--engine', 'cek'],
+    'vm': ['--engine', 'vm'],
+    'lazy': ['--lazy'],
+    'jobs': ['--jobs', '3'],
+    'fork-join': ['--fork-join', '2'],
+    'no-cache': ['--no-cache'],
+}
+
+# Object addresses change from run to run, and each engine has its own closure class
+ADDRESS = re.compile(r' at 0x[0-9a-f]+')
+CLOSURE = re.compile(r'<my_\w+\.\w*Closure object>')
+
+
+def normalize(output):
+    return CLOSURE.sub('<closure>', ADDRESS.sub('', output))
+
+
+def run(program, *flags, cache_dir):
+    result = subprocess.run([sys.executable, MAIN, '--cache-dir', str(cache_dir), *flags, program],
+                            cwd=PROJECT, capture_output=True, text=True, timeout=300)
+    return normalize(result.stdout + result.stderr)
+
+
+@pytest.fixture(scope='module')
+def expected(tmp_path_factory):
+    # Output of the tree engine, the reference every other configuration is compared with
+    cache_dir = tmp_path_factory.mktemp('reference-cache')
+    outputs = {}
+
+    def output(program):
+        if program not in outputs:
+            outputs[program] = run(program, '--engine', 'tree', '--no-cache', cache_dir=cache_dir)
+        return outputs[program]
+    return output
+
+
+@pytest.mark.parametrize('program', PROGRAM_FILES, ids=os.path.basename)
+@pytest.mark.parametrize('flags', FLAG_SETS.values(), ids=FLAG_SETS.keys())
+def test_matches_tree_engine(program, flags, expected, tmp_path):
+    assert run(program, *flags, cache_dir=tmp_path) == expected(program)
+
+
+@pytest.mark.parametrize('program', PROGRAM_FILES, ids=os.path.basename)
+def test_cached_run_matches_tree_engine(program, expected, tmp_path):
+    # The first run parses and fills the cache, the second reads the statements back from it
+    assert run(program, cache_dir=tmp_path) == expected(program)
+    assert run(program, cache_dir=tmp_path) == expected(program)
+
+
+@pytest.mark.parametrize('program', PROGRAM_FILES, ids=os.path.basename)
+def test_profile_guided_runs_match_tree_engine(program, expected, tmp_path):
+    profile = str(tmp_path / 'profile.pgo.json')
+    assert run(program, '--pgo-record', '--pgo-file', profile, cache_dir=tmp_path) == expected(program)
+    assert os.path.exists(profile)
+    assert run(program, '--pgo-use', '--pgo-file', profile, cache_dir=tmp_path) == expected(program)
@@ -0,0 +1,89 @@
+import gc
+
+import pytest
+
+import my_forkjoin
+from my_forkjoin import ForkJoin
+from my_interpreter import Interpreter
+from my_lexer import tokenize
+from my_parser import Parser
+
+FIB = "# pragma: no-memo\nDefun { name: fib, arguments: (n,) } (n <= 1) ? n : fib(n - 1) + fib(n - 2)\n"
+SQ = "# pragma: no-memo\nDefun { name: sq, arguments: (n,) } n * n\n"
+
+
+def parse(source):
+    return Parser(tokenize(source)).parse()
+
+
+@pytest.fixture
+def fork_join(request):
+    # Fork-join evaluator on a fresh interpreter; parametrize indirectly with (engine, threshold)
+    engine, threshold = getattr(request, 'param', ('compiled', 0.0))
+    interpreter = Interpreter(engine=engine, jit_threshold=0)
+    evaluator = ForkJoin(interpreter, 2, threshold)
+    evaluator.install()
+    submitted = []
+    get_pool = evaluator.get_pool
+
+    def counting_pool():
+        pool = get_pool()
+        submit = pool.submit
+        if not getattr(pool, 'counted', False):
+            def counted_submit(*args):
+                submitted.append(args)
+                return submit(*args)
+            pool.submit = counted_submit
+            pool.counted = True
+        return pool
+    evaluator.get_pool = counting_pool
+    evaluator.submitted = submitted
+    yield evaluator
+    evaluator.close()
+
+
+def run(evaluator, source):
+    result = None
+    for node in parse(source):
+        result = evaluator.interpreter.evaluate(node)
+    return result
+
+
+@pytest.mark.parametrize('fork_join', [('compiled', 0.0), ('tree', 0.0)], indirect=True)
+def test_results_match_a_serial_run(fork_join):
+    assert run(fork_join, FIB + "fib(15)") == 610
+    assert run(fork_join, "fib(3) * fib(4) - fib(5)") == 1
+    assert fork_join.submitted
+
+
+def test_leftmost_error_wins(fork_join):
+    source = (SQ + "Defun { name: bad, arguments: (n,) } n / 0\n"
+              "Defun { name: first, arguments: (a, b, c) } a\n")
+    run(fork_join, source)
+    with pytest.raises(Exception) as forked_first:
+        run(fork_join, "first(bad(1), nope(2), sq(3))")
+    with pytest.raises(Exception) as serial:
+        run(fork_join, "bad(1)")
+    assert str(forked_first.value) == str(serial.value)
+
+
+@pytest.mark.parametrize('fork_join', [('compiled', 0.01)], indirect=True)
+def test_cheap_function_is_forked_only_until_it_is_measured(fork_join):
+    run(fork_join, SQ + "".join(f"sq({i}) + sq({i + 1})\n" for i in range(100)))
+    assert len(fork_join.submitted) == 1
+
+
+@pytest.mark.parametrize('fork_join', [('compiled', 0.01)], indirect=True)
+def test_costs_are_bounded(fork_join, monkeypatch):
+    monkeypatch.setattr(my_forkjoin, 'COST_ENTRIES', 10)
+    run(fork_join, SQ + "".join(f"sq({i}) + sq({i + 1})\n" for i in range(100)))
+    assert len(fork_join.costs) == 10
+
+
+@pytest.mark.parametrize('fork_join', [('tree', 0.01)], indirect=True)
+def test_fork_sites_of_finished_statements_are_dropped(fork_join):
+    run(fork_join, SQ)
+    for i in range(50):
+        run(fork_join, f"sq({i}) + sq({i + 1})")
+    gc.collect()
+    assert len(fork_join.sites) < 10
@@ -0,0 +1,84 @@
+import sys
+from itertools import count
+
+import pytest
+
+import my_governor
+from my_governor import Governor, StepLimitExceeded, CallDepthExceeded, MemoryLimitExceeded
+from my_interpreter import Interpreter
+from my_lexer import tokenize
+from my_parser import Parser
+
+ENGINES = ['compiled', 'tree', 'cek', 'vm']
+LIBRARY = """
+Defun { name: down, arguments: (n,) } (n == 0) ? 0 : down(n - 1)
+Defun { name: loop, arguments: (n,) } loop(n + 1)
+Defun { name: depth, arguments: (n,) } (n == 0) ? 0 : 1 + depth(n - 1)
+"""
+
+
+def governed(engine, **limits):
+    interpreter = Interpreter(engine=engine, memo_size=0, jit_threshold=0)
+    Governor(**limits).install(interpreter)
+    for node in Parser(tokenize(LIBRARY)).parse():
+        interpreter.evaluate(node)
+    return interpreter
+
+
+def run(interpreter, source):
+    result = None
+    for node in Parser(tokenize(source)).parse():
+        result = interpreter.evaluate(node)
+    return result
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_step_limit(engine):
+    interpreter = governed(engine, max_steps=50)
+    assert run(interpreter, "down(40)") == 0
+    with pytest.raises(StepLimitExceeded, match="step limit of 50 exceeded"):
+        run(interpreter, "down(60)")
+    with pytest.raises(StepLimitExceeded):
+        run(interpreter, "loop(0)")
+    # Each statement gets the whole budget again
+    assert run(interpreter, "down(40)") == 0
+    assert interpreter.governor.steps == 41
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_call_depth_limit(engine):
+    interpreter = governed(engine, max_call_depth=30)
+    assert run(interpreter, "depth(25)") == 25
+    with pytest.raises(CallDepthExceeded, match="call depth limit of 30 exceeded"):
+        run(interpreter, "depth(40)")
+    assert run(interpreter, "depth(25)") == 25
+
+
+def test_python_stack_overflow_is_a_depth_error():
+    interpreter = governed('tree')
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(400)
+    try:
+        with pytest.raises(CallDepthExceeded, match="Python stack ran out"):
+            run(interpreter, "depth(10000)")
+    finally:
+        sys.setrecursionlimit(limit)
+
+
+@pytest.mark.parametrize('engine', ['tree', 'vm'])
+def test_memory_limit(engine, monkeypatch):
+    # Memory appears to grow by 1 kB at every sample
+    usage = count(0, 1024)
+    monkeypatch.setattr(my_governor, 'memory_usage', lambda: next(usage))
+    interpreter = governed(engine, max_memory=10 * 1024, check_interval=5)
+    assert run(interpreter, "down(20)") == 0
+    with pytest.raises(MemoryLimitExceeded, match="memory limit of 10240 bytes exceeded"):
+        run(interpreter, "down(100)")
+
+
+def test_limit_errors_are_language_errors():
+    # They are reported like any other error, not as a crash
+    interpreter = governed('compiled', max_steps=5)
+    with pytest.raises(Exception) as error:
+        run(interpreter, "down(10)")
+    assert str(error.value).startswith("Error: ")
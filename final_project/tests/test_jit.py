@@ -0,0 +1,64 @@
+import gc
+import weakref
+
+import pytest
+
+from my_interpreter import Interpreter
+from my_jit import FAILED
+from my_lexer import tokenize
+from my_parser import Parser
+
+COUNT = "Defun { name: count, arguments: (n, acc) } (n == 0) ? acc : count(n - 1, acc + 1)\n"
+
+
+def run(interpreter, source):
+    # Evaluate every statement of source and return the value of the last one
+    result = None
+    for node in Parser(tokenize(source)).parse():
+        result = interpreter.evaluate(node)
+    return result
+
+
+def entry(interpreter, name):
+    return interpreter.jit.entries.get(interpreter.global_scope[name])
+
+
+@pytest.mark.parametrize('engine', ['compiled', 'tree'])
+def test_hot_function_is_translated_and_tail_calls_loop(engine):
+    interpreter = Interpreter(engine=engine, jit_threshold=2, memo_size=0)
+    assert run(interpreter, COUNT + "count(1, 0)\ncount(100000, 0)") == 100000
+    assert callable(entry(interpreter, 'count'))
+
+
+def test_cold_function_stays_interpreted():
+    interpreter = Interpreter(engine='compiled', jit_threshold=100, memo_size=0)
+    run(interpreter, COUNT + "count(5, 0)")
+    assert entry(interpreter, 'count') is None
+
+
+@pytest.mark.parametrize('source', [
+    "Defun { name: adder, arguments: (n,) } (Lambd x. x + n)(n)\n",
+    "# pragma: no-jit\nDefun { name: adder, arguments: (n,) } n + n\n",
+])
+def test_functions_without_a_translation_fall_back_to_the_interpreter(source):
+    interpreter = Interpreter(engine='compiled', jit_threshold=1)
+    assert run(interpreter, source + "adder(1)\nadder(2)\nadder(3)") == 6
+    assert entry(interpreter, 'adder') is FAILED
+
+
+def test_untranslatable_branch_is_interpreted_and_errors_match():
+    interpreter = Interpreter(engine='compiled', jit_threshold=1, memo_size=0)
+    source = "Defun { name: f, arguments: (n,) } (n > 0) ? n * 2 : (Lambd x. x)(n)\nf(1)\nf(3)\nf(-4)"
+    assert run(interpreter, source) == -4
+    with pytest.raises(Exception, match="Error: f expects 1 arguments but got 2"):
+        run(interpreter, "Defun { name: g, arguments: (n,) } f(n, n)\ng(1)\ng(1)")
+
+
+def test_redefinition_runs_the_new_body_and_releases_the_old_one():
+    interpreter = Interpreter(engine='compiled', jit_threshold=1)
+    run(interpreter, "Defun { name: sq, arguments: (n,) } n * n\nsq(3)\nsq(4)")
+    old = weakref.ref(interpreter.global_scope['sq'])
+    assert run(interpreter, "Defun { name: sq, arguments: (n,) } n + n\nsq(3)\nsq(4)") == 8
+    gc.collect()
+    assert old() is None
+    assert len(interpreter.jit.counts) == len(interpreter.jit.code) == 1
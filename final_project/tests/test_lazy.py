@@ -0,0 +1,91 @@
+import pytest
+
+from my_interpreter import Interpreter
+from my_lazy import Thunk, delay
+from my_lexer import tokenize
+from my_parser import Parser
+
+LIBRARY = """
+Defun { name: choose, arguments: (c, a, b) } c ? a : b
+Defun { name: both, arguments: (a, b) } a + b
+Defun { name: first, arguments: (a, b) } a
+Defun { name: guard, arguments: (a, b) } a && b
+Defun { name: count, arguments: (n, acc) } (n == 0) ? acc : count(n - 1, acc + 1)
+Defun { name: skip, arguments: (n, unused) } (n == 0) ? 0 : skip(n - 1, unused)
+Defun { name: apply, arguments: (f, x) } f(x)
+Defun { name: wrap, arguments: (a, b) } first(b, a)
+Defun { name: loop, arguments: (n,) } loop(n + 1)
+"""
+
+
+@pytest.fixture
+def interpreter():
+    interpreter = Interpreter(engine='tree', lazy=True)
+    run(interpreter, LIBRARY)
+    return interpreter
+
+
+def run(interpreter, source):
+    result = None
+    for node in Parser(tokenize(source)).parse():
+        result = interpreter.evaluate(node)
+    return result
+
+
+@pytest.mark.parametrize('name, verdict', [
+    ('choose', (True, False, False)),
+    ('both', (True, True)),
+    ('first', (True, False)),
+    ('guard', (True, False)),
+    ('count', (True, True)),
+    ('skip', (True, False)),
+    ('apply', (True, False)),
+    ('wrap', (False, True)),
+])
+def test_strictness_verdicts(interpreter, name, verdict):
+    assert interpreter.strictness.strict_params(interpreter.global_scope[name]) == verdict
+
+
+def test_unused_arguments_are_never_evaluated(interpreter):
+    assert run(interpreter, "choose(TRUE, 1, loop(0))") == 1
+    assert run(interpreter, "first(2, nope(1))") == 2
+    assert run(interpreter, "skip(3, 1 / 0)") == 0
+    with pytest.raises(Exception):
+        run(interpreter, "choose(FALSE, 1, 1 / 0)")
+
+
+def test_redefinition_invalidates_verdicts(interpreter):
+    assert interpreter.strictness.strict_params(interpreter.global_scope['wrap']) == (False, True)
+    run(interpreter, "Defun { name: first, arguments: (a, b) } b")
+    assert interpreter.strictness.strict_params(interpreter.global_scope['wrap']) == (True, False)
+    assert run(interpreter, "wrap(5, loop(0))") == 5
+
+
+def test_thunk_is_evaluated_once_and_keeps_nothing_alive():
+    calls = []
+
+    def execute(node, env):
+        calls.append(node)
+        return 42
+    thunk = delay(execute, Parser(tokenize("f(1)")).parse()[0], None)
+    assert isinstance(thunk, Thunk)
+    assert thunk.force() == 42 and thunk.force() == 42
+    assert len(calls) == 1 and thunk.node is None and thunk.env is None
+
+
+def test_failed_thunk_raises_again():
+    def execute(node, env):
+        raise Exception("Error: boom")
+    thunk = delay(execute, Parser(tokenize("f(1)")).parse()[0], None)
+    for _ in range(2):
+        with pytest.raises(Exception, match="boom"):
+            thunk.force()
+
+
+def test_cheap_arguments_are_not_delayed():
+    assert delay(None, Parser(tokenize("7")).parse()[0], None) == 7
+
+
+def test_lazy_needs_the_tree_engine():
+    with pytest.raises(ValueError):
+        Interpreter(engine='vm', lazy=True)
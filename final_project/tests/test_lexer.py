@@ -0,0 +1,51 @@
+import io
+
+import pytest
+
+from my_lexer import tokenize, iter_file_tokens, LexerError
+
+def kinds(tokens):
+    return [token[:2] for token in tokens]
+
+
+SOURCE = """# a comment
+Defun { name: sq, arguments: (n,) }
+  n * 2
+"""
+
+
+def test_tokens_carry_their_position():
+    tokens = tokenize(SOURCE)
+    assert tokens[0][:2] == ('DEFUN', 'Defun')
+    assert (tokens[0].line, tokens[0].column, tokens[0].offset) == (2, 1, SOURCE.index('Defun'))
+    n = tokens[-3]
+    assert n[:2] == ('IDENTIFIER', 'n') and (n.line, n.column) == (3, 3)
+    assert tokens[-1][:2] == ('INTEGER', 2)
+
+
+def test_pragma_and_literals():
+    tokens = tokenize("# pragma: no-memo\nTRUE != FALSE")
+    assert kinds(tokens) == [('PRAGMA', 'no-memo'), ('BOOLEAN', True), ('COMP_OP', '!='), ('BOOLEAN', False)]
+
+
+@pytest.mark.parametrize('source, line, column', [
+    ("@", 1, 1),
+    ("f(1) $ 2", 1, 6),
+    ("x\n\n  y ~", 3, 5),
+    ("# no ` in comments\nsq(`)", 2, 4),
+])
+def test_error_reports_line_and_column(source, line, column):
+    with pytest.raises(LexerError) as error:
+        tokenize(source)
+    assert (error.value.line, error.value.column) == (line, column)
+    assert str(error.value).endswith(f"at line {line}, column {column}")
+
+
+def test_file_tokens_match_whole_source():
+    assert [tuple(token) for token in iter_file_tokens(io.StringIO(SOURCE))] == [tuple(token) for token in tokenize(SOURCE)]
+
+
+def test_file_tokens_report_the_line_of_an_error():
+    with pytest.raises(LexerError) as error:
+        list(iter_file_tokens(io.StringIO("sq(1)\nsq(2)\n  sq(3) ^\n")))
+    assert (error.value.line, error.value.column) == (3, 9)
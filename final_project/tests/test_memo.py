@@ -0,0 +1,73 @@
+import gc
+import weakref
+
+import pytest
+
+from my_interpreter import Interpreter
+from my_lexer import tokenize
+from my_memo import LRUCache, MISSING, memo_key
+from my_parser import Parser
+
+
+def run(interpreter, source):
+    # Evaluate every statement of source and return the value of the last one
+    result = None
+    for node in Parser(tokenize(source)).parse():
+        result = interpreter.evaluate(node)
+    return result
+
+
+def stats(interpreter):
+    return {name: (hits, misses, entries) for name, hits, misses, entries in interpreter.memo.stats()}
+
+
+def test_lru_cache_evicts_the_least_recently_used_entry():
+    cache = LRUCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1  # 'a' is now the most recently used
+    cache.put('c', 3)
+    assert cache.get('b') is MISSING
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_memo_key_tells_integers_from_booleans():
+    assert memo_key([1]) != memo_key([True])
+    assert memo_key([1, 2]) == memo_key([1, 2])
+
+
+@pytest.mark.parametrize('engine', ['tree', 'compiled', 'cek', 'vm'])
+def test_pure_function_is_memoized(engine):
+    interpreter = Interpreter(engine=engine)
+    assert run(interpreter, "Defun { name: fib, arguments: (n,) } (n <= 1) ? n : fib(n - 1) + fib(n - 2)\n"
+                            "fib(60)") == 1548008755920
+    hits, misses, entries = stats(interpreter)['fib']
+    assert misses == entries == 61 and hits > 0
+
+
+def test_memo_size_bounds_each_cache():
+    interpreter = Interpreter(engine='tree', memo_size=10)
+    run(interpreter, "Defun { name: inc, arguments: (n,) } n + 1\n" + "".join(f"inc({i})\n" for i in range(50)))
+    assert stats(interpreter)['inc'] == (0, 50, 10)
+
+
+def test_no_memo_pragma_and_impure_functions_are_not_memoized():
+    interpreter = Interpreter(engine='tree')
+    run(interpreter, "# pragma: no-memo\n"
+                     "Defun { name: slow, arguments: (n,) } n + 1\n"
+                     "Defun { name: adder, arguments: (n,) } (Lambd x. x + n)\n"
+                     "slow(1)\nslow(1)\nadder(1)\nadder(1)")
+    assert 'slow' not in stats(interpreter) and 'adder' not in stats(interpreter)
+
+
+def test_redefinition_drops_cached_results_and_keeps_counts_under_the_name():
+    interpreter = Interpreter(engine='tree', jit_threshold=0)
+    assert run(interpreter, "Defun { name: inc, arguments: (n,) } n + 1\n"
+                            "Defun { name: g, arguments: (n,) } inc(n)\n"
+                            "g(1)\ng(1)") == 2
+    old = weakref.ref(interpreter.global_scope['inc'])
+    assert run(interpreter, "Defun { name: inc, arguments: (n,) } n + 100\ng(1)") == 101
+    gc.collect()
+    assert old() is None
+    assert stats(interpreter)['g'] == (1, 2, 1)
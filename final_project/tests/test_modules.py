@@ -0,0 +1,125 @@
+import pytest
+
+import my_modules
+from my_cache import ProgramCache
+from my_interpreter import Interpreter
+from my_lexer import tokenize
+from my_modules import build_index
+from my_parser import Parser
+
+LIBRARY = """# A library
+Defun { name: sq, arguments: (x,) } x * x
+Defun { name: sumsq, arguments: (a, b) } sq(a) + sq(b)
+# pragma: no-memo
+Defun { name: fact, arguments: (n,) } (n == 0) ? 1 : n * fact(n - 1)
+Defun { name: unused, arguments: (x,) } x +
+"""
+
+
+@pytest.fixture
+def library(tmp_path):
+    (tmp_path / 'lib.lambda').write_text(LIBRARY)
+    return tmp_path
+
+
+def interpreter_in(directory, cache=None):
+    interpreter = Interpreter(engine='tree', jit_threshold=0)
+    interpreter.modules.directory = str(directory)
+    interpreter.cache = cache
+    return interpreter
+
+
+def run(interpreter, source):
+    result = None
+    for node in Parser(tokenize(source)).parse():
+        result = interpreter.evaluate(node)
+    return result
+
+
+def test_index():
+    index = build_index('lib', LIBRARY)
+    assert list(index) == ['sq', 'sumsq', 'fact', 'unused']
+    start, end, line = index['fact']
+    assert LIBRARY[start:end].startswith("# pragma: no-memo\nDefun { name: fact")
+    assert line == 4
+    assert build_index('lib', "Defun { name: f, arguments: () } 1\nDefun { name: f, arguments: () } 2")['f'][2] == 2
+
+
+@pytest.mark.parametrize('source', ["sq(1)\n", "Defun { name: }\n"])
+def test_index_rejects_anything_but_definitions(source):
+    with pytest.raises(Exception, match="module lib"):
+        build_index('lib', source)
+
+
+def test_functions_are_parsed_when_first_reached(library):
+    interpreter = interpreter_in(library)
+    # unused does not parse, which is only noticed if a statement reaches it
+    run(interpreter, "Import { module: lib }")
+    assert 'sumsq' not in interpreter.global_scope
+    assert run(interpreter, "sumsq(3, 4)") == 25
+    assert {'sumsq', 'lib.sq'} <= set(interpreter.global_scope)
+    assert 'fact' not in interpreter.global_scope and 'sq' not in interpreter.global_scope
+    with pytest.raises(Exception, match="could not parse unused in module lib"):
+        run(interpreter, "unused(1)")
+
+
+def test_module_functions_call_their_own_helpers(library):
+    interpreter = interpreter_in(library)
+    assert run(interpreter, "Import { module: lib, names: (sumsq,) }\nsumsq(1, 2)") == 5
+    run(interpreter, "Defun { name: sq, arguments: (x,) } 1000 + x")
+    assert run(interpreter, "sumsq(1, 2)") == 5
+    assert run(interpreter, "sq(2)") == 1002
+    assert interpreter.global_scope['sumsq'].body.left.func == 'lib.sq'
+
+
+def test_import_and_defun_replace_each_other(library):
+    interpreter = interpreter_in(library)
+    run(interpreter, "Defun { name: fact, arguments: (n,) } 0")
+    assert run(interpreter, "Import { module: lib, names: (fact,) }\nfact(5)") == 120
+    assert run(interpreter, "Defun { name: fact, arguments: (n,) } 0\nfact(5)") == 0
+
+
+def test_import_errors(library):
+    interpreter = interpreter_in(library)
+    with pytest.raises(Exception, match="module missing not found"):
+        run(interpreter, "Import { module: missing }")
+    with pytest.raises(Exception, match="module lib does not define cube"):
+        run(interpreter, "Import { module: lib, names: (sq, cube,) }")
+
+
+def test_search_path(library, tmp_path_factory):
+    interpreter = interpreter_in(tmp_path_factory.mktemp('program'))
+    interpreter.modules.search_path = [str(library)]
+    assert run(interpreter, "Import { module: lib, names: (sq,) }\nsq(6)") == 36
+
+
+def test_edited_module_is_reloaded(library):
+    interpreter = interpreter_in(library)
+    assert run(interpreter, "Import { module: lib }\nsumsq(1, 2)") == 5
+    (library / 'lib.lambda').write_text(LIBRARY.replace("x * x", "x * x * x"))
+    assert run(interpreter, "Import { module: lib }\nsumsq(1, 2)") == 9
+
+
+def test_index_and_functions_come_from_the_cache(library, tmp_path_factory, monkeypatch):
+    cache = ProgramCache(str(tmp_path_factory.mktemp('cache')))
+    assert run(interpreter_in(library, cache), "Import { module: lib }\nsumsq(3, 4)") == 25
+
+    def not_again(*args):
+        raise AssertionError("parsed again")
+    with monkeypatch.context() as patch:
+        patch.setattr(my_modules, 'build_index', not_again)
+        patch.setattr(my_modules, 'Parser', not_again)
+        assert run(interpreter_in(library, cache), "Import { module: lib }\nsumsq(3, 4)") == 25
+
+    # Editing sq rebuilds the index and parses sq, but sumsq is still cached
+    (library / 'lib.lambda').write_text(LIBRARY.replace("x * x", "x * x * x"))
+    parsed = []
+    parse = my_modules.Parser
+
+    def counting_parser(tokens, nodes):
+        parser = parse(tokens, nodes)
+        parsed.append(parser)
+        return parser
+    monkeypatch.setattr(my_modules, 'Parser', counting_parser)
+    assert run(interpreter_in(library, cache), "Import { module: lib }\nsumsq(1, 2)") == 9
+    assert len(parsed) == 1
@@ -0,0 +1,95 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from my_interpreter import Interpreter
+from my_lexer import tokenize
+from my_optimizer import Optimizer, PASSES
+from my_parser import Parser
+
+PROJECT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse(source):
+    return Parser(tokenize(source)).parse()[0]
+
+
+def optimized(source, disabled=()):
+    return repr(Optimizer(disabled).optimize(parse(source)))
+
+
+@pytest.mark.parametrize('source, expected', [
+    ("2 * 3 + 4", "10"),
+    ("!(1 < 2)", "FALSE"),
+    ("FALSE && f(1)", "FALSE"),
+    ("TRUE || f(1)", "TRUE"),
+])
+def test_fold(source, expected):
+    assert optimized(source) == repr(parse(expected))
+
+
+def test_fold_keeps_operations_that_fail():
+    assert optimized("1 / 0") == repr(parse("1 / 0"))
+
+
+def test_dead_branch():
+    assert optimized("(1 > 2) ? f(1) : g(2)") == repr(parse("g(2)"))
+
+
+@pytest.mark.parametrize('source, expected', [
+    ("f(1) * 1", "f(1) * 1"),        # f(1) might return a boolean
+    ("(x + 1) * 1", "x + 1"),
+    ("0 + (x - y)", "x - y"),
+    ("(x * y) / 1", "x * y"),
+    ("!!(x < y)", "x < y"),
+    ("TRUE * 1", "1"),               # Folded, not simplified to TRUE
+])
+def test_algebraic(source, expected):
+    assert optimized(source) == repr(parse(expected))
+
+
+def test_passes_enable_each_other():
+    # Folding the condition lets the dead branch go, and the survivor simplifies
+    assert optimized("(1 + 1 == 2) ? (x * 2 + 0) * 1 : y") == repr(parse("x * 2"))
+
+
+@pytest.mark.parametrize('name, source', [
+    ('fold', "2 * 3"),
+    ('dead-branch', "TRUE ? f(1) : f(2)"),
+    ('algebraic', "(x + y) * 1"),
+])
+def test_disabled_pass_leaves_its_rewrite_undone(name, source):
+    assert optimized(source) != repr(parse(source))
+    assert optimized(source, disabled=[name]) == repr(parse(source))
+
+
+def test_unknown_pass_is_rejected():
+    with pytest.raises(ValueError):
+        Optimizer(['inline'])
+
+
+def test_function_bodies_are_optimized():
+    interpreter = Interpreter(engine='tree')
+    for node in Parser(tokenize("Defun { name: g, arguments: (x,) } (x * 2) * (2 + 2 - 3)\ng(7)")).parse():
+        result = interpreter.evaluate(node)
+    assert result == 14
+    assert repr(interpreter.global_scope['g'].body) == repr(parse("x * 2"))
+    assert Interpreter(engine='tree', optimize=False).optimizer is None
+
+
+def dump(program, *flags):
+    result = subprocess.run([sys.executable, os.path.join(PROJECT, 'main.py'), '--no-cache', '--dump-optimized',
+                             *flags, str(program)], cwd=PROJECT, capture_output=True, text=True, timeout=60)
+    return [line for line in result.stdout.splitlines() if line.startswith("Optimized:")]
+
+
+def test_command_line_flags(tmp_path):
+    program = tmp_path / 'program.lambda'
+    program.write_text("TRUE ? 2 * 3 : 0\n")
+    assert dump(program) == [f"Optimized: {parse('6')!r}"]
+    assert dump(program, '--disable-pass', 'fold') == [f"Optimized: {parse('2 * 3')!r}"]
+    assert dump(program, '--disable-pass', 'fold', '--disable-pass', 'dead-branch') == [
+        f"Optimized: {parse('TRUE ? 2 * 3 : 0')!r}"]
+    assert dump(program, '--no-optimize') == []
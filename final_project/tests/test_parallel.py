@@ -0,0 +1,79 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+import my_parallel
+from my_interpreter import Interpreter
+from my_lexer import tokenize
+from my_parallel import ParallelRunner, ERROR, VALUE
+from my_parser import Parser
+
+PROGRAM = """
+Defun { name: sq, arguments: (n,) } n * n
+Defun { name: crash, arguments: (n,) } n
+sq(2)
+crash(1)
+sq(3)
+Defun { name: sq, arguments: (n,) } n + n
+sq(4)
+sq(5)
+"""
+
+run_job = my_parallel.run_job
+
+
+def dying_job(node, definitions):
+    # Take the worker down on crash(...) calls, as a segfault or the memory cap would
+    if 'crash' in repr(node):
+        os._exit(1)
+    return run_job(node, definitions)
+
+
+def parse(source):
+    return Parser(tokenize(source)).parse()
+
+
+def broken_pool():
+    pool = ProcessPoolExecutor(max_workers=1)
+    with pytest.raises(BrokenProcessPool):
+        pool.submit(os._exit, 1).result()
+    return pool
+
+
+def test_statements_run_in_workers_print_in_order(capsys):
+    ParallelRunner(Interpreter(engine='tree'), 3).run(iter(parse(PROGRAM.replace('crash(1)', 'sq(1)'))))
+    results = [line for line in capsys.readouterr().out.splitlines() if line.isdigit()]
+    assert results == ['4', '1', '9', '8', '10']
+
+
+def test_submit_to_a_broken_pool_reports_an_error_and_runs_the_rest_here():
+    interpreter = Interpreter(engine='tree')
+    runner = ParallelRunner(interpreter, 1)
+    for node in parse(PROGRAM)[:2]:
+        runner.submit(None, node)
+    pool = broken_pool()
+    try:
+        first, second = parse("sq(2)\nsq(3)")
+        assert runner.submit(pool, first)[0] == ERROR
+        assert runner.broken
+        assert runner.submit(pool, second) == (VALUE, '9')
+    finally:
+        pool.shutdown()
+
+
+def test_worker_death_does_not_lose_the_rest_of_the_program(capsys, monkeypatch):
+    monkeypatch.setattr(my_parallel, 'run_job', dying_job)
+    ParallelRunner(Interpreter(engine='tree'), 2).run(iter(parse(PROGRAM)))
+    blocks = capsys.readouterr().out.strip().split("\n\n")
+    calls = [block.splitlines()[-2:] for block in blocks if "Call(" in block]
+    # Every call is reported: crash(1) fails, the others fail with it or print what a serial run prints
+    assert [statement for statement, _ in calls] == [repr(node) for node in parse(PROGRAM) if "Call(" in repr(node)]
+    expected = {'2': '4', '3': '9', '4': '8', '5': '10'}
+    for statement, outcome in calls:
+        argument = statement.rsplit("value=", 1)[1].rstrip(")]")
+        if "func=crash" in statement:
+            assert outcome.startswith("An error occurred during execution")
+        else:
+            assert outcome == expected[argument] or "terminated abruptly" in outcome
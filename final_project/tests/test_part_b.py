@@ -0,0 +1,31 @@
+import random
+
+import pytest
+
+import part_b
+
+def test_prime_variants_agree_on_random_lists():
+    rng = random.Random(7)
+    for _ in range(200):
+        numbers = [rng.randrange(-5, 10 ** rng.randrange(1, 8)) for _ in range(rng.randrange(0, 40))]
+        expected = part_b.prime_desc(numbers)
+        assert list(part_b.prime_desc_stream(numbers)) == expected
+        assert part_b.prime_desc_fast(numbers) == expected
+
+
+def test_sieve_does_not_grow_with_the_largest_element(monkeypatch):
+    limits = []
+    sieve = part_b.sieve
+    monkeypatch.setattr(part_b, 'sieve', lambda limit: limits.append(limit) or sieve(limit))
+    assert part_b.prime_desc_fast([10 ** 10, 10 ** 10 + 19, 7, 9]) == [10 ** 10 + 19, 7]
+    assert limits == [4 * part_b.SIEVE_PER_ELEMENT]
+
+
+@pytest.mark.parametrize('x', [561, 1105, 1729, 3215031751, 2152302898747, 3474749660383, 341550071728321,
+                               3825123056546413051, 10 ** 9 + 7, 10 ** 12 + 39])
+def test_large_primality_matches_trial_division(x):
+    assert part_b.is_prime_large(x) == part_b.is_prime(x)
+
+
+def test_large_prime_beyond_trial_division():
+    assert part_b.prime_desc_fast([2 ** 61 - 1, 2 ** 61 + 1]) == [2 ** 61 - 1]
@@ -0,0 +1,128 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from my_interpreter import Interpreter
+from my_lexer import tokenize
+from my_parser import Parser
+from my_pgo import ProfileRecorder, ProfileGuide, load_profile, is_profile_file, sidecar_path, fingerprint
+
+PROJECT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LIBRARY = """
+Defun { name: classify, arguments: (n,) } (n < 0) ? 0 - n : n * 2
+Defun { name: sq, arguments: (n,) } n * n
+Defun { name: total, arguments: (n,) } (n == 0) ? 0 : sq(n) + total(n - 1)
+"""
+CALLS = "total(3)\nclassify(1)\nclassify(2)\nclassify(3)\nclassify(-1)"
+
+
+def run(interpreter, source):
+    for node in Parser(tokenize(source)).parse():
+        interpreter.evaluate(node)
+
+
+def record(path, library=LIBRARY, calls=CALLS):
+    interpreter = Interpreter(engine='compiled', jit_threshold=0)
+    recorder = ProfileRecorder(interpreter)
+    recorder.install()
+    run(interpreter, library + calls)
+    recorder.save(str(path))
+    return load_profile(str(path))
+
+
+def test_recorded_counts(tmp_path):
+    profiles = record(tmp_path / 'p.pgo.json')
+    assert sorted(profiles) == ['classify', 'sq', 'total']
+    classify, total = profiles['classify'], profiles['total']
+    assert classify.calls == 4 and classify.distinct == 4 and classify.runs == 1
+    assert classify.branches == {0: [1, 3]}
+    assert total.calls == 4 and total.branches == {0: [1, 3]}
+    # The sq(n) and total(n - 1) call sites, numbered after the Conditional
+    assert {site: hits for site, (hits, types) in total.sites.items()} == {1: 3, 2: 3}
+    assert profiles['sq'].fingerprint == fingerprint(Parser(tokenize(LIBRARY)).parse()[1])
+
+
+def test_runs_are_added_up(tmp_path):
+    path = tmp_path / 'p.pgo.json'
+    record(path)
+    profiles = record(path, calls="classify(-5)")
+    assert profiles['classify'].runs == 2 and profiles['classify'].calls == 5
+    assert profiles['classify'].branches == {0: [2, 3]}
+    # total was not called in the second run, so it keeps the counts of the first
+    assert profiles['total'].runs == 1 and profiles['total'].calls == 4
+
+
+def test_changed_body_replaces_its_profile(tmp_path):
+    path = tmp_path / 'p.pgo.json'
+    record(path)
+    profiles = record(path, LIBRARY.replace("n * 2", "n * 3"), "classify(1)")
+    assert profiles['classify'].runs == 1 and profiles['classify'].calls == 1
+
+
+def test_guide_enlarges_caches_and_primes_the_jit(tmp_path):
+    path = tmp_path / 'p.pgo.json'
+    record(path, calls="\n".join(f"classify({n})" for n in range(50)))
+    interpreter = Interpreter(engine='compiled', memo_size=8, jit_threshold=20)
+    ProfileGuide(load_profile(str(path))).install(interpreter)
+    run(interpreter, LIBRARY + "classify(7)\nsq(2)")
+    classify, sq = interpreter.global_scope['classify'], interpreter.global_scope['sq']
+    assert interpreter.memo.cache_for(classify).maxsize == 50
+    assert interpreter.memo.cache_for(sq).maxsize == 8
+    assert classify in interpreter.jit.entries and sq not in interpreter.jit.entries
+
+
+def test_guide_ignores_profiles_of_other_bodies(tmp_path):
+    path = tmp_path / 'p.pgo.json'
+    record(path, calls="\n".join(f"classify({n})" for n in range(50)))
+    interpreter = Interpreter(engine='compiled', memo_size=8, jit_threshold=20)
+    ProfileGuide(load_profile(str(path))).install(interpreter)
+    run(interpreter, LIBRARY.replace("n * 2", "n * 3") + "classify(7)")
+    classify = interpreter.global_scope['classify']
+    assert interpreter.memo.cache_for(classify).maxsize == 8
+    assert classify not in interpreter.jit.entries
+
+
+def test_cold_branches(tmp_path):
+    path = tmp_path / 'p.pgo.json'
+    record(path, calls="\n".join(f"classify({n})" for n in range(200)))
+    guide = ProfileGuide(load_profile(str(path)))
+    classify = Parser(tokenize(LIBRARY)).parse()[0]
+    assert guide.cold_branches(classify) == {(classify.body, True)}
+
+
+def test_profile_files(tmp_path):
+    program = tmp_path / 'prog.lambda'
+    program.write_text("sq(1)\n")
+    assert sidecar_path(str(program)) == str(program) + '.pgo.json'
+    assert is_profile_file(str(tmp_path / 'missing.pgo.json'))
+    assert not is_profile_file(str(program))
+    (tmp_path / 'list.json').write_text("[1, 2]")
+    assert not is_profile_file(str(tmp_path / 'list.json'))
+    assert load_profile(str(program)) is None
+    record(tmp_path / 'p.pgo.json')
+    assert is_profile_file(str(tmp_path / 'p.pgo.json'))
+    with pytest.raises(Exception, match="is not a profile"):
+        record(program)
+    assert program.read_text() == "sq(1)\n"
+
+
+def test_program_is_never_overwritten(tmp_path):
+    program = tmp_path / 'prog.lambda'
+    program.write_text(LIBRARY + "classify(1)\n")
+    result = subprocess.run([sys.executable, os.path.join(PROJECT, 'main.py'), '--no-cache', '--pgo-record',
+                             '--pgo-file', str(program), str(program)],
+                            cwd=PROJECT, capture_output=True, text=True, timeout=60)
+    assert "is not a profile, so it will not be overwritten" in result.stdout
+    assert program.read_text() == LIBRARY + "classify(1)\n"
+
+
+def test_sidecar_is_written_next_to_the_program(tmp_path):
+    program = tmp_path / 'prog.lambda'
+    program.write_text(LIBRARY + "classify(1)\n")
+    subprocess.run([sys.executable, os.path.join(PROJECT, 'main.py'), '--no-cache', '--pgo-record', str(program)],
+                   cwd=PROJECT, capture_output=True, text=True, timeout=60)
+    with open(sidecar_path(str(program))) as file:
+        assert json.load(file)['functions']['classify']['calls'] == 1
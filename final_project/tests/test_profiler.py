@@ -0,0 +1,86 @@
+from itertools import count
+
+import pytest
+
+import my_profiler
+from my_interpreter import Interpreter
+from my_lexer import tokenize
+from my_parser import Parser
+from my_profiler import Profiler
+
+PROGRAM = """
+Defun { name: leaf, arguments: (n,) } n + 1
+Defun { name: twice, arguments: (n,) } leaf(n) + leaf(n)
+Defun { name: down, arguments: (n,) } (n == 0) ? 0 : down(n - 1)
+"""
+
+
+def profile(source, engine='compiled', memo_size=0):
+    interpreter = Interpreter(engine=engine, memo_size=memo_size, jit_threshold=0)
+    profiler = Profiler(interpreter)
+    ticks = count()
+    profiler.clock = lambda: next(ticks) / 1000  # Each reading of the clock advances it by 1 ms
+    profiler.install()
+    for node in Parser(tokenize(PROGRAM + source)).parse():
+        interpreter.evaluate(node)
+    profiler.uninstall()
+    return profiler
+
+
+def test_calls_depth_and_repeats():
+    functions = profile("twice(1)\ndown(4)").functions
+    assert functions['leaf'].calls == 2 and functions['leaf'].repeats == 1
+    assert functions['twice'].calls == 1 and functions['twice'].max_depth == 1
+    assert functions['down'].calls == 5 and functions['down'].max_depth == 5
+    assert functions['down'].repeats == 0
+
+
+def test_self_and_total_time():
+    twice = profile("twice(1)").functions['twice']
+    # twice reads the clock at 0 and 5 ms, its two leaf calls each take 1 ms of it
+    assert twice.total_time == pytest.approx(0.005)
+    assert twice.self_time == pytest.approx(0.003)
+
+
+def test_recursion_is_not_counted_twice_in_total_time():
+    down = profile("down(2)").functions['down']
+    assert down.total_time == pytest.approx(0.005)
+    assert down.self_time == pytest.approx(down.total_time)
+
+
+def test_report_lists_cache_opportunities():
+    report = profile("twice(1)").report()
+    assert report.splitlines()[0].split() == ['function', 'calls', 'self', 'ms', 'total', 'ms', 'depth', 'repeats',
+                                              'memoized']
+    assert report.splitlines()[1].split()[0] == 'twice'
+    assert "Cache opportunity: leaf was called 1 times with arguments it had already received" in report
+    memoized = profile("twice(1)", memo_size=16).report()
+    assert "Cache opportunity" not in memoized
+
+
+def test_repeats_past_the_distinct_limit_are_a_lower_bound(monkeypatch):
+    monkeypatch.setattr(my_profiler, 'DISTINCT_LIMIT', 2)
+    profiler = profile("leaf(1)\nleaf(2)\nleaf(3)\nleaf(1)")
+    leaf = profiler.functions['leaf']
+    assert leaf.saturated and len(leaf.keys) == 2 and leaf.repeats == 1
+    assert "leaf was called 1+ times" in profiler.report()
+
+
+def test_collapsed_stacks():
+    stacks = profile("twice(1)").collapsed_stacks().splitlines()
+    assert stacks == ["main;twice 3000", "main;twice;leaf 2000"]
+
+
+def test_tree_engine_and_unsupported_engines():
+    assert profile("twice(1)", engine='tree').functions['leaf'].calls == 2
+    with pytest.raises(ValueError):
+        Profiler(Interpreter(engine='vm')).install()
+
+
+def test_uninstall_restores_apply_function():
+    interpreter = Interpreter(engine='compiled')
+    profiler = Profiler(interpreter)
+    profiler.install()
+    assert 'apply_function' in vars(interpreter)
+    profiler.uninstall()
+    assert 'apply_function' not in vars(interpreter)
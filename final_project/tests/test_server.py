@@ -0,0 +1,86 @@
+import asyncio
+import os
+import signal
+
+import pytest
+
+from server import EvaluationServer, CPUTimeLimitExceeded, request_limit
+
+LIBRARY = """
+Defun { name: fact, arguments: (n,) } (n == 0) ? 1 : (n * fact(n - 1))
+Defun { name: spin, arguments: (n,) } spin(n + 1)
+"""
+OPTIONS = {'engine': 'vm', 'max_depth': 10000, 'memo_size': 0}
+
+
+def serve(*requests, **limits):
+    # Answer requests one after another on a one-worker server, returning the responses
+    async def run():
+        server = EvaluationServer(1, OPTIONS, LIBRARY, **limits)
+        try:
+            await server.warm_up()
+            responses = []
+            for request in requests:
+                if callable(request):
+                    request = request(server)
+                responses.append(await server.respond(request))
+            return responses
+        finally:
+            server.close()
+    return asyncio.run(run())
+
+
+def kill_worker(server):
+    # Kill the pool's worker process, then send an ordinary call
+    pid = server.pool.submit(os.getpid).result()
+    os.kill(pid, signal.SIGKILL)
+    return {'call': "fact(3)"}
+
+
+def test_call_and_program():
+    call, program = serve({'call': "fact(5)"}, {'program': "fact(3)\nnope(1)"})
+    assert call['ok'] and call['result'] == 120
+    assert program['ok']
+    assert program['statements'][0]['result'] == 6
+    assert "nope" in program['statements'][1]['error']
+
+
+def test_program_definitions_do_not_outlive_the_request():
+    defined, later = serve({'program': "Defun { name: g, arguments: (x,) } x + 1\ng(1)"}, {'call': "g(1)"})
+    assert defined['statements'][1]['result'] == 2
+    assert not later['ok']
+
+
+def test_cpu_limit_stops_a_request_and_the_worker_keeps_serving():
+    stopped, after = serve({'call': "spin(0)", 'cpu_limit': 0.2}, {'call': "fact(4)"}, timeout=30.0)
+    assert stopped == {'ok': False, 'error': "Error: CPU time limit exceeded", 'cpu_time': stopped['cpu_time']}
+    assert after['result'] == 24
+
+
+def test_cpu_limit_is_not_an_exception():
+    # Evaluation code that handles errors with `except Exception` must let the limit through
+    assert not issubclass(CPUTimeLimitExceeded, Exception)
+
+
+def test_step_and_depth_limits():
+    steps, depth = serve({'call': "fact(50)", 'max_steps': 10}, {'call': "fact(500)", 'max_depth': 50})
+    assert not steps['ok'] and not depth['ok']
+
+
+@pytest.mark.parametrize('value', [0, -1, "1", float('nan'), True, 2.5])
+def test_invalid_request_limits_are_rejected(value):
+    with pytest.raises(ValueError):
+        request_limit({'max_steps': value}, 'max_steps', None, integer=True)
+
+
+def test_request_limits_are_capped_by_the_server():
+    assert request_limit({'cpu_limit': 5}, 'cpu_limit', 1.0) == 1.0
+    assert request_limit({'cpu_limit': 0.5}, 'cpu_limit', 1.0) == 0.5
+    assert request_limit({}, 'cpu_limit', 1.0) == 1.0
+
+
+def test_pool_is_restarted_after_a_worker_dies():
+    responses = serve(kill_worker, {'call': "fact(3)"}, {'call': "fact(4)"})
+    # The call sent while the worker died may fail; the server must recover for the next ones
+    assert responses[-1]['ok'] and responses[-1]['result'] == 24
+    assert responses[-2]['ok'] or "Worker failed" in responses[-2]['error']
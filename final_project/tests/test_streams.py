@@ -0,0 +1,47 @@
+import pytest
+
+from my_interpreter import Interpreter
+from my_lexer import tokenize
+from my_parser import Parser
+
+ENGINES = ('tree', 'compiled', 'cek', 'vm')
+
+LIBRARY = """
+Defun { name: add, arguments: (a, b) } a + b
+Defun { name: double, arguments: (x,) } x * 2
+Defun { name: odd, arguments: (x,) } x % 2 == 1
+"""
+
+
+def evaluate(engine, source):
+    # Define the library, then return the value of the last statement of source
+    interpreter = Interpreter(engine=engine)
+    result = None
+    for node in Parser(tokenize(LIBRARY + source)).parse():
+        result = interpreter.evaluate(node)
+    return result
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_pipelines(engine):
+    assert str(evaluate(engine, "take(3, map(double, filter(odd, range(100))))")) == "[2, 6, 10]"
+    assert evaluate(engine, "reduce(add, map(double, range(5)))") == 20
+    assert evaluate(engine, "reduce(add, take(0, range(10)), 7)") == 7
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+@pytest.mark.parametrize('source', [
+    "take(2, map(add, range(3)))",
+    "filter(add, range(3))",
+    "reduce(double, range(3))",
+    "map(take, range(3))",
+])
+def test_function_with_the_wrong_arity_is_an_argument_count_error(engine, source):
+    with pytest.raises(Exception, match="expects .* arguments but got"):
+        evaluate(engine, source)
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_wrong_arity_does_not_bind_a_global_of_the_missing_parameter(engine):
+    with pytest.raises(Exception, match="add expects 2 arguments but got 1"):
+        evaluate(engine, "Defun { name: b, arguments: () } 100\nreduce(add, map(add, range(3)))")
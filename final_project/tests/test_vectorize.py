@@ -0,0 +1,86 @@
+import numpy
+import pytest
+
+import my_vectorize
+from my_interpreter import Interpreter
+from my_lexer import tokenize
+from my_parser import Parser
+
+LIBRARY = """
+Defun { name: poly, arguments: (x, y) } x * x - 3 * y + 1
+Defun { name: safe_div, arguments: (x, y) } (y == 0) ? 0 - 1 : x / y
+Defun { name: div, arguments: (x, y) } x / y
+Defun { name: big, arguments: (x,) } x * 4611686018427387904
+Defun { name: sign, arguments: (x,) } (x > 0) ? 1 : ((x < 0) ? 0 - 1 : 0)
+Defun { name: both, arguments: (x, y) } (x > 0) && (y > 0)
+Defun { name: helper, arguments: (x,) } sign(x) * 10
+Defun { name: fact, arguments: (n,) } (n == 0) ? 1 : n * fact(n - 1)
+"""
+XS = [-7, -1, 0, 1, 2, 5, 30]
+YS = [3, 0, 2, -4, 0, 7, 1]
+
+
+@pytest.fixture
+def interpreter():
+    interpreter = Interpreter(engine='tree', jit_threshold=0)
+    for node in Parser(tokenize(LIBRARY)).parse():
+        interpreter.evaluate(node)
+    return interpreter
+
+
+def scalar(interpreter, name, *columns):
+    func = interpreter.global_scope[name]
+    return [interpreter.apply_function(func, interpreter.global_env, list(args)) for args in zip(*columns)]
+
+
+@pytest.mark.parametrize('name, columns', [
+    ('poly', (XS, YS)),
+    ('safe_div', (XS, YS)),
+    ('big', (XS,)),
+    ('sign', (XS,)),
+    ('both', (XS, YS)),
+    ('helper', (XS,)),
+    ('fact', ([0, 1, 5, 10, 25],)),
+])
+def test_matches_scalar_calls(interpreter, name, columns):
+    assert interpreter.map_call(name, *columns).tolist() == scalar(interpreter, name, *columns)
+
+
+def test_whole_batch_is_one_array_evaluation(interpreter, monkeypatch):
+    def no_scalar(*args):
+        raise AssertionError("fell back to the scalar path")
+    monkeypatch.setattr(interpreter.vectorizer, 'scalar', no_scalar)
+    assert interpreter.map_call('poly', XS, YS).tolist() == [x * x - 3 * y + 1 for x, y in zip(XS, YS)]
+
+
+def test_overflowing_lanes_are_exact(interpreter):
+    result = interpreter.map_call('big', [1, 2, 3])
+    assert result.tolist() == [4611686018427387904, 2 * 4611686018427387904, 3 * 4611686018427387904]
+
+
+def test_division_by_zero_raises_as_a_scalar_call_does(interpreter):
+    with pytest.raises(Exception) as scalar_error:
+        scalar(interpreter, 'div', [1], [0])
+    with pytest.raises(Exception) as error:
+        interpreter.map_call('div', [4, 1], [2, 0])
+    assert str(error.value) == str(scalar_error.value)
+
+
+def test_broadcasting_and_shape(interpreter):
+    result = interpreter.map_call('poly', numpy.array([[1, 2], [3, 4]]), 1)
+    assert result.shape == (2, 2)
+    assert result.tolist() == [[-1, 2], [7, 14]]
+
+
+def test_argument_errors(interpreter):
+    with pytest.raises(Exception, match="Unknown function"):
+        interpreter.map_call('missing', XS)
+    with pytest.raises(Exception, match="expects 2 arguments"):
+        interpreter.map_call('poly', XS)
+
+
+def test_without_numpy_returns_a_list(interpreter, monkeypatch):
+    monkeypatch.setattr(my_vectorize, 'numpy', None)
+    assert interpreter.map_call('safe_div', XS, YS) == scalar(interpreter, 'safe_div', XS, YS)
+    with pytest.raises(ValueError):
+        interpreter.map_call('poly', XS, YS[:2])
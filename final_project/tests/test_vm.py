@@ -0,0 +1,41 @@
+import gc
+
+from my_bytecode import disassemble
+from my_interpreter import Interpreter
+from my_lexer import tokenize
+from my_parser import Parser
+
+
+def run(interpreter, source):
+    # Evaluate every statement of source and return the value of the last one
+    result = None
+    for node in Parser(tokenize(source)).parse():
+        result = interpreter.evaluate(node)
+    return result
+
+
+def test_tail_calls_do_not_grow_the_stack():
+    interpreter = Interpreter(engine='vm')
+    assert run(interpreter, "Defun { name: count, arguments: (n, acc) } (n == 0) ? acc : count(n - 1, acc + 1)\n"
+                            "count(100000, 0)") == 100000
+
+
+def test_partially_applied_lambda_falls_back_to_the_enclosing_binding():
+    interpreter = Interpreter(engine='vm')
+    assert run(interpreter, "Defun { name: f, arguments: (y,) } (Lambd x, y. x + y)(1)\nf(10)") == 11
+
+
+def test_redefined_functions_release_their_code():
+    interpreter = Interpreter(engine='vm')
+    for i in range(50):
+        run(interpreter, f"Defun {{ name: f, arguments: (n,) }} (n == 0) ? {i} : f(n - 1)\nf(3)")
+    gc.collect()
+    assert len(interpreter.bytecode.functions) == 1
+    assert run(interpreter, "f(2)") == 49
+
+
+def test_function_code_disassembles():
+    interpreter = Interpreter(engine='vm')
+    func = run(interpreter, "Defun { name: inc, arguments: (n,) } n + 1\ninc")
+    listing = disassemble(interpreter.bytecode.compile_function(func))
+    assert "BINARY_ADD" in listing and "RETURN" in listing